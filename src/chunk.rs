@@ -637,9 +637,7 @@ fn empty_heightmaps() -> HeightmapsNbt {
 }
 
 fn heightmaps_from_values(values: &[u64]) -> HeightmapsNbt {
-    let max_range = (MAX_WORLD_Y - BEDROCK_Y + 2) as usize;
-    let bits = bits_for_range(max_range);
-    let data = pack_unsigned(values, bits);
+    let data = pack_unsigned(values, heightmap_bits());
     HeightmapsNbt {
         motion_blocking: LongArray::new(data),
     }
@@ -653,6 +651,21 @@ fn empty_post_processing_lists() -> Vec<Vec<i16>> {
     lists
 }
 
+fn heightmap_bits() -> usize {
+    bits_for_range((MAX_WORLD_Y - BEDROCK_Y + 2) as usize)
+}
+
+/// Top block Y of column `index` (`z * 16 + x`) in a MOTION_BLOCKING heightmap
+/// written by francegen, or None when the column is empty or out of range.
+pub fn heightmap_column_top(data: &[i64], index: usize) -> Option<i32> {
+    let value = unpack_unsigned(data, heightmap_bits(), index)?;
+    // Empty columns are stored as if their top were BEDROCK_Y (see `build_heightmaps`).
+    if value <= 1 {
+        return None;
+    }
+    Some(value as i32 + BEDROCK_Y - 1)
+}
+
 fn bits_for_range(size: usize) -> usize {
     if size <= 1 {
         1
@@ -680,6 +693,18 @@ fn pack_unsigned(values: &[u64], bits: usize) -> Vec<i64> {
     longs
 }
 
+fn unpack_unsigned(longs: &[i64], bits: usize, index: usize) -> Option<u64> {
+    let values_per_long = 64 / bits;
+    let long = *longs.get(index / values_per_long)? as u64;
+    let offset = (index % values_per_long) * bits;
+    let mask = if bits == 64 {
+        u64::MAX
+    } else {
+        (1u64 << bits) - 1
+    };
+    Some((long >> offset) & mask)
+}
+
 struct ColumnSettings {
     height: Option<i32>,
     biome: Arc<str>,
@@ -986,3 +1011,25 @@ struct StructuresNbt {
     #[serde(rename = "Starts")]
     starts: HashMap<String, fastnbt::Value>,
 }
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+
+    #[test]
+    fn heightmap_column_top_reads_packed_heights() {
+        let mut values = vec![1u64; SECTION_SIDE * SECTION_SIDE];
+        values[0] = (MAX_WORLD_Y - BEDROCK_Y + 1) as u64;
+        values[17] = (64 - BEDROCK_Y + 1) as u64;
+        values[255] = (BEDROCK_Y + 1 - BEDROCK_Y + 1) as u64;
+        let data = pack_unsigned(&values, heightmap_bits());
+
+        assert_eq!(heightmap_column_top(&data, 0), Some(MAX_WORLD_Y));
+        assert_eq!(heightmap_column_top(&data, 17), Some(64));
+        assert_eq!(heightmap_column_top(&data, 255), Some(BEDROCK_Y + 1));
+        assert_eq!(heightmap_column_top(&data, 1), None);
+        // Padding after the last column, then past the end of the array.
+        assert_eq!(heightmap_column_top(&data, 256), None);
+        assert_eq!(heightmap_column_top(&data, 4096), None);
+    }
+}
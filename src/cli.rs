@@ -4,13 +4,14 @@ use anyhow::{Result, anyhow, bail};
 
 use crate::world::ModelBounds;
 
-const USAGE: &str = "Usage: francegen [--threads <N>] [--config <file>] [--bounds <min_x,min_z,max_x,max_z>] [--cache-dir <path>] [--copc-dir <path>] <tif-folder> <output-world>\n       francegen locate <world-dir> <real-x> <real-z> [<real-height>]\n       francegen bounds <tif-folder>\n       francegen info <world-dir>";
+const USAGE: &str = "Usage: francegen [--threads <N>] [--config <file>] [--bounds <min_x,min_z,max_x,max_z>] [--cache-dir <path>] [--copc-dir <path>] <tif-folder> <output-world>\n       francegen locate <world-dir> <real-x> <real-z> [<real-height>]\n       francegen bounds <tif-folder>\n       francegen info <world-dir>\n       francegen spawn <world-dir>";
 
 pub enum Command {
     Generate(GenerateConfig),
     Locate(LocateConfig),
     Bounds(BoundsConfig),
     Info(InfoConfig),
+    Spawn(SpawnConfig),
 }
 
 pub struct GenerateConfig {
@@ -39,6 +40,10 @@ pub struct InfoConfig {
     pub world: PathBuf,
 }
 
+pub struct SpawnConfig {
+    pub world: PathBuf,
+}
+
 pub fn parse_args(args: &[String]) -> Result<Command> {
     if args.is_empty() {
         bail!("No arguments supplied.\n{USAGE}");
@@ -56,6 +61,10 @@ pub fn parse_args(args: &[String]) -> Result<Command> {
         return parse_info(&args[1..]).map(Command::Info);
     }
 
+    if args[0] == "spawn" {
+        return parse_spawn(&args[1..]).map(Command::Spawn);
+    }
+
     parse_generate(args).map(Command::Generate)
 }
 
@@ -257,3 +266,18 @@ fn parse_info(args: &[String]) -> Result<InfoConfig> {
         world: PathBuf::from(&args[0]),
     })
 }
+
+fn parse_spawn(args: &[String]) -> Result<SpawnConfig> {
+    if args.is_empty() || args[0] == "--help" || args[0] == "-h" {
+        println!("{USAGE}");
+        std::process::exit(0);
+    }
+
+    if args.len() != 1 {
+        bail!("spawn requires exactly one argument: <world-dir>\n{USAGE}");
+    }
+
+    Ok(SpawnConfig {
+        world: PathBuf::from(&args[0]),
+    })
+}
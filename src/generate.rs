@@ -12,14 +12,14 @@ use crate::cli::GenerateConfig;
 use crate::config::TerrainConfig;
 use crate::constants::{BEDROCK_Y, MAX_WORLD_Y, SECTION_SIDE};
 use crate::copc::apply_copc_buildings;
-use crate::metadata::{load_metadata, metadata_path, write_metadata};
+use crate::metadata::{load_metadata, merge_metadata, metadata_path};
 use crate::osm::apply_osm_overlays;
 use crate::progress::progress_bar;
 use crate::wmts::{WmtsCacheDir, apply_wmts_overlays};
 use crate::world::{WorldBuilder, WorldStats};
-use crate::world_template::{SpawnSettings, apply_world_template};
+use crate::world_template::{SpawnSettings, apply_world_template, world_level_name};
 
-const DEFAULT_SPAWN_Y: i32 = (MAX_WORLD_Y + BEDROCK_Y) / 2;
+pub const DEFAULT_SPAWN_Y: i32 = (MAX_WORLD_Y + BEDROCK_Y) / 2;
 
 pub fn run_generate(config: &GenerateConfig) -> Result<()> {
     let input = &config.input;
@@ -119,7 +119,7 @@ pub fn run_generate(config: &GenerateConfig) -> Result<()> {
         let stats = combined_stats.as_ref().ok_or_else(|| {
             anyhow!("No samples or existing metadata available; metadata unavailable")
         })?;
-        let path = write_metadata(output, origin, stats)?;
+        let (path, _) = merge_metadata(output, origin, stats)?;
         println!(
             "{} Saved metadata only: {}",
             "ℹ".blue().bold(),
@@ -253,10 +253,16 @@ pub fn run_generate(config: &GenerateConfig) -> Result<()> {
         chunks_written: write_stats.chunks_written,
     });
 
-    if let (Some(stats), Some(origin)) = (combined_stats.as_ref(), combined_origin) {
-        let path = write_metadata(output, origin, stats)?;
-        println!("{} Saved metadata: {}", "ℹ".blue().bold(), path.display());
-    }
+    // Other runs may have finished on this world since it was read; place the spawn
+    // from everything the metadata holds now.
+    let combined_stats = match (combined_stats, combined_origin) {
+        (Some(stats), Some(origin)) => {
+            let (path, merged) = merge_metadata(output, origin, &stats)?;
+            println!("{} Saved metadata: {}", "ℹ".blue().bold(), path.display());
+            Some(merged)
+        }
+        (stats, _) => stats,
+    };
 
     if let Some(cache) = wmts_cache.as_ref() {
         cache.cleanup()?;
@@ -266,11 +272,7 @@ pub fn run_generate(config: &GenerateConfig) -> Result<()> {
         let spawn_x = stats.center_x.round() as i32;
         let spawn_z = stats.center_z.round() as i32;
         let spawn_y = column_height_at(&chunks, spawn_x, spawn_z).unwrap_or(DEFAULT_SPAWN_Y);
-        let world_name = output
-            .file_name()
-            .and_then(|value| value.to_str())
-            .map(|value| value.to_string())
-            .unwrap_or_else(|| "francegen_world".to_string());
+        let world_name = world_level_name(output);
         let spawn_settings = SpawnSettings {
             spawn_x,
             spawn_y,
@@ -3,6 +3,7 @@ use std::io::{Read, Seek};
 
 use anyhow::{Context, Result, anyhow, bail};
 use geo_types::Coord;
+use roxmltree::Document;
 use tiff::decoder::{Decoder, DecodingResult};
 use tiff::tags::Tag;
 
@@ -12,6 +13,39 @@ enum RasterType {
     PixelIsPoint,
 }
 
+/// GDAL_METADATA, where GDAL records band scale and offset.
+const GDAL_METADATA_TAG: u16 = 42112;
+
+/// Linear mapping from stored samples to elevations (`value * scale + offset`),
+/// used by tiles stored as scaled integers.
+#[derive(Clone, Copy, Debug, PartialEq)]
+struct SampleScaling {
+    scale: f64,
+    offset: f64,
+}
+
+impl SampleScaling {
+    const IDENTITY: Self = Self {
+        scale: 1.0,
+        offset: 0.0,
+    };
+
+    fn is_identity(&self) -> bool {
+        *self == Self::IDENTITY
+    }
+
+    fn apply(&self, raw: f64, nodata: Option<f64>) -> f64 {
+        if self.is_identity() {
+            return raw;
+        }
+        // Nodata is a stored value; scaling it could land on a real elevation.
+        if nodata.is_some_and(|nodata| approx_equals(raw, nodata)) {
+            return f64::NAN;
+        }
+        raw * self.scale + self.offset
+    }
+}
+
 #[derive(Clone, Copy, Debug, PartialEq)]
 pub struct RasterExtent {
     pub min_x: f64,
@@ -50,9 +84,10 @@ impl GeoRaster {
         let raster_type = read_raster_type(&mut decoder)?;
         let transform = Transform::from_decoder(&mut decoder)?;
         let nodata = read_nodata(&mut decoder)?;
+        let scaling = read_scaling(&mut decoder)?;
 
         let data = decoder.read_image()?;
-        let values = convert_to_f64(data, samples_per_pixel)?;
+        let values = convert_to_f64(data, samples_per_pixel, scaling, nodata)?;
         let pixel_count = (width as usize)
             .checked_mul(height as usize)
             .ok_or_else(|| anyhow!("Raster dimensions are too large"))?;
@@ -70,7 +105,8 @@ impl GeoRaster {
             height: height as usize,
             values,
             transform,
-            nodata,
+            // Scaled samples already turned nodata into NaN.
+            nodata: if scaling.is_identity() { nodata } else { None },
             raster_offset: match raster_type {
                 Some(RasterType::PixelIsPoint) => -0.5,
                 _ => 0.0,
@@ -238,22 +274,72 @@ fn read_nodata<R: Read + Seek>(decoder: &mut Decoder<R>) -> Result<Option<f64>>
     Ok(trimmed.parse().ok())
 }
 
-fn convert_to_f64(data: DecodingResult, samples: usize) -> Result<Vec<f64>> {
+fn read_scaling<R: Read + Seek>(decoder: &mut Decoder<R>) -> Result<SampleScaling> {
+    let Some(raw) = decoder.find_tag(Tag::from_u16_exhaustive(GDAL_METADATA_TAG))? else {
+        return Ok(SampleScaling::IDENTITY);
+    };
+    let text = raw.into_string()?;
+    parse_gdal_scaling(text.trim_matches(char::from(0)))
+}
+
+/// Scale and offset of the first band from a GDAL_METADATA document such as
+/// `<GDALMetadata><Item name="SCALE" sample="0" role="scale">0.1</Item></GDALMetadata>`.
+/// Items are keyed by `role`, falling back to `name`; items of other bands are ignored.
+fn parse_gdal_scaling(xml: &str) -> Result<SampleScaling> {
+    let document = Document::parse(xml).context("Failed to parse GDAL_METADATA")?;
+    let mut scaling = SampleScaling::IDENTITY;
+    for item in document
+        .descendants()
+        .filter(|node| node.has_tag_name("Item"))
+    {
+        if item
+            .attribute("sample")
+            .is_some_and(|sample| sample.trim() != "0")
+        {
+            continue;
+        }
+        let Some(key) = item.attribute("role").or_else(|| item.attribute("name")) else {
+            continue;
+        };
+        let Some(value) = item.text().and_then(|text| text.trim().parse::<f64>().ok()) else {
+            continue;
+        };
+        if key.eq_ignore_ascii_case("scale") {
+            scaling.scale = value;
+        } else if key.eq_ignore_ascii_case("offset") {
+            scaling.offset = value;
+        }
+    }
+    Ok(scaling)
+}
+
+fn convert_to_f64(
+    data: DecodingResult,
+    samples: usize,
+    scaling: SampleScaling,
+    nodata: Option<f64>,
+) -> Result<Vec<f64>> {
     match data {
-        DecodingResult::U8(buf) => map_samples(buf, samples, |v| v as f64),
-        DecodingResult::U16(buf) => map_samples(buf, samples, |v| v as f64),
-        DecodingResult::U32(buf) => map_samples(buf, samples, |v| v as f64),
-        DecodingResult::U64(buf) => map_samples(buf, samples, |v| v as f64),
-        DecodingResult::I8(buf) => map_samples(buf, samples, |v| v as f64),
-        DecodingResult::I16(buf) => map_samples(buf, samples, |v| v as f64),
-        DecodingResult::I32(buf) => map_samples(buf, samples, |v| v as f64),
-        DecodingResult::I64(buf) => map_samples(buf, samples, |v| v as f64),
-        DecodingResult::F32(buf) => map_samples(buf, samples, |v| v as f64),
-        DecodingResult::F64(buf) => map_samples(buf, samples, |v| v as f64),
+        DecodingResult::U8(buf) => map_samples(buf, samples, scaling, nodata, |v| v as f64),
+        DecodingResult::U16(buf) => map_samples(buf, samples, scaling, nodata, |v| v as f64),
+        DecodingResult::U32(buf) => map_samples(buf, samples, scaling, nodata, |v| v as f64),
+        DecodingResult::U64(buf) => map_samples(buf, samples, scaling, nodata, |v| v as f64),
+        DecodingResult::I8(buf) => map_samples(buf, samples, scaling, nodata, |v| v as f64),
+        DecodingResult::I16(buf) => map_samples(buf, samples, scaling, nodata, |v| v as f64),
+        DecodingResult::I32(buf) => map_samples(buf, samples, scaling, nodata, |v| v as f64),
+        DecodingResult::I64(buf) => map_samples(buf, samples, scaling, nodata, |v| v as f64),
+        DecodingResult::F32(buf) => map_samples(buf, samples, scaling, nodata, |v| v as f64),
+        DecodingResult::F64(buf) => map_samples(buf, samples, scaling, nodata, |v| v as f64),
     }
 }
 
-fn map_samples<T: Copy, F: Fn(T) -> f64>(data: Vec<T>, samples: usize, map: F) -> Result<Vec<f64>> {
+fn map_samples<T: Copy, F: Fn(T) -> f64>(
+    data: Vec<T>,
+    samples: usize,
+    scaling: SampleScaling,
+    nodata: Option<f64>,
+    map: F,
+) -> Result<Vec<f64>> {
     if samples == 0 {
         bail!("Samples per pixel cannot be zero");
     }
@@ -266,7 +352,7 @@ fn map_samples<T: Copy, F: Fn(T) -> f64>(data: Vec<T>, samples: usize, map: F) -
     }
     let mut out = Vec::with_capacity(data.len() / samples);
     for chunk in data.chunks(samples) {
-        out.push(map(chunk[0]));
+        out.push(scaling.apply(map(chunk[0]), nodata));
     }
     Ok(out)
 }
@@ -280,3 +366,83 @@ fn approx_equals(a: f64, b: f64) -> bool {
         diff <= scale * 1e-9
     }
 }
+
+#[cfg(test)]
+mod tests {
+    use std::io::Cursor;
+
+    use super::*;
+
+    fn decode(bytes: &[u8]) -> GeoRaster {
+        GeoRaster::from_reader(Cursor::new(bytes)).expect("fixture decodes")
+    }
+
+    #[test]
+    fn parses_gdal_written_scaling() {
+        let xml = "<GDALMetadata>\n  <Item name=\"OFFSET\" sample=\"0\" role=\"offset\">112</Item>\n  \
+                   <Item name=\"SCALE\" sample=\"0\" role=\"scale\">0.10000000000000001</Item>\n</GDALMetadata>\n";
+        let scaling = parse_gdal_scaling(xml).unwrap();
+        assert_eq!(scaling.scale, 0.1);
+        assert_eq!(scaling.offset, 112.0);
+    }
+
+    #[test]
+    fn parses_scaling_variants() {
+        let xml = "<GDALMetadata>\
+                   <Item role='scale' sample='0' name='SCALE'> &#48;.5 </Item>\
+                   <Item name=\"OFFSET\">-1&#x30;</Item>\
+                   <Item name=\"SCALE\" sample=\"1\" role=\"scale\">7</Item>\
+                   <Item name=\"NOTE\">a &amp; b</Item>\
+                   </GDALMetadata>";
+        let scaling = parse_gdal_scaling(xml).unwrap();
+        assert_eq!(scaling.scale, 0.5);
+        assert_eq!(scaling.offset, -10.0);
+    }
+
+    #[test]
+    fn missing_scaling_is_identity() {
+        let xml =
+            "<GDALMetadata><Item name=\"STATISTICS_MEAN\" sample=\"0\">3</Item></GDALMetadata>";
+        assert!(parse_gdal_scaling(xml).unwrap().is_identity());
+        assert!(parse_gdal_scaling("<Item").is_err());
+    }
+
+    #[test]
+    fn applies_scale_offset_and_scaled_nodata() {
+        let scaling = SampleScaling {
+            scale: 0.1,
+            offset: 112.0,
+        };
+        assert!((scaling.apply(-117.0, Some(-32768.0)) - 100.3).abs() < 1e-9);
+        assert!(scaling.apply(-32768.0, Some(-32768.0)).is_nan());
+        assert_eq!(
+            SampleScaling::IDENTITY.apply(-32768.0, Some(-32768.0)),
+            -32768.0
+        );
+    }
+
+    // The fixtures are what utils/dem_tools.py writes, with 16 px blocks: repack_geotiff of a
+    // 32 x 32 float32 ramp (100.013 + 0.25 x + 0.5 y, nodata -99999 at (0, 0)), then
+    // quantize_geotiff of the result (int16 steps of 0.1 m around 112, nodata -32768).
+    #[test]
+    fn decodes_tiled_float_predictor() {
+        let raster = decode(include_bytes!("testdata/float32_tiled_predictor3.tif"));
+        assert_eq!((raster.width(), raster.height()), (32, 32));
+        assert_eq!(raster.nodata, Some(-99999.0));
+        assert_eq!(raster.sample(0, 0), None);
+        assert!((raster.sample(1, 0).unwrap() - 100.263).abs() < 1e-4);
+        assert!((raster.sample(5, 7).unwrap() - 104.763).abs() < 1e-4);
+        assert!((raster.sample(31, 31).unwrap() - 123.263).abs() < 1e-4);
+    }
+
+    #[test]
+    fn decodes_scaled_int_predictor() {
+        let raster = decode(include_bytes!("testdata/int16_scaled_predictor2.tif"));
+        assert_eq!((raster.width(), raster.height()), (32, 32));
+        assert_eq!(raster.nodata, None);
+        assert_eq!(raster.sample(0, 0), None);
+        assert!((raster.sample(1, 0).unwrap() - 100.3).abs() < 1e-9);
+        assert!((raster.sample(5, 7).unwrap() - 104.8).abs() < 1e-9);
+        assert!((raster.sample(31, 31).unwrap() - 123.3).abs() < 1e-9);
+    }
+}
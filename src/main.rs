@@ -13,6 +13,7 @@ mod locate;
 mod metadata;
 mod osm;
 mod progress;
+mod spawn;
 mod wmts;
 mod world;
 mod world_template;
@@ -24,6 +25,7 @@ use generate::run_generate;
 use info::run_info;
 use locate::run_locate;
 use rayon::ThreadPoolBuilder;
+use spawn::run_spawn;
 
 fn main() -> Result<()> {
     let args: Vec<String> = std::env::args().skip(1).collect();
@@ -40,5 +42,6 @@ fn main() -> Result<()> {
         Command::Locate(config) => run_locate(&config),
         Command::Bounds(config) => run_bounds(&config),
         Command::Info(config) => run_info(&config),
+        Command::Spawn(config) => run_spawn(&config),
     }
 }
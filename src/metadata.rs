@@ -1,7 +1,7 @@
-use std::fs;
+use std::fs::{self, File};
 use std::path::{Path, PathBuf};
 
-use anyhow::{Context, Result};
+use anyhow::{Context, Result, bail};
 use geo_types::Coord;
 use serde::{Deserialize, Serialize};
 
@@ -58,11 +58,50 @@ pub fn write_metadata(output: &Path, origin: Coord, stats: &WorldStats) -> Resul
     let metadata = WorldMetadata::from_stats(origin, stats);
     let path = metadata_path(output);
     let json = serde_json::to_string_pretty(&metadata)?;
-    fs::write(&path, json)
+    // Write beside the file and rename it into place: batch runs start other francegen
+    // processes on the same world, which must never read a half-written file.
+    let tmp = path.with_extension(format!("json.{}.tmp", std::process::id()));
+    fs::write(&tmp, json).with_context(|| format!("Failed to write metadata {}", tmp.display()))?;
+    fs::rename(&tmp, &path)
         .with_context(|| format!("Failed to write metadata {}", path.display()))?;
     Ok(path)
 }
 
+/// Folds `stats` into the metadata on disk and writes the union back, holding an
+/// exclusive lock on the `.lock` file beside it: batch runs finish concurrently on
+/// the same world and must not drop each other's bounds. Returns the written path
+/// and the merged stats.
+pub fn merge_metadata(
+    output: &Path,
+    origin: Coord,
+    stats: &WorldStats,
+) -> Result<(PathBuf, WorldStats)> {
+    let path = metadata_path(output);
+    let lock_path = path.with_extension("json.lock");
+    let lock = File::create(&lock_path)
+        .with_context(|| format!("Failed to open metadata lock {}", lock_path.display()))?;
+    lock.lock()
+        .with_context(|| format!("Failed to lock {}", lock_path.display()))?;
+    let merged = if path.exists() {
+        let current = load_metadata(&path)?;
+        if current.origin_model_x != origin.x || current.origin_model_z != origin.y {
+            bail!(
+                "Metadata {} has origin ({:.3}, {:.3}) instead of ({:.3}, {:.3})",
+                path.display(),
+                current.origin_model_x,
+                current.origin_model_z,
+                origin.x,
+                origin.y
+            );
+        }
+        current.to_stats().union(stats)
+    } else {
+        stats.clone()
+    };
+    write_metadata(output, origin, &merged)?;
+    Ok((path, merged))
+}
+
 pub fn load_metadata(world: &Path) -> Result<WorldMetadata> {
     let meta_path = metadata_path(world);
     let data = fs::read_to_string(&meta_path)
@@ -79,3 +118,39 @@ pub fn metadata_path(base: &Path) -> PathBuf {
         base.to_path_buf()
     }
 }
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+
+    fn metadata(min_x: i32, max_x: i32) -> WorldMetadata {
+        WorldMetadata {
+            origin_model_x: 10.5,
+            origin_model_z: 20.5,
+            min_x,
+            max_x,
+            min_z: 0,
+            max_z: 511,
+            min_height: 1.0,
+            max_height: 2.0,
+        }
+    }
+
+    #[test]
+    fn merge_metadata_keeps_bounds_of_other_runs() {
+        let world = std::env::temp_dir().join(format!("francegen-meta-{}", std::process::id()));
+        fs::create_dir_all(&world).unwrap();
+        let origin = Coord { x: 10.5, y: 20.5 };
+        // Another run finished first and wrote its own bounds.
+        write_metadata(&world, origin, &metadata(0, 511).to_stats()).unwrap();
+
+        let (_, merged) = merge_metadata(&world, origin, &metadata(512, 1023).to_stats()).unwrap();
+        assert_eq!((merged.min_x, merged.max_x), (0, 1023));
+        let stored = load_metadata(&world).unwrap();
+        assert_eq!((stored.min_x, stored.max_x), (0, 1023));
+
+        let moved = Coord { x: 0.0, y: 20.5 };
+        assert!(merge_metadata(&world, moved, &metadata(0, 1).to_stats()).is_err());
+        fs::remove_dir_all(&world).unwrap();
+    }
+}
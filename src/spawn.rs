@@ -0,0 +1,112 @@
+use std::fs::File;
+use std::path::Path;
+
+use anyhow::{Context, Result, bail};
+use fastanvil::Region;
+use fastnbt::LongArray;
+use owo_colors::OwoColorize;
+use serde::Deserialize;
+
+use crate::chunk::heightmap_column_top;
+use crate::cli::SpawnConfig;
+use crate::constants::SECTION_SIDE;
+use crate::generate::DEFAULT_SPAWN_Y;
+use crate::metadata::{load_metadata, metadata_path};
+use crate::world_template::{SpawnSettings, apply_world_template, world_level_name};
+
+const REGION_SIDE_CHUNKS: i32 = 32;
+
+#[derive(Deserialize)]
+struct ChunkHeightmaps {
+    #[serde(rename = "Heightmaps")]
+    heightmaps: Heightmaps,
+}
+
+#[derive(Deserialize)]
+struct Heightmaps {
+    #[serde(rename = "MOTION_BLOCKING")]
+    motion_blocking: LongArray,
+}
+
+/// Re-install level.dat with the spawn at the center of the whole world.
+///
+/// Every generate run places the spawn from the bounds it knows about, so
+/// worlds built by several (possibly concurrent) runs end up with the spawn of
+/// whichever run finished last; this recomputes it from the final metadata and
+/// the generated chunks.
+pub fn run_spawn(config: &SpawnConfig) -> Result<()> {
+    let world = &config.world;
+    let metadata = load_metadata(world)?;
+    if metadata.min_x > metadata.max_x || metadata.min_z > metadata.max_z {
+        bail!(
+            "World metadata {} does not cover any generated area yet",
+            metadata_path(world).display()
+        );
+    }
+    let stats = metadata.to_stats();
+    let spawn_x = stats.center_x.round() as i32;
+    let spawn_z = stats.center_z.round() as i32;
+    let spawn_y = match surface_height_at(world, spawn_x, spawn_z) {
+        Ok(height) => height.unwrap_or(DEFAULT_SPAWN_Y),
+        Err(err) => {
+            println!(
+                "{} Could not read the spawn column: {err:#}",
+                "⚠".yellow().bold()
+            );
+            DEFAULT_SPAWN_Y
+        }
+    };
+
+    let level_name = world_level_name(world);
+    apply_world_template(
+        world,
+        &SpawnSettings {
+            spawn_x,
+            spawn_y,
+            spawn_z,
+            level_name: &level_name,
+        },
+    )?;
+    println!(
+        "{} Spawn set to ({spawn_x}, {spawn_y}, {spawn_z}) in {}",
+        "✔".green().bold(),
+        world.join("level.dat").display()
+    );
+    Ok(())
+}
+
+/// Top block of column (`world_x`, `world_z`) from its chunk's MOTION_BLOCKING heightmap.
+fn surface_height_at(world: &Path, world_x: i32, world_z: i32) -> Result<Option<i32>> {
+    let section_side = SECTION_SIDE as i32;
+    let chunk_x = world_x.div_euclid(section_side);
+    let chunk_z = world_z.div_euclid(section_side);
+    let region_path = world.join("region").join(format!(
+        "r.{}.{}.mca",
+        chunk_x.div_euclid(REGION_SIDE_CHUNKS),
+        chunk_z.div_euclid(REGION_SIDE_CHUNKS)
+    ));
+    if !region_path.exists() {
+        return Ok(None);
+    }
+    let file = File::open(&region_path)
+        .with_context(|| format!("Failed to open region file {}", region_path.display()))?;
+    let mut region = Region::from_stream(file)
+        .with_context(|| format!("Failed to open existing region {}", region_path.display()))?;
+    let Some(bytes) = region
+        .read_chunk(
+            chunk_x.rem_euclid(REGION_SIDE_CHUNKS) as usize,
+            chunk_z.rem_euclid(REGION_SIDE_CHUNKS) as usize,
+        )
+        .with_context(|| format!("Failed to read chunk ({chunk_x}, {chunk_z})"))?
+    else {
+        return Ok(None);
+    };
+    let chunk: ChunkHeightmaps = fastnbt::from_bytes(&bytes)
+        .with_context(|| format!("Failed to decode chunk ({chunk_x}, {chunk_z})"))?;
+    let index = world_z.rem_euclid(section_side) as usize * SECTION_SIDE
+        + world_x.rem_euclid(section_side) as usize;
+    Ok(heightmap_column_top(
+        &chunk.heightmaps.motion_blocking,
+        index,
+    ))
+}
@@ -19,6 +19,15 @@ pub struct SpawnSettings<'a> {
     pub level_name: &'a str,
 }
 
+/// The level name francegen gives a world: its directory name.
+pub fn world_level_name(output: &Path) -> String {
+    output
+        .file_name()
+        .and_then(|value| value.to_str())
+        .map(|value| value.to_string())
+        .unwrap_or_else(|| "francegen_world".to_string())
+}
+
 pub fn apply_world_template(output: &Path, spawn: &SpawnSettings<'_>) -> Result<()> {
     let template_dir = Path::new(TEMPLATE_ROOT);
     if !template_dir.exists() {
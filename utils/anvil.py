@@ -0,0 +1,221 @@
+"""
+Low-level access to Minecraft Anvil region files (``region/r.X.Z.mca``).
+
+A region file starts with two 4 KiB tables of 1024 big-endian entries each:
+locations (3-byte sector offset + 1-byte sector count) and last-modified
+timestamps. Chunk payloads live in 4 KiB sectors as a 4-byte length, a
+1-byte compression id and the compressed NBT. Payloads are copied as opaque
+byte ranges; only ``repair_region`` decompresses them, to find damaged ones.
+"""
+import gzip
+import mmap
+import os
+import re
+import struct
+import zlib
+from dataclasses import dataclass
+from pathlib import Path
+
+SECTOR_BYTES = 4096
+HEADER_BYTES = 2 * SECTOR_BYTES
+CHUNKS_PER_REGION = 1024
+REGION_SIDE_CHUNKS = 32
+EXTERNAL_FLAG = 0x80  # compression id bit for chunks stored in c.X.Z.mcc files
+# Compression ids whose payloads repair_region can check (LZ4 and custom ones are kept as they are).
+DECOMPRESSORS = {1: gzip.decompress, 2: zlib.decompress, 3: bytes}
+REGION_NAME_RE = re.compile(r"^r\.(-?\d+)\.(-?\d+)\.mca$")
+
+
+@dataclass(frozen=True)
+class ChunkEntry:
+    index: int
+    sector_offset: int
+    sector_count: int
+    timestamp: int
+
+    @property
+    def local_x(self) -> int:
+        return self.index % REGION_SIDE_CHUNKS
+
+    @property
+    def local_z(self) -> int:
+        return self.index // REGION_SIDE_CHUNKS
+
+
+def parse_region_name(path: Path) -> tuple[int, int] | None:
+    match = REGION_NAME_RE.match(path.name)
+    if not match:
+        return None
+    return int(match.group(1)), int(match.group(2))
+
+
+def region_files(world_dir: Path) -> list[Path]:
+    region_dir = world_dir / "region"
+    if not region_dir.is_dir():
+        return []
+    return sorted(path for path in region_dir.iterdir() if parse_region_name(path) is not None)
+
+
+def parse_header(header: bytes) -> list[ChunkEntry]:
+    """Return the present chunks described by an 8 KiB region header."""
+    if len(header) < HEADER_BYTES:
+        return []
+    locations = struct.unpack(">1024I", header[:SECTOR_BYTES])
+    timestamps = struct.unpack(">1024I", header[SECTOR_BYTES:HEADER_BYTES])
+    entries = []
+    for index, location in enumerate(locations):
+        offset, count = location >> 8, location & 0xFF
+        if offset < 2 or count == 0:
+            continue
+        entries.append(ChunkEntry(index, offset, count, timestamps[index]))
+    return entries
+
+
+def read_header(path: Path) -> list[ChunkEntry]:
+    with open(path, "rb") as f:
+        return parse_header(f.read(HEADER_BYTES))
+
+
+class RegionReader:
+    """Memory-mapped read access to one region file."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._file = open(self.path, "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+        self.entries = {entry.index: entry for entry in parse_header(self._map[:HEADER_BYTES])} if self._map else {}
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def payload(self, index: int) -> memoryview | None:
+        """
+        The stored record of a chunk: length prefix, compression id and data,
+        trimmed to the declared length. None if the slot is empty or corrupt.
+        """
+        entry = self.entries.get(index)
+        if entry is None or self._map is None:
+            return None
+        start = entry.sector_offset * SECTOR_BYTES
+        if start + 5 > len(self._map):
+            return None
+        (length,) = struct.unpack(">I", self._map[start : start + 4])
+        end = start + 4 + length
+        if length == 0 or end > len(self._map) or end > start + entry.sector_count * SECTOR_BYTES:
+            return None
+        with memoryview(self._map) as view:
+            return view[start:end]
+
+    def has_payload(self, index: int) -> bool:
+        record = self.payload(index)
+        if record is None:
+            return False
+        record.release()
+        return True
+
+    def is_external(self, index: int) -> bool:
+        record = self.payload(index)
+        if record is None:
+            return False
+        external = bool(record[4] & EXTERNAL_FLAG)
+        record.release()
+        return external
+
+
+def external_chunk_path(region_path: Path, region_x: int, region_z: int, index: int) -> Path:
+    chunk_x = region_x * REGION_SIDE_CHUNKS + index % REGION_SIDE_CHUNKS
+    chunk_z = region_z * REGION_SIDE_CHUNKS + index // REGION_SIDE_CHUNKS
+    return region_path.parent / f"c.{chunk_x}.{chunk_z}.mcc"
+
+
+def write_region(path: Path, chunks: dict[int, tuple[bytes | memoryview, int]]) -> int:
+    """
+    Write a region file holding ``chunks`` (index -> (record, timestamp)).
+
+    Records are packed back to back in location-table order, each padded to
+    whole sectors. The file is written beside ``path`` and renamed into
+    place. Returns the size of the new file in bytes.
+    """
+    locations = [0] * CHUNKS_PER_REGION
+    timestamps = [0] * CHUNKS_PER_REGION
+    next_sector = 2
+    layout = []
+    for index in sorted(chunks):
+        record, timestamp = chunks[index]
+        sectors = (len(record) + SECTOR_BYTES - 1) // SECTOR_BYTES
+        if sectors > 0xFF:
+            raise ValueError(f"chunk {index} in {path.name} needs {sectors} sectors (max 255)")
+        locations[index] = (next_sector << 8) | sectors
+        timestamps[index] = timestamp
+        layout.append((record, sectors))
+        next_sector += sectors
+
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        f.write(struct.pack(">1024I", *locations))
+        f.write(struct.pack(">1024I", *timestamps))
+        for record, sectors in layout:
+            f.write(record)
+            f.write(b"\0" * (sectors * SECTOR_BYTES - len(record)))
+    os.replace(tmp, path)
+    return next_sector * SECTOR_BYTES
+
+
+def record_is_intact(record: bytes | memoryview) -> bool:
+    """True if a stored chunk record (length, compression id, data) decompresses."""
+    compression = record[4]
+    if compression & EXTERNAL_FLAG:
+        return True
+    decompress = DECOMPRESSORS.get(compression)
+    if decompress is None:
+        return True
+    try:
+        decompress(bytes(record[5:]))
+    except (OSError, EOFError, zlib.error):
+        return False
+    return True
+
+
+def repair_region(path: Path) -> tuple[int, int]:
+    """
+    Drop the chunks of a region file whose records are truncated or do not
+    decompress, as left behind by a writer killed mid-write, and rewrite the
+    file without them. A file too short to hold its header is deleted.
+    Returns (chunks kept, chunks dropped).
+    """
+    try:
+        size = path.stat().st_size
+    except FileNotFoundError:
+        return 0, 0
+    if size < HEADER_BYTES:
+        path.unlink()
+        return 0, 0
+    coords = parse_region_name(path)
+    kept: dict[int, tuple[bytes, int]] = {}
+    dropped = 0
+    with RegionReader(path) as reader:
+        for index, entry in reader.entries.items():
+            record = reader.payload(index)
+            if record is None:
+                dropped += 1
+                continue
+            intact = record_is_intact(record)
+            if intact and record[4] & EXTERNAL_FLAG and coords is not None:
+                intact = external_chunk_path(path, coords[0], coords[1], index).exists()
+            if intact:
+                kept[index] = (bytes(record), entry.timestamp)
+            else:
+                dropped += 1
+            record.release()
+    if dropped:
+        write_region(path, kept)
+    return len(kept), dropped
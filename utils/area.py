@@ -0,0 +1,161 @@
+"""
+Polygon areas of interest for batch runs.
+
+An area is read from a GeoJSON file (Polygon, MultiPolygon, Feature,
+FeatureCollection or GeometryCollection) or from WKT (POLYGON or
+MULTIPOLYGON, optionally with an ``SRID=2154;`` prefix), in EPSG:2154
+coordinates. ``Area.grid_cells`` returns the cells of a square grid that
+intersect it without testing cells against the polygon one by one: cells
+crossed by an edge are found by walking each edge through the grid, and
+cells inside the polygon by an even-odd scanline through the cell centers.
+The cost grows with the vertex count plus the number of cells, so
+department outlines with a million vertices stay cheap.
+"""
+import json
+import math
+import re
+from pathlib import Path
+
+WKT_TOKEN = re.compile(r"[(),]")
+
+Ring = list[tuple[float, float]]
+
+
+def _parse_wkt_nested(body: str) -> list:
+    """Nested lists of (x, y) tuples from the parenthesised part of a WKT geometry."""
+    stack: list[list] = [[]]
+    position = 0
+    for match in WKT_TOKEN.finditer(body):
+        text = body[position : match.start()].strip()
+        position = match.end()
+        if text:
+            values = text.split()
+            stack[-1].append((float(values[0]), float(values[1])))
+        if match.group() == "(":
+            stack.append([])
+        elif match.group() == ")":
+            if len(stack) == 1:
+                raise ValueError("Unbalanced parentheses in WKT")
+            done = stack.pop()
+            stack[-1].append(done)
+    if len(stack) != 1:
+        raise ValueError("Unbalanced parentheses in WKT")
+    return stack[0]
+
+
+def parse_wkt(text: str) -> list[list[Ring]]:
+    """Polygons (each a list of rings, exterior first) of a WKT POLYGON or MULTIPOLYGON."""
+    text = text.strip()
+    if text.upper().startswith("SRID="):
+        srid, _, text = text.partition(";")
+        if srid.split("=", 1)[1].strip() != "2154":
+            raise ValueError(f"Expected EPSG:2154 coordinates, got {srid}")
+    kind, _, body = text.partition("(")
+    kind = kind.strip().upper()
+    nested = _parse_wkt_nested("(" + body)
+    if kind == "POLYGON":
+        return [nested[0]]
+    if kind == "MULTIPOLYGON":
+        return nested[0]
+    raise ValueError(f"Unsupported WKT geometry '{kind}' (expected POLYGON or MULTIPOLYGON)")
+
+
+def geojson_polygons(obj: dict) -> list[list[Ring]]:
+    """Polygons of a GeoJSON geometry, feature or collection."""
+    kind = obj.get("type")
+    if kind == "FeatureCollection":
+        return [polygon for feature in obj["features"] for polygon in geojson_polygons(feature)]
+    if kind == "Feature":
+        return geojson_polygons(obj["geometry"]) if obj.get("geometry") else []
+    if kind == "GeometryCollection":
+        return [polygon for geometry in obj["geometries"] for polygon in geojson_polygons(geometry)]
+    if kind == "Polygon":
+        return [[[tuple(point[:2]) for point in ring] for ring in obj["coordinates"]]]
+    if kind == "MultiPolygon":
+        return [[[tuple(point[:2]) for point in ring] for ring in polygon] for polygon in obj["coordinates"]]
+    raise ValueError(f"Unsupported GeoJSON type '{kind}' (expected polygons)")
+
+
+def _segment_cells(u0: float, v0: float, u1: float, v1: float, cells: set[tuple[int, int]]):
+    """Add every grid cell the segment (u0, v0)-(u1, v1), in cell units, passes through."""
+    i, j = math.floor(u0), math.floor(v0)
+    i_end, j_end = math.floor(u1), math.floor(v1)
+    cells.add((i, j))
+    if (i, j) == (i_end, j_end):
+        return
+    du, dv = u1 - u0, v1 - v0
+    step_i = 1 if du > 0 else -1
+    step_j = 1 if dv > 0 else -1
+    t_max_u = ((i + (step_i > 0)) - u0) / du if du else math.inf
+    t_max_v = ((j + (step_j > 0)) - v0) / dv if dv else math.inf
+    t_delta_u = abs(1 / du) if du else math.inf
+    t_delta_v = abs(1 / dv) if dv else math.inf
+    for _ in range(abs(i_end - i) + abs(j_end - j)):
+        if t_max_u < t_max_v:
+            i += step_i
+            t_max_u += t_delta_u
+        else:
+            j += step_j
+            t_max_v += t_delta_v
+        cells.add((i, j))
+
+
+def _ring_edges(ring: Ring):
+    for index, start in enumerate(ring):
+        end = ring[(index + 1) % len(ring)]
+        if start != end:
+            yield start, end
+
+
+class Area:
+    def __init__(self, polygons: list[list[Ring]]):
+        self.polygons = [[ring for ring in polygon if len(ring) >= 3] for polygon in polygons]
+        self.polygons = [polygon for polygon in self.polygons if polygon]
+        if not self.polygons:
+            raise ValueError("The area contains no polygon")
+        points = [point for polygon in self.polygons for ring in polygon for point in ring]
+        self.bbox = (
+            min(x for x, _ in points),
+            min(y for _, y in points),
+            max(x for x, _ in points),
+            max(y for _, y in points),
+        )
+        if max(abs(value) for value in self.bbox) <= 360:
+            raise ValueError("The area looks like longitude/latitude; reproject it to EPSG:2154 (Lambert-93)")
+
+    @classmethod
+    def load(cls, source: str) -> "Area":
+        """Read a GeoJSON or WKT file, or inline WKT text."""
+        path = Path(source)
+        text = path.read_text(encoding="utf-8") if path.is_file() else source
+        stripped = text.lstrip()
+        if stripped.startswith("{"):
+            return cls(geojson_polygons(json.loads(text)))
+        return cls(parse_wkt(stripped))
+
+    def grid_cells(self, x0: float, y0: float, cell: float) -> set[tuple[int, int]]:
+        """
+        Cells (i, j) of the grid whose cell (i, j) spans [x0 + i * cell, x0 + (i + 1) * cell]
+        by [y0 + j * cell, y0 + (j + 1) * cell] that intersect the area.
+        """
+        cells: set[tuple[int, int]] = set()
+        for polygon in self.polygons:
+            crossings: dict[int, list[float]] = {}
+            for ring in polygon:
+                for (ax, ay), (bx, by) in _ring_edges(ring):
+                    u0, v0 = (ax - x0) / cell, (ay - y0) / cell
+                    u1, v1 = (bx - x0) / cell, (by - y0) / cell
+                    _segment_cells(u0, v0, u1, v1, cells)
+                    if v0 == v1:
+                        continue
+                    # Rows whose center line v = j + 0.5 this edge crosses (half-open in v).
+                    low, high = min(v0, v1), max(v0, v1)
+                    for j in range(math.ceil(low - 0.5), math.ceil(high - 0.5)):
+                        center = j + 0.5
+                        crossings.setdefault(j, []).append(u0 + (center - v0) * (u1 - u0) / (v1 - v0))
+            for j, row in crossings.items():
+                row.sort()
+                for start, end in zip(row[::2], row[1::2]):
+                    for i in range(math.ceil(start - 0.5), math.ceil(end - 0.5)):
+                        cells.add((i, j))
+        return cells
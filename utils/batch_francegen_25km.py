@@ -1,39 +1,119 @@
 #!/usr/bin/env python3
 """
-Download chunk-aligned macro-tiles from the IGN WMS and invoke francegen
-sequentially for each macro-tile, merging into a single world directory. Each
-macro-tile is 5 x 1024 m (≈5.12 km) per side, guaranteeing chunk alignment.
+Download region-aligned macro-tiles from the IGN WMS and run francegen on each
+macro-tile, merging into a single world directory. Macro-tiles whose region
+files do not overlap run in parallel (--parallel-macro-tiles, bounded by
+--memory-budget and --rss-soft-limit), while the next ones download. Each
+macro-tile is 5 x 1024 m (≈5.12 km) per side, i.e. exactly 10 x 10 Minecraft
+regions, and is snapped to the 512-block region grid of the world's blocks so
+every macro-tile owns a disjoint set of r.X.Z.mca files.
 
-The WMS request mirrors utils/wms_dl.py (same base URL, layer, pixel size, and
-tile dimensions). Each macro-tile is a 5x5 grid of 1024 m tiles.
+The WMS request mirrors utils/wms_dl.py (same base URL, layer and pixel size,
+shared through utils/wms_client.py). Each macro-tile is a 5x5 grid of 1024 m
+tiles by default; --macro-grid or --memory-budget change the grid size.
+--area limits the run to the tiles intersecting a polygon (see utils/area.py).
+--local-dem-root generates from a local archive of IGN dalles instead of the
+WMS (see utils/dem_index.py), fully offline. --repack rewrites downloaded
+tiles as DEFLATE or LZW GeoTIFFs before they are staged (see utils/dem_tools.py).
+
+--plan writes the macro-tiles of a run and its estimated cost (bytes, disk,
+RAM, hours) to a JSON plan without touching the network; --run-plan executes
+such a plan unchanged. With --queue, several workers (on one node or on many sharing a filesystem)
+lease macro-tiles from a common plan (see utils/work_queue.py) and each
+generates into its own scratch world, combined afterwards with
+utils/merge_worlds.py.
 """
 import argparse
-import datetime
+import collections
 import itertools
+import json
+import math
+import multiprocessing
 import os
 import shlex
 import subprocess
 import sys
+import threading
 import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, as_completed, wait
 from pathlib import Path
 
 import requests
 from tqdm import tqdm
 
-BASE_URL = "https://data.geopf.fr/wms-r"
-LAYER = "IGNF_LIDAR-HD_MNT_ELEVATION.ELEVATIONGRIDCOVERAGE.LAMB93"
-PIXEL_SIZE = 0.5  # meters per pixel
-# 2048 px @ 0.5 m/px -> 1024 m tiles (64 chunks), chunk-aligned
-TILE_WIDTH_PX = 2048
-TILE_HEIGHT_PX = 2048
-TILE_SIZE_M = TILE_WIDTH_PX * PIXEL_SIZE  # 1024m tiles
+from anvil import repair_region
+from area import Area
+from coverage_probe import EMPTY, FULL, probe_macro_tile, tile_key
+from dem_index import INDEX_FILE as LOCAL_DEM_INDEX_FILE, DemIndex
+from dem_tools import (
+    AGGREGATIONS,
+    COMPRESSIONS,
+    downsample_geotiff,
+    raster_libs_available,
+    raster_summary,
+    repack_geotiffs,
+    require_raster_libs,
+)
+from geotiff_header import TiffHeader, TiffHeaderError, read_tiff_header, validate_geotiff
+from ledger import completion_marker, mark_completed, marker_is_current, option_path, run_fingerprint, tile_checksums
+from region_index import RegionIndex
+from scheduling import (
+    DEFAULT_REGION_BYTES_PER_CHUNK,
+    DEFAULT_REQUEST_SECONDS,
+    DEFAULT_RSS_PER_KM2,
+    DEFAULT_SECONDS_PER_UNIT,
+    MAX_MACRO_TILE_GRID,
+    MIN_MACRO_TILE_GRID,
+    CostSignals,
+    copc_extents,
+    historical_seconds,
+    longest_first,
+    measured_download_rates,
+    measured_rss_per_km2,
+    measured_seconds_per_unit,
+    overlapping_bytes,
+    plan_for_memory,
+    predict_seconds,
+    run_peak_bytes,
+)
+from telemetry import ProcessUsage, RssWatchdog, RunLog, run_with_usage
+from tile_store import TileStore
+from wms_client import DEFAULT_RETRIES, RateController, download_with_retries, getmap_params, make_session
+from work_queue import LEASE_SECONDS, LeaseQueue, read_json, write_json
+from world_meta import (
+    META_FILE,
+    empty_metadata,
+    is_empty_metadata,
+    load_metadata,
+    metadata_lock,
+    union_metadata,
+    write_metadata,
+)
+
+TILE_SIZE_M = 1024  # 1024 m tiles (64 chunks), chunk-aligned
+# francegen rounds every sample to an integer block column, so 1 m/px (1024 px
+# tiles) carries all the information it keeps; 0.5 m/px (2048 px) downloads
+# four samples per column.
+PIXEL_SIZES = (0.5, 1.0)
+DEFAULT_PIXEL_SIZE = 1.0
+BLOCK_PIXEL_SIZE = 1.0
 CHUNK_SIZE_M = 16
+REGION_SIZE_M = 512  # 32 chunks per r.X.Z.mca file
 
 MACRO_TILE_GRID = 5  # 5 x 5 tiles per macro-tile
 # 5 x 1024 m -> 5,120 m (chunk-aligned) ≈ 26.2 km²
 MACRO_TILE_SIDE_M = MACRO_TILE_GRID * TILE_SIZE_M
-REQUEST_DELAY_S = 0.1  # polite delay between WMS calls
-DONE_MARKER = ".francegen_done"
+DEFAULT_DOWNLOAD_WORKERS = 4
+DEFAULT_MAX_DEFERRALS = 1
+DEFAULT_PREFETCH = 1  # macro-tiles downloaded ahead of the one francegen is processing
+REAP_POLL_S = 1.0  # how long to wait on running francegen processes before checking for downloads again
+FRANCEGEN_LOG = "francegen.log"
+PROBE_DIR = "coverage_probe"
+DEFAULT_MIN_COVERAGE = 0.98  # fraction of a macro-tile's chunks that must exist before it is marked done
+SCHEDULES = ("ring", "cost")
+PLAN_VERSION = 2
+CHUNK_CLOCK_SLACK_S = 2  # chunk timestamps are whole seconds
+LOCAL_FULL_COVERAGE = 0.999  # share of a tile local dalles must cover for the coverage check to count it
 
 
 def quantize_to_chunk(value: float) -> float:
@@ -41,15 +121,183 @@ def quantize_to_chunk(value: float) -> float:
     return round(value / CHUNK_SIZE_M) * CHUNK_SIZE_M
 
 
+def metadata_origin(meta: dict) -> tuple[float, float]:
+    """The model-space origin recorded in a francegen_meta.json payload."""
+    return meta["origin_model_x"], meta["origin_model_z"]
+
+
+def georeferenced_header(tif_path: Path) -> TiffHeader:
+    try:
+        header = read_tiff_header(tif_path)
+    except (OSError, TiffHeaderError) as exc:
+        raise RuntimeError(f"Cannot read the georeferencing of {tif_path}: {exc}") from exc
+    if not header.is_georeferenced:
+        raise RuntimeError(f"{tif_path} has no ModelTiepointTag/ModelPixelScaleTag")
+    return header
+
+
+def tile_origin(tif_path: Path) -> tuple[float, float]:
+    """
+    The origin francegen gives a fresh world whose first input tile is
+    ``tif_path``, read from the tile's georeferencing. Unlike ``--meta-only``
+    this also works for tiles that hold nothing but nodata (sea, borders).
+    """
+    return georeferenced_header(tif_path).origin()
+
+
+def tile_sample_shift(tif_path: Path) -> tuple[float, float]:
+    """Where francegen samples the pixels of ``tif_path`` relative to their corners (see ``TiffHeader.sample_shift``)."""
+    return georeferenced_header(tif_path).sample_shift()
+
+
+def gdal_sample_shift(pixel_size: float) -> tuple[float, float]:
+    """``tile_sample_shift`` of tiles written by GDAL, which marks them raster type 1, without reading one."""
+    return -0.5 * pixel_size, 0.5 * pixel_size
+
+
+def block_grid(origin: tuple[float, float], sample_shift: tuple[float, float]) -> tuple[float, float]:
+    """
+    Model-space top-left corner of the pixel francegen maps to block (0, 0) in
+    a world with ``origin``, for input tiles sampled ``sample_shift`` from their
+    pixel corners. Tile edges lie on this grid, not on the origin itself.
+    """
+    return origin[0] - sample_shift[0], origin[1] - sample_shift[1]
+
+
+def round_half_away(value: float) -> int:
+    """Round like Rust's ``f64::round``, which francegen uses for blocks: ties away from zero."""
+    return int(math.copysign(math.floor(abs(value) + 0.5), value))
+
+
+def reset_spawn(bin_path: str, world_dir: Path):
+    """
+    Recompute the spawn of a finished world with ``francegen spawn``: every run
+    placed it from the bounds it knew about, concurrent runs from partial ones.
+    """
+    result = subprocess.run([bin_path, "spawn", str(world_dir)], check=False)
+    if result.returncode != 0:
+        print(
+            f"francegen spawn failed with exit code {result.returncode}; level.dat keeps the last run's spawn",
+            file=sys.stderr,
+        )
+
+
+def snap_center_to_regions(
+    center_x: float, center_y: float, grid_corner: tuple[float, float], side_m: float = MACRO_TILE_SIDE_M
+) -> tuple[float, float]:
+    """
+    Move a macro-tile center so its edges fall on region boundaries of the world.
+
+    ``grid_corner`` is the ``block_grid`` of the world: a macro-tile starts on a
+    region boundary when ``min_x - grid_x`` and ``grid_y - max_y`` are multiples
+    of 512, so its first pixels land on block 512 * k, not on a rounding tie.
+    """
+    grid_x, grid_y = grid_corner
+    half = side_m / 2
+    min_x = grid_x + round((center_x - half - grid_x) / REGION_SIZE_M) * REGION_SIZE_M
+    max_y = grid_y - round((grid_y - (center_y + half)) / REGION_SIZE_M) * REGION_SIZE_M
+    return min_x + half, max_y - half
+
+
+def macro_tile_bbox(
+    center_x: float, center_y: float, side_m: float = MACRO_TILE_SIDE_M
+) -> tuple[float, float, float, float]:
+    half = side_m / 2
+    return center_x - half, center_y - half, center_x + half, center_y + half
+
+
+def bbox_blocks(
+    bbox: tuple[float, float, float, float], grid_corner: tuple[float, float]
+) -> tuple[int, int, int, int]:
+    """Inclusive (min_x, max_x, min_z, max_z) block range francegen writes for a model-space bbox (see ``block_grid``)."""
+    min_x, min_y, max_x, max_y = bbox
+    grid_x, grid_y = grid_corner
+    min_block_x = round_half_away(min_x - grid_x)
+    min_block_z = round_half_away(grid_y - max_y)
+    return (
+        min_block_x,
+        min_block_x + round_half_away(max_x - min_x) - 1,
+        min_block_z,
+        min_block_z + round_half_away(max_y - min_y) - 1,
+    )
+
+
+def bbox_regions(
+    bbox: tuple[float, float, float, float], grid_corner: tuple[float, float]
+) -> tuple[int, int, int, int]:
+    """Inclusive (min_rx, max_rx, min_rz, max_rz) of the region files a bbox writes."""
+    return tuple(value // REGION_SIZE_M for value in bbox_blocks(bbox, grid_corner))
+
+
+def bbox_chunks(
+    bbox: tuple[float, float, float, float], grid_corner: tuple[float, float]
+) -> tuple[int, int, int, int]:
+    """Inclusive (min_cx, max_cx, min_cz, max_cz) of the chunks a bbox should produce."""
+    return tuple(value // CHUNK_SIZE_M for value in bbox_blocks(bbox, grid_corner))
+
+
+def macro_tile_regions(
+    center_x: float, center_y: float, grid_corner: tuple[float, float], side_m: float = MACRO_TILE_SIDE_M
+) -> tuple[int, int, int, int]:
+    """Inclusive (min_rx, max_rx, min_rz, max_rz) of the region files a macro-tile writes."""
+    return bbox_regions(macro_tile_bbox(center_x, center_y, side_m), grid_corner)
+
+
+def regions_overlap(a: tuple[int, int, int, int], b: tuple[int, int, int, int]) -> bool:
+    return a[0] <= b[1] and b[0] <= a[1] and a[2] <= b[3] and b[2] <= a[3]
+
+
+class WorldMetadataMerger:
+    """
+    Keeps a running union of francegen_meta.json across the runs of a batch.
+
+    francegen folds each run into the file under a lock when it exits
+    (``merge_metadata`` in src/metadata.rs), so concurrent runs keep each
+    other's bounds. After every run the orchestrator folds the file into its
+    own union under the same lock and writes that back.
+    """
+
+    def __init__(self, world_dir: Path):
+        self.path = world_dir / META_FILE
+        self._merged = self._read()
+        self._lock = threading.Lock()
+
+    def _read(self, attempts: int = 5) -> dict | None:
+        for attempt in range(attempts):
+            if not self.path.exists():
+                return None
+            try:
+                return json.loads(self.path.read_text(encoding="utf-8"))
+            except json.JSONDecodeError:
+                # Another francegen may be rewriting the file right now.
+                if attempt == attempts - 1:
+                    raise
+                time.sleep(0.2)
+        return None
+
+    def absorb(self):
+        with self._lock, metadata_lock(self.path.parent):
+            self._merged = union_metadata(self._merged, self._read())
+            if self._merged is not None:
+                write_metadata(self.path.parent, self._merged)
+
+
 def parse_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser(
-        description="Download chunk-aligned macro-tiles and run francegen sequentially."
+        description="Download region-aligned macro-tiles and run francegen on them in parallel."
     )
     parser.add_argument(
         "--tiles-root",
         required=True,
         help="Directory to store downloaded GeoTIFFs (macro-tile subfolders will be created).",
     )
+    parser.add_argument(
+        "--tile-store",
+        help=(
+            "Coordinate-keyed tile store shared by all runs (default: <tiles-root>/store). "
+            "Macro-tile folders are staged from hardlinks (or symlinks) into it."
+        ),
+    )
     parser.add_argument(
         "--world",
         required=True,
@@ -58,14 +306,12 @@ def parse_args() -> argparse.Namespace:
     parser.add_argument(
         "--center-x",
         type=float,
-        required=True,
-        help="Center X coordinate (EPSG:2154 / LAMB93).",
+        help="Center X coordinate (EPSG:2154 / LAMB93). Required unless a plan is given.",
     )
     parser.add_argument(
         "--center-y",
         type=float,
-        required=True,
-        help="Center Y coordinate (EPSG:2154 / LAMB93).",
+        help="Center Y coordinate (EPSG:2154 / LAMB93). Required unless a plan is given.",
     )
     parser.add_argument(
         "--macro-radius",
@@ -73,6 +319,29 @@ def parse_args() -> argparse.Namespace:
         default=0,
         help="Number of macro-tiles to include outward from the center in each axis (0 = just the center tile, 1 = 3x3 grid, etc.).",
     )
+    parser.add_argument(
+        "--area",
+        help=(
+            "Polygon to generate instead of a --macro-radius square: a GeoJSON or WKT file (or inline WKT) "
+            "in EPSG:2154. Only the macro-tiles and 1024 m tiles intersecting it are downloaded and "
+            "generated; the center defaults to the middle of its bounding box."
+        ),
+    )
+    parser.add_argument(
+        "--local-dem-root",
+        help=(
+            "Generate from a local archive of IGN DEM dalles (e.g. LiDAR HD MNT GeoTIFFs, searched "
+            "recursively) instead of the WMS. Each macro-tile folder gets symlinks to the dalles it "
+            "overlaps, and francegen is limited to the macro-tile with --bounds; nothing is downloaded."
+        ),
+    )
+    parser.add_argument(
+        "--local-dem-index",
+        help=(
+            "Spatial index of --local-dem-root, created or refreshed on every run "
+            f"(default: <tiles-root>/{LOCAL_DEM_INDEX_FILE})."
+        ),
+    )
     parser.add_argument(
         "--francegen-bin",
         default="francegen",
@@ -86,20 +355,223 @@ def parse_args() -> argparse.Namespace:
     parser.add_argument(
         "--skip-existing",
         action="store_true",
-        help="Skip downloading tiles that already exist on disk.",
+        help=(
+            "Skip downloading tiles that already exist in the tile store and pass a header check "
+            "(TIFF magic, expected size, GeoTIFF tags); anything else is downloaded again."
+        ),
+    )
+    parser.add_argument(
+        "--pixel-size",
+        type=float,
+        choices=PIXEL_SIZES,
+        default=DEFAULT_PIXEL_SIZE,
+        help=(
+            f"DEM resolution requested from the WMS in meters per pixel (default: {DEFAULT_PIXEL_SIZE}, "
+            "one sample per Minecraft column)."
+        ),
+    )
+    parser.add_argument(
+        "--downsample",
+        choices=AGGREGATIONS,
+        help=(
+            "With --pixel-size 0.5, aggregate each 2x2 block to 1 m/px with this function before "
+            "handing tiles to francegen (requires numpy and rasterio)."
+        ),
+    )
+    parser.add_argument(
+        "--repack",
+        choices=COMPRESSIONS,
+        help=(
+            "Rewrite every downloaded tile in the store as a compressed GeoTIFF with this codec, a "
+            "floating-point predictor and 256 px internal tiles, in a process pool (requires numpy and "
+            "rasterio). Existing store tiles can be converted with utils/dem_tools.py repack --relink "
+            "<tiles-root>, which also points the macro-tile folders at the repacked files."
+        ),
+    )
+    parser.add_argument(
+        "--download-workers",
+        type=int,
+        default=DEFAULT_DOWNLOAD_WORKERS,
+        help=(
+            "Maximum number of tiles to download concurrently over a shared keep-alive connection pool "
+            f"(default: {DEFAULT_DOWNLOAD_WORKERS}, 1 = sequential). The adaptive rate controller "
+            "ramps up to this limit while the WMS responds quickly and backs off when it throttles."
+        ),
+    )
+    parser.add_argument(
+        "--download-retries",
+        type=int,
+        default=DEFAULT_RETRIES,
+        help=f"Extra attempts per tile, with exponential backoff and jitter (default: {DEFAULT_RETRIES}).",
+    )
+    parser.add_argument(
+        "--max-deferrals",
+        type=int,
+        default=DEFAULT_MAX_DEFERRALS,
+        help=(
+            "How many times an incomplete macro-tile is moved to the back of the queue and its missing "
+            f"tiles downloaded again before it is given up on (default: {DEFAULT_MAX_DEFERRALS}). "
+            "francegen never runs on a macro-tile with missing tiles."
+        ),
+    )
+    parser.add_argument(
+        "--prefetch",
+        type=int,
+        default=DEFAULT_PREFETCH,
+        help=(
+            "Number of macro-tiles to download ahead (in ring order) while francegen processes the "
+            f"current one (default: {DEFAULT_PREFETCH}, 0 = download and generate strictly in turn)."
+        ),
+    )
+    parser.add_argument(
+        "--prefetch-max-gb",
+        type=float,
+        help=(
+            "Stop prefetching while downloaded-but-not-generated macro-tiles use more than this many GB "
+            "(the next macro-tile is always allowed when nothing is waiting)."
+        ),
+    )
+    parser.add_argument(
+        "--parallel-macro-tiles",
+        type=int,
+        help=(
+            "Number of francegen processes to run at once on macro-tiles whose region files do not "
+            "overlap (default: 1, or as many as --memory-budget allows). Output of each run goes to "
+            "francegen.log in its macro-tile folder."
+        ),
+    )
+    parser.add_argument(
+        "--macro-grid",
+        type=int,
+        help=(
+            f"Tiles per macro-tile side ({MIN_MACRO_TILE_GRID}-{MAX_MACRO_TILE_GRID}, default: "
+            f"{MACRO_TILE_GRID}, or the largest that fits --memory-budget). --macro-radius keeps "
+            f"meaning {MACRO_TILE_GRID}-tile macro-tiles, so the covered area does not change."
+        ),
+    )
+    parser.add_argument(
+        "--memory-budget",
+        type=float,
+        help=(
+            "RAM in GB available to francegen. Picks the macro-tile size and the number of concurrent "
+            "francegen processes from the peak RSS per km² measured in the run log (or a conservative "
+            "estimate before any run has been logged)."
+        ),
+    )
+    parser.add_argument(
+        "--rss-soft-limit",
+        type=float,
+        help=(
+            "Combined francegen RSS in GB above which no new download or francegen run starts "
+            "(default: 85%% of --memory-budget when given)."
+        ),
+    )
+    parser.add_argument(
+        "--rss-hard-limit",
+        type=float,
+        help=(
+            "Combined francegen RSS in GB above which the largest francegen process is killed and its "
+            "macro-tile requeued as smaller sub-tiles (default: --memory-budget when given)."
+        ),
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        help=(
+            "Total worker threads to share between concurrent francegen processes; each one gets "
+            "--threads <total / --parallel-macro-tiles>."
+        ),
+    )
+    parser.add_argument(
+        "--run-log",
+        help=(
+            "JSON-lines file receiving per-macro-tile download and francegen resource usage "
+            "(default: <tiles-root>.runs.jsonl next to the tiles root)."
+        ),
+    )
+    parser.add_argument(
+        "--min-coverage",
+        type=float,
+        default=DEFAULT_MIN_COVERAGE,
+        help=(
+            "Fraction of a macro-tile's chunks that must be present in the region files before it "
+            f"is marked completed (default: {DEFAULT_MIN_COVERAGE}). Lower it for coastal areas "
+            "where the DEM has no data; 0 disables the check."
+        ),
+    )
+    parser.add_argument(
+        "--coverage-probe",
+        action="store_true",
+        help=(
+            "Before downloading a macro-tile, fetch one low-resolution GetMap of it and skip the tiles "
+            "that hold no data; macro-tiles without any data skip francegen entirely. The coverage "
+            "check then only counts tiles the probe saw fully covered (requires numpy and rasterio)."
+        ),
+    )
+    parser.add_argument(
+        "--schedule",
+        choices=SCHEDULES,
+        default="ring",
+        help=(
+            "Order in which macro-tiles are processed: 'ring' goes outward from the center (good for "
+            "previewing), 'cost' starts with the macro-tiles predicted to take longest so parallel runs "
+            "and queue workers finish together. Predictions use earlier wall times from the run log, "
+            "otherwise the nodata share and relief of tiles already in the store and the size of "
+            "--copc-dir point clouds they overlap."
+        ),
+    )
+    parser.add_argument(
+        "--plan",
+        metavar="PLAN_JSON",
+        help=(
+            "Dry run: enumerate the macro-tiles and tiles, estimate download bytes and time, region "
+            "output size, peak RAM and francegen time from the run log, write the plan to PLAN_JSON "
+            "and exit without touching the network."
+        ),
+    )
+    parser.add_argument(
+        "--run-plan",
+        metavar="PLAN_JSON",
+        help=(
+            "Process exactly the macro-tiles of a plan written by --plan (center, grid and order "
+            "included). With --queue, the plan is published to the queue."
+        ),
+    )
+    parser.add_argument(
+        "--queue",
+        help=(
+            "Shared queue directory (e.g. on NFS) to pull macro-tiles from as one of several workers. "
+            "The first worker writes the plan from its --center/--macro-radius or --area; every worker then "
+            "leases macro-tiles from it and generates them into its own scratch world "
+            "<world>/scratch/<worker-id>, to be combined with utils/merge_worlds.py."
+        ),
+    )
+    parser.add_argument(
+        "--worker-id",
+        help="Name of this worker in the queue and of its scratch world (default: <hostname>-<pid>).",
+    )
+    parser.add_argument(
+        "--lease-seconds",
+        type=float,
+        default=LEASE_SECONDS,
+        help=(
+            "How long a macro-tile lease survives without a heartbeat before other workers reclaim it "
+            f"(default: {LEASE_SECONDS:.0f}). Heartbeats are sent every tenth of this."
+        ),
     )
     parser.add_argument(
         "--resume",
         action="store_true",
         help=(
-            "Skip macro-tiles that already have completion markers in the tiles root. "
-            "Useful after an interrupted run or when reordering tiles."
+            "Skip macro-tiles whose completion marker in the tiles root matches the current inputs "
+            "(tile checksums, francegen binary, --config contents and francegen args). Useful after "
+            "an interrupted run or when reordering tiles; changed macro-tiles are redone."
         ),
     )
     return parser.parse_args()
 
 
-def macro_tile_centers(center_x: float, center_y: float, radius: int):
+def macro_tile_centers(center_x: float, center_y: float, radius: int, side_m: float = MACRO_TILE_SIDE_M):
     """Yield (macro_x_idx, macro_y_idx, center_x, center_y) in concentric rings, row-ordered within each ring."""
     for ring in range(0, radius + 1):
         for dy in range(-ring, ring + 1):
@@ -109,133 +581,1418 @@ def macro_tile_centers(center_x: float, center_y: float, radius: int):
                 yield (
                     dx,
                     dy,
-                    center_x + dx * MACRO_TILE_SIDE_M,
-                    center_y + dy * MACRO_TILE_SIDE_M,
+                    center_x + dx * side_m,
+                    center_y + dy * side_m,
                 )
 
 
-def download_macro_tile(dest_dir: Path, center_x: float, center_y: float, skip_existing: bool):
-    dest_dir.mkdir(parents=True, exist_ok=True)
-    start_x = center_x - (MACRO_TILE_SIDE_M / 2)
-    start_y = center_y - (MACRO_TILE_SIDE_M / 2)
-
-    tile_indices = list(itertools.product(range(MACRO_TILE_GRID), range(MACRO_TILE_GRID)))
-    for col, row in tqdm(tile_indices, unit="tile", desc=f"Downloading {dest_dir.name}"):
+def macro_tile_bboxes(center_x: float, center_y: float, grid: int = MACRO_TILE_GRID):
+    """Yield (col, row, bbox) for the tiles of the macro-tile centered on (center_x, center_y)."""
+    start_x = center_x - (grid * TILE_SIZE_M / 2)
+    start_y = center_y - (grid * TILE_SIZE_M / 2)
+    for col, row in itertools.product(range(grid), range(grid)):
         min_x = start_x + (col * TILE_SIZE_M)
         min_y = start_y + (row * TILE_SIZE_M)
-        max_x = min_x + TILE_SIZE_M
-        max_y = min_y + TILE_SIZE_M
+        yield col, row, (min_x, min_y, min_x + TILE_SIZE_M, min_y + TILE_SIZE_M)
+
+
+def macro_dir_name(mx: int, my: int, grid: int = MACRO_TILE_GRID) -> str:
+    # Non-default sizes get their own folders so markers never describe a different footprint.
+    prefix = "macro" if grid == MACRO_TILE_GRID else f"macro{grid}"
+    return f"{prefix}_x{mx:+d}_y{my:+d}"
+
+
+def selected_tiles(center_x: float, center_y: float, grid: int, keep: set[tuple[int, int]] | None = None) -> list:
+    """(col, row, bbox) tiles of a macro-tile, restricted to the (col, row) pairs in ``keep`` when given."""
+    return [tile for tile in macro_tile_bboxes(center_x, center_y, grid) if keep is None or tile[:2] in keep]
+
+
+def macro_tiles_in_area(area: Area, center_x: float, center_y: float, grid: int) -> tuple[list, dict]:
+    """
+    Macro-tiles around (center_x, center_y), in ring order, with at least one
+    tile intersecting ``area``, and for those only partly inside it, the
+    (col, row) tiles to keep keyed by macro-tile folder name.
+    """
+    side_m = grid * TILE_SIZE_M
+    cells = area.grid_cells(center_x - side_m / 2, center_y - side_m / 2, TILE_SIZE_M)
+    by_macro: dict[tuple[int, int], set[tuple[int, int]]] = {}
+    for i, j in cells:
+        by_macro.setdefault((i // grid, j // grid), set()).add((i % grid, j % grid))
+    radius = max(max(abs(mx), abs(my)) for mx, my in by_macro)
+    macro_tiles = []
+    selection = {}
+    for mx, my, cx, cy in macro_tile_centers(center_x, center_y, radius, side_m):
+        keep = by_macro.get((mx, my))
+        if not keep:
+            continue
+        macro_tiles.append((mx, my, cx, cy))
+        if len(keep) < grid * grid:
+            selection[macro_dir_name(mx, my, grid)] = keep
+    return macro_tiles, selection
+
+
+def first_tile(macro_tiles, grid: int, selection: dict) -> tuple[float, float, int, int, tuple]:
+    """
+    (center_x, center_y, col, row, bbox) of the tile francegen reads first when
+    generating the first macro-tile: the lowest GeoTIFF name in its folder.
+    """
+    mx, my, cx, cy = macro_tiles[0]
+    tiles = selected_tiles(cx, cy, grid, selection.get(macro_dir_name(mx, my, grid)))
+    col, row, bbox = min(tiles, key=lambda tile: tile_filename(Path(), tile[0], tile[1]).name)
+    return cx, cy, col, row, bbox
+
+
+def scaled_macro_radius(radius: int, grid: int) -> int:
+    """Radius in ``grid``-tile macro-tiles covering at least the area of ``radius`` default macro-tiles."""
+    extent_tiles = (2 * radius + 1) * MACRO_TILE_GRID
+    return max(0, math.ceil((extent_tiles / grid - 1) / 2))
+
+
+def tiles_bbox(tiles) -> tuple[float, float, float, float]:
+    """Bounding box of (col, row, bbox) tiles."""
+    return (
+        min(bbox[0] for _, _, bbox in tiles),
+        min(bbox[1] for _, _, bbox in tiles),
+        max(bbox[2] for _, _, bbox in tiles),
+        max(bbox[3] for _, _, bbox in tiles),
+    )
+
+
+def split_tiles(tiles) -> list[list]:
+    """
+    Split a rectangle of (col, row, bbox) tiles into up to four quadrants, the
+    one holding the lowest col/row first. A single tile cannot be split.
+    """
+    if len(tiles) <= 1:
+        return []
+    cols = sorted({col for col, _, _ in tiles})
+    rows = sorted({row for _, row, _ in tiles})
+    col_halves = [cols[: (len(cols) + 1) // 2], cols[(len(cols) + 1) // 2 :]]
+    row_halves = [rows[: (len(rows) + 1) // 2], rows[(len(rows) + 1) // 2 :]]
+    parts = []
+    for col_half in col_halves:
+        for row_half in row_halves:
+            part = [tile for tile in tiles if tile[0] in col_half and tile[1] in row_half]
+            if part:
+                parts.append(part)
+    return parts
+
+
+def tile_filename(dest_dir: Path, col: int, row: int) -> Path:
+    return dest_dir / f"elevation_{col}_{row}.tif"
+
+
+def tile_pixels(pixel_size: float) -> int:
+    return int(round(TILE_SIZE_M / pixel_size))
+
+
+def tile_is_valid(filename: Path, pixel_size: float) -> bool:
+    size = tile_pixels(pixel_size)
+    return filename.exists() and validate_geotiff(filename, size, size) is None
+
+
+def downsample_tiles(tiles, source: TileStore, target: TileStore, method: str):
+    """Refresh aggregated copies in ``target`` for every valid source tile newer than its copy."""
+    factor = int(round(target.pixel_size / source.pixel_size))
+    for _col, _row, bbox in tiles:
+        src = source.path_for(bbox)
+        dst = target.path_for(bbox)
+        if not tile_is_valid(src, source.pixel_size):
+            continue
+        if tile_is_valid(dst, target.pixel_size) and dst.stat().st_mtime >= src.stat().st_mtime:
+            continue
+        downsample_geotiff(src, dst, factor, method)
+
+
+def macro_tile_signals(tiles, store: TileStore, copc=None) -> CostSignals:
+    """
+    Cost signals of a macro-tile from those of its tiles already in ``store``
+    and the ``copc_extents`` it overlaps.
+    """
+    bbox = tiles_bbox(tiles)
+    signals = CostSignals(len(tiles) * TILE_SIZE_M**2 / 1e6)
+    if copc:
+        signals.copc_bytes = overlapping_bytes(copc, bbox)
+    if not raster_libs_available():
+        return signals
+    valid = total = 0
+    low = high = None
+    for _col, _row, tile_bbox in tiles:
+        path = store.path_for(tile_bbox)
+        if not tile_is_valid(path, store.pixel_size):
+            continue
+        tile_valid, tile_total, tile_low, tile_high = raster_summary(path)
+        valid += tile_valid
+        total += tile_total
+        if tile_valid:
+            low = tile_low if low is None else min(low, tile_low)
+            high = tile_high if high is None else max(high, tile_high)
+    if total:
+        signals.data_fraction = valid / total
+        signals.relief_m = high - low if valid else 0.0
+    return signals
+
+
+def predicted_seconds(
+    macro_tiles, grid: int, store: TileStore, copc, records: list[dict], selection: dict | None = None
+) -> list[float]:
+    """Predicted francegen wall time of each (mx, my, cx, cy) macro-tile."""
+    history = historical_seconds(records)
+    seconds_per_unit = measured_seconds_per_unit(records) or DEFAULT_SECONDS_PER_UNIT
+    selection = selection or {}
+    costs = []
+    for mx, my, cx, cy in macro_tiles:
+        name = macro_dir_name(mx, my, grid)
+        signals = None
+        if name not in history:
+            signals = macro_tile_signals(selected_tiles(cx, cy, grid, selection.get(name)), store, copc)
+        costs.append(predict_seconds(name, signals, history, seconds_per_unit))
+    return costs
+
+
+def order_by_cost(
+    macro_tiles, grid: int, store: TileStore, copc, records: list[dict], selection: dict | None = None
+) -> list:
+    """Order (mx, my, cx, cy) macro-tiles longest-predicted-first and report the prediction."""
+    costs = predicted_seconds(macro_tiles, grid, store, copc, records, selection)
+    history = historical_seconds(records)
+    known = sum(1 for mx, my, _, _ in macro_tiles if macro_dir_name(mx, my, grid) in history)
+    seconds_per_unit = measured_seconds_per_unit(records) or DEFAULT_SECONDS_PER_UNIT
+    print(
+        f"Scheduling longest first: ~{sum(costs) / 3600:.1f} h of francegen in total, longest ~{max(costs) / 60:.0f} min "
+        f"({known} macro-tile(s) timed by earlier runs, {seconds_per_unit:.1f} s per cost unit otherwise)"
+    )
+    return longest_first(macro_tiles, costs)
+
+
+def build_work_plan(
+    center, grid: int, pixel_size: float, origin, grid_corner, macro_tiles, selection: dict | None = None
+) -> dict:
+    """
+    The JSON work plan shared by --plan, --run-plan and --queue. Items of
+    macro-tiles in ``selection`` list the (col, row) tiles to generate.
+    """
+    items = []
+    for mx, my, cx, cy in macro_tiles:
+        item = {"id": macro_dir_name(mx, my, grid), "macro": [mx, my, cx, cy]}
+        if selection and item["id"] in selection:
+            item["tiles"] = [list(tile) for tile in sorted(selection[item["id"]])]
+        items.append(item)
+    return {
+        "version": PLAN_VERSION,
+        "center": list(center),
+        "grid": grid,
+        "pixel_size": pixel_size,
+        "origin": list(origin),
+        "block_grid": list(grid_corner),
+        "seed_metadata": None,
+        "items": items,
+    }
+
+
+def plan_selection(plan: dict) -> dict[str, set[tuple[int, int]]]:
+    """The (col, row) tiles to keep of each plan item that does not cover its whole macro-tile."""
+    return {item["id"]: {tuple(tile) for tile in item["tiles"]} for item in plan["items"] if "tiles" in item}
 
-        bbox_str = f"{min_x},{min_y},{max_x},{max_y}"
-        filename = dest_dir / f"elevation_{col}_{row}.tif"
 
+def load_work_plan(path: Path) -> dict:
+    plan = read_json(path)
+    if plan is None or plan.get("version") != PLAN_VERSION:
+        raise ValueError(f"{path} is not a batch plan written by --plan")
+    return plan
+
+
+def write_work_plan(path: Path, plan: dict):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    write_json(path, plan)
+
+
+def estimate_work_plan(
+    plan: dict,
+    store: TileStore,
+    copc,
+    records: list[dict],
+    parallel: int,
+    rss_per_km2: float,
+    world_dir: Path,
+    skip_existing: bool,
+    download_workers: int,
+    local: DemIndex | None = None,
+) -> dict:
+    """
+    Resource estimates for a plan from the run log, the tile store and the
+    region files already in ``world_dir``; nothing is downloaded. With a
+    ``local`` dalle archive, tiles it covers count as available and nothing
+    is left to download.
+    """
+    grid = plan["grid"]
+    macro_tiles = [tuple(item["macro"]) for item in plan["items"]]
+    selection = plan_selection(plan)
+    tile_count = 0
+    cached = 0
+    for mx, my, cx, cy in macro_tiles:
+        for _col, _row, bbox in selected_tiles(cx, cy, grid, selection.get(macro_dir_name(mx, my, grid))):
+            tile_count += 1
+            if local is not None:
+                cached += local.covered_fraction(bbox) > 0
+            else:
+                cached += skip_existing and tile_is_valid(store.path_for(bbox), store.pixel_size)
+    requests_needed = 0 if local is not None else tile_count - cached
+
+    rates = measured_download_rates(records)
+    tile_px = tile_pixels(plan["pixel_size"])
+    if rates is not None:
+        bytes_per_request, seconds_per_request = rates
+    else:
+        # Uncompressed float32 tiles, one request in flight per download worker.
+        bytes_per_request = tile_px * tile_px * 4
+        seconds_per_request = DEFAULT_REQUEST_SECONDS / max(1, download_workers)
+    download_s = requests_needed * seconds_per_request
+
+    area_km2 = tile_count * TILE_SIZE_M**2 / 1e6
+    index = RegionIndex.load(world_dir, save=False)
+    region_bytes = sum(region.size for region in index.regions.values())
+    bytes_per_chunk = region_bytes / index.chunk_count if index.chunk_count else DEFAULT_REGION_BYTES_PER_CHUNK
+    chunks = area_km2 * 1e6 / CHUNK_SIZE_M**2
+
+    costs = predicted_seconds(macro_tiles, grid, store, copc, records, selection)
+    francegen_s = max(sum(costs) / parallel, max(costs)) if costs else 0.0
+    return {
+        "macro_tiles": len(macro_tiles),
+        "tiles": tile_count,
+        "tiles_in_store": int(cached),
+        "local": local is not None,
+        "area_km2": round(area_km2, 3),
+        "download_bytes": round(requests_needed * bytes_per_request),
+        "download_s": round(download_s),
+        "download_measured": rates is not None,
+        "store_bytes": round(tile_count * bytes_per_request) if local is None else 0,
+        "region_bytes": round(chunks * bytes_per_chunk),
+        "region_bytes_measured": bool(index.chunk_count),
+        "peak_rss_bytes": round(run_peak_bytes(grid, TILE_SIZE_M, rss_per_km2) * parallel),
+        "parallel": parallel,
+        "francegen_s": round(francegen_s),
+        "longest_macro_tile_s": round(max(costs)) if costs else 0,
+        # Downloads overlap generation through the prefetcher.
+        "wall_s": round(max(download_s, francegen_s)),
+    }
+
+
+def print_estimates(estimates: dict):
+    def hours(seconds: float) -> str:
+        return f"{seconds / 3600:.1f} h" if seconds >= 3600 else f"{seconds / 60:.0f} min"
+
+    def basis(measured: bool) -> str:
+        return "measured" if measured else "default guess"
+
+    print(
+        f"Plan: {estimates['macro_tiles']} macro-tile(s), {estimates['tiles']} tile(s) "
+        f"({estimates['tiles_in_store']} {'with local dalles' if estimates.get('local') else 'already in the store'}), "
+        f"{estimates['area_km2']:.1f} km²"
+    )
+    print(
+        f"  download   ~{estimates['download_bytes'] / 1e9:.1f} GB in ~{hours(estimates['download_s'])} "
+        f"({basis(estimates['download_measured'])} rates); tile store ~{estimates['store_bytes'] / 1e9:.1f} GB"
+    )
+    print(f"  regions    ~{estimates['region_bytes'] / 1e9:.1f} GB ({basis(estimates['region_bytes_measured'])} chunk size)")
+    print(f"  peak RAM   ~{estimates['peak_rss_bytes'] / 1e9:.1f} GB ({estimates['parallel']} francegen at once)")
+    print(
+        f"  francegen  ~{hours(estimates['francegen_s'])} "
+        f"(longest macro-tile ~{hours(estimates['longest_macro_tile_s'])})"
+    )
+    print(f"  wall time  ~{hours(estimates['wall_s'])}")
+
+
+def download_macro_tile(
+    dest_dir: Path,
+    center_x: float,
+    center_y: float,
+    skip_existing: bool,
+    session: requests.Session,
+    controller: RateController,
+    store: TileStore,
+    retries: int = DEFAULT_RETRIES,
+    staging_store: TileStore | None = None,
+    downsample: str | None = None,
+    only: list[tuple[float, float, float, float]] | None = None,
+    grid: int = MACRO_TILE_GRID,
+    repack=None,
+) -> list[Path]:
+    """
+    Download a macro-tile's tiles into the store, stage them into ``dest_dir``
+    and return the tiles that are still missing afterwards.
+
+    When ``staging_store`` is given, tiles are aggregated into it with the
+    ``downsample`` function and staged from there instead. ``only`` restricts
+    the work to the listed tile bboxes. ``repack`` is called with the
+    freshly downloaded store tiles before anything is staged.
+    """
+    dest_dir.mkdir(parents=True, exist_ok=True)
+    tile_px = tile_pixels(store.pixel_size)
+
+    tiles = [tile for tile in macro_tile_bboxes(center_x, center_y, grid) if only is None or tile[2] in only]
+    jobs = []
+    for col, row, bbox in tiles:
+        filename = store.path_for(bbox)
         if skip_existing and filename.exists():
-            tqdm.write(f"[Skip] {filename} already exists")
+            problem = validate_geotiff(filename, tile_px, tile_px)
+            if problem is None:
+                continue
+            tqdm.write(f"[Redownload] {filename.name}: {problem}")
+        filename.parent.mkdir(parents=True, exist_ok=True)
+        params = getmap_params(bbox, tile_px, tile_px)
+        jobs.append((params, filename))
+    if len(jobs) < len(tiles):
+        tqdm.write(f"[Skip] {dest_dir.name}: {len(tiles) - len(jobs)} tile(s) already in the store")
+
+    with tqdm(total=len(jobs), unit="tile", desc=f"Downloading {dest_dir.name}") as pbar:
+        with ThreadPoolExecutor(max_workers=controller.max_concurrency) as pool:
+            futures = [
+                pool.submit(download_with_retries, session, controller, params, filename, retries)
+                for params, filename in jobs
+            ]
+            for future in as_completed(futures):
+                future.result()
+                pbar.update(1)
+                pbar.set_postfix_str(f"{controller.request_rate():.2f} req/s")
+    if jobs:
+        tqdm.write(f"[Rate] {dest_dir.name}: {controller.summary()}")
+    if repack is not None:
+        repack([filename for _, filename in jobs if filename.exists()])
+    if staging_store is not None:
+        downsample_tiles(tiles, store, staging_store, downsample)
+    else:
+        staging_store = store
+    for col, row, bbox in tiles:
+        staging_store.stage(bbox, tile_filename(dest_dir, col, row))
+    staged = [tile_filename(dest_dir, col, row) for col, row, _ in tiles]
+    return [path for path in staged if not tile_is_valid(path, staging_store.pixel_size)]
+
+
+def stage_local_dalles(index: DemIndex, dest_dir: Path, tiles) -> int:
+    """
+    Symlink the dalles of ``index`` overlapping any of ``tiles`` into
+    ``dest_dir``, dropping GeoTIFFs staged there earlier that no longer
+    belong; return the number of dalles staged. Links are named after the
+    dalle's path inside the archive, so same-named dalles from different
+    subdirectories do not replace each other.
+    """
+    dest_dir.mkdir(parents=True, exist_ok=True)
+    wanted = {}
+    for _col, _row, bbox in tiles:
+        for path, _ in index.overlapping(bbox):
+            name = path.relative_to(index.root).as_posix().replace("/", "__")
+            if wanted.setdefault(name, path) != path:
+                raise RuntimeError(f"Dalles {wanted[name]} and {path} would both be staged as {name}")
+    for staged in dest_dir.glob("*.tif*"):
+        if staged.name not in wanted or not staged.is_symlink():
+            staged.unlink()
+    for name, path in wanted.items():
+        link = dest_dir / name
+        if link.is_symlink() and os.readlink(link) == str(path.resolve()):
             continue
+        link.unlink(missing_ok=True)
+        link.symlink_to(path.resolve())
+    return len(wanted)
 
-        params = {
-            "SERVICE": "WMS",
-            "VERSION": "1.3.0",
-            "REQUEST": "GetMap",
-            "LAYERS": LAYER,
-            "STYLES": "",
-            "CRS": "EPSG:2154",
-            "BBOX": bbox_str,
-            "WIDTH": str(TILE_WIDTH_PX),
-            "HEIGHT": str(TILE_HEIGHT_PX),
-            "FORMAT": "image/geotiff",
-            "EXCEPTIONS": "text/xml",
-        }
 
+def francegen_bounds(bbox: tuple[float, float, float, float]) -> str:
+    """
+    --bounds value keeping the samples francegen maps to the blocks of
+    ``bbox``. Samples are placed by the top-left corner of their pixel and
+    rounded to a block, so the limits sit a quarter block inside the
+    rounding boundaries (exact for 1 m and 0.5 m pixels).
+    """
+    min_x, min_y, max_x, max_y = bbox
+    return f"{min_x - 0.25:.3f},{min_y + 0.75:.3f},{max_x - 0.75:.3f},{max_y + 0.25:.3f}"
+
+
+def macro_tile_bytes(macro_dir: Path) -> int:
+    return sum(path.stat().st_size for path in macro_dir.glob("*.tif") if path.exists())
+
+
+class MacroTilePrefetcher:
+    """
+    Background producer that downloads macro-tiles ahead of francegen.
+
+    At most ``depth`` macro-tiles are downloaded beyond the one being
+    generated, and no new download starts while the staged bytes of waiting
+    macro-tiles exceed ``max_bytes``. Macro-tiles with missing tiles are
+    deferred to the back of the download queue up to ``max_deferrals`` times;
+    ``next_ready`` returns ``(macro, macro_dir, missing)`` in download order,
+    and the consumer calls ``done(macro_dir)`` once it has finished with each
+    one.
+    """
+
+    def __init__(self, macro_tiles, fetch, depth: int, max_bytes: int | None, max_deferrals: int):
+        self._source = iter(macro_tiles)
+        self._deferred = collections.deque()
+        self._exhausted = False
+        self._fetch = fetch
+        self._max_bytes = max_bytes
+        self._max_deferrals = max_deferrals
+        self._slots = threading.Semaphore(max(0, depth) + 1)
+        self._cond = threading.Condition()
+        self._ready = collections.deque()
+        self._waiting_bytes: dict[Path, int] = {}
+        self._error: BaseException | None = None
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name="macro-tile-prefetch", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        self._slots.release()
+
+    def _wait_for_disk(self):
+        if self._max_bytes is None:
+            return
+        with self._cond:
+            while (
+                not self._stopped
+                and self._waiting_bytes
+                and sum(self._waiting_bytes.values()) >= self._max_bytes
+            ):
+                self._cond.wait()
+
+    def _next(self):
+        # Deferred macro-tiles go to the back of the queue, after everything the source still holds.
+        macro = next(self._source, None)
+        if macro is not None:
+            return macro, 0
+        return self._deferred.popleft() if self._deferred else None
+
+    def _run(self):
         try:
-            response = requests.get(BASE_URL, params=params, stream=True, timeout=60)
-            if response.status_code == 200 and "image" in response.headers.get("content-type", "").lower():
-                with open(filename, "wb") as f:
-                    for chunk in response.iter_content(1024):
-                        f.write(chunk)
-            else:
-                tqdm.write(f"[Error] {filename.name} -> status {response.status_code} / content-type {response.headers.get('content-type')}")
-        except Exception as exc:  # pylint: disable=broad-except
-            tqdm.write(f"[Exception] {filename.name}: {exc}")
+            while True:
+                self._slots.acquire()
+                self._wait_for_disk()
+                if self._stopped:
+                    return
+                entry = self._next()
+                if entry is None:
+                    return
+                macro, deferrals = entry
+                macro_dir, missing = self._fetch(macro, deferrals)
+                if missing and deferrals < self._max_deferrals:
+                    names = ", ".join(path.name for path in missing)
+                    tqdm.write(f"[Defer] {macro_dir.name}: {len(missing)} tile(s) missing ({names}); retrying later")
+                    self._deferred.append((macro, deferrals + 1))
+                    self._slots.release()
+                    continue
+                with self._cond:
+                    self._waiting_bytes[macro_dir] = 0 if missing else macro_tile_bytes(macro_dir)
+                    self._ready.append((macro, macro_dir, missing))
+                    self._cond.notify_all()
+        except BaseException as exc:  # pylint: disable=broad-except
+            with self._cond:
+                self._error = exc
+                self._cond.notify_all()
+        finally:
+            with self._cond:
+                self._exhausted = True
+                self._cond.notify_all()
+
+    def done(self, macro_dir: Path):
+        with self._cond:
+            self._waiting_bytes.pop(macro_dir, None)
+            self._cond.notify_all()
+        self._slots.release()
+
+    @property
+    def finished(self) -> bool:
+        """True once every macro-tile has been handed out through ``next_ready``."""
+        with self._cond:
+            return self._exhausted and not self._ready and self._error is None
+
+    def next_ready(self, timeout: float | None = None):
+        """
+        The next downloaded macro-tile, or None if none is ready within
+        ``timeout`` seconds or there are no more.
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: self._ready or self._error is not None or self._exhausted, timeout)
+            if self._error is not None:
+                raise self._error
+            if not self._ready:
+                return None
+            return self._ready.popleft()
+
 
-        time.sleep(REQUEST_DELAY_S)
+# One francegen invocation: a whole macro-tile (tif_dir == macro_dir) or a split part of one.
+# ``chunks`` holds the chunk ranges of the tiles expected to come out complete; ``started``
+# is the wall-clock time the run was launched at.
+MacroTileRun = collections.namedtuple(
+    "MacroTileRun", "macro_dir tif_dir tiles cmd regions chunks fingerprint log_fields started", defaults=(None,)
+)
 
 
-def run_francegen(bin_path: str, extra_args: str, tif_dir: Path, world_dir: Path):
+def francegen_command(
+    bin_path: str,
+    extra_args: str,
+    tif_dir: Path,
+    world_dir: Path,
+    threads: int | None = None,
+    bounds: str | None = None,
+) -> list[str]:
     cmd = [bin_path]
+    if threads:
+        cmd.extend(["--threads", str(threads)])
     if extra_args.strip():
         cmd.extend(shlex.split(extra_args))
+    if bounds:
+        cmd.extend(["--bounds", bounds])
     cmd.extend([str(tif_dir), str(world_dir)])
-    print(f"Running francegen: {' '.join(cmd)}")
-    subprocess.run(cmd, check=True)
+    return cmd
 
 
-def completion_marker(macro_dir: Path) -> Path:
-    return macro_dir / DONE_MARKER
+def run_francegen(cmd: list[str], log_path: Path | None = None, watchdog: RssWatchdog | None = None) -> ProcessUsage:
+    tqdm.write(f"Running francegen: {' '.join(cmd)}")
+    if log_path is None:
+        return run_with_usage(cmd, watchdog=watchdog)
+    with open(log_path, "w", encoding="utf-8") as log:
+        return run_with_usage(cmd, stdout=log, stderr=subprocess.STDOUT, watchdog=watchdog)
 
 
-def mark_completed(macro_dir: Path, cmd: list[str]):
-    marker = completion_marker(macro_dir)
-    completed_at = datetime.datetime.now(datetime.UTC).isoformat().replace("+00:00", "Z")
-    payload = {
-        "completed_at": completed_at,
-        "command": cmd,
-    }
-    marker.write_text(repr(payload), encoding="utf-8")
+class SplitTracker:
+    """
+    Macro-tiles split into parts after a francegen run hit the RSS hard limit.
+
+    Splitting a whole macro-tile adds its parts; splitting one of its parts
+    replaces that part with its own. The macro-tile is finished once every
+    outstanding part has run.
+    """
+
+    def __init__(self):
+        # macro_dir -> [whole-macro-tile job, parts still outstanding]
+        self._entries: dict[Path, list] = {}
+
+    def split(self, job: MacroTileRun, parts: int):
+        """Record that ``job`` (a whole macro-tile or one of its parts) was replaced by ``parts`` parts."""
+        entry = self._entries.setdefault(job.macro_dir, [job, 0])
+        entry[1] += parts - (0 if job.tif_dir == job.macro_dir else 1)
+
+    def part_done(self, macro_dir: Path) -> MacroTileRun | None:
+        """Count one part of ``macro_dir`` as run; return its whole-macro-tile job once none is left."""
+        entry = self._entries[macro_dir]
+        entry[1] -= 1
+        if entry[1] > 0:
+            return None
+        del self._entries[macro_dir]
+        return entry[0]
+
+    def discard(self, macro_dir: Path) -> bool:
+        """Stop tracking ``macro_dir`` after one of its parts failed; False if it was not tracked."""
+        return self._entries.pop(macro_dir, None) is not None
+
+
+class MacroTileScheduler:
+    """
+    Runs francegen on macro-tiles (or split parts of them) next to each other.
+
+    ``launch`` starts a job once fewer than ``parallel`` runs are going, none
+    of them writes the same region files and the watchdog reports headroom.
+    ``reap`` collects finished runs: it folds their metadata into the world,
+    checks the chunks they wrote and marks their macro-tiles completed or
+    incomplete. Runs killed by the watchdog are split into quadrants that are
+    queued again and picked up by ``launch_requeued``. The first failure stops
+    the run and is kept in ``errors``.
+    """
+
+    def __init__(
+        self,
+        pool: ThreadPoolExecutor,
+        parallel: int,
+        world_dir: Path,
+        origin: tuple[float, float],
+        grid_corner: tuple[float, float],
+        run: dict,
+        francegen_bin: str,
+        francegen_args: str,
+        threads: int | None,
+        min_coverage: float,
+        merger: WorldMetadataMerger,
+        region_index: RegionIndex,
+        prefetcher: MacroTilePrefetcher,
+        progress: tqdm,
+        run_log: RunLog,
+        stage_store: TileStore,
+        watchdog: RssWatchdog | None = None,
+        queue: LeaseQueue | None = None,
+        local: DemIndex | None = None,
+        copc=None,
+        log_cost: bool = False,
+    ):
+        self.pool = pool
+        self.parallel = parallel
+        self.world_dir = world_dir
+        self.origin = origin
+        self.grid_corner = grid_corner
+        self.run = run
+        self.francegen_bin = francegen_bin
+        self.francegen_args = francegen_args
+        self.threads = threads
+        self.min_coverage = min_coverage
+        self.merger = merger
+        self.region_index = region_index
+        self.prefetcher = prefetcher
+        self.progress = progress
+        self.run_log = run_log
+        self.stage_store = stage_store
+        self.watchdog = watchdog
+        self.queue = queue
+        self.local = local
+        self.copc = copc
+        self.log_cost = log_cost
+        self.running: dict = {}
+        # Parts of macro-tiles split after hitting the RSS hard limit, waiting to run.
+        self.requeued: collections.deque[MacroTileRun] = collections.deque()
+        self.splits = SplitTracker()
+        self.incomplete: list[Path] = []
+        self.errors: list[BaseException] = []
+
+    @property
+    def busy(self) -> bool:
+        return bool(self.running or self.requeued)
+
+    def make_job(self, macro_dir: Path, tif_dir: Path, tiles, center=None, expected=None) -> MacroTileRun:
+        """``expected`` lists the tiles that must come out complete (default: all of ``tiles``)."""
+        bbox = tiles_bbox(tiles)
+        # Local dalles overhang the macro-tile, so francegen is told where to stop.
+        bounds = francegen_bounds(bbox) if self.local is not None else None
+        cmd = francegen_command(self.francegen_bin, self.francegen_args, tif_dir, self.world_dir, self.threads, bounds)
+        log_fields = {
+            "area_km2": len(tiles) * TILE_SIZE_M**2 / 1e6,
+            "threads": self.threads,
+            "parallel": self.parallel,
+        }
+        if center is not None:
+            log_fields["center"] = list(center)
+            if self.log_cost:
+                log_fields["cost_units"] = round(macro_tile_signals(tiles, self.stage_store, self.copc).cost_units(), 4)
+        if tif_dir != macro_dir:
+            log_fields["part"] = tif_dir.name
+        return MacroTileRun(
+            macro_dir,
+            tif_dir,
+            tiles,
+            cmd,
+            bbox_regions(bbox, self.grid_corner),
+            [bbox_chunks(tile_bbox, self.grid_corner) for _, _, tile_bbox in (tiles if expected is None else expected)],
+            dict(self.run, tiles=tile_checksums(tif_dir)),
+            log_fields,
+        )
+
+    def launch(self, job: MacroTileRun) -> bool:
+        """Start ``job`` once it fits next to the running ones; False if an error stopped the run."""
+        while self.running and (
+            len(self.running) >= self.parallel
+            or any(regions_overlap(job.regions, other.regions) for other in self.running.values())
+            or (self.watchdog is not None and self.watchdog.under_pressure)
+        ):
+            self.reap()
+        if self.errors:
+            return False
+        log_path = job.tif_dir / FRANCEGEN_LOG if self.parallel > 1 or job.tif_dir != job.macro_dir else None
+        future = self.pool.submit(run_francegen, job.cmd, log_path, self.watchdog)
+        self.running[future] = job._replace(started=time.time())
+        return not self.errors
+
+    def launch_requeued(self) -> bool:
+        while self.requeued:
+            if not self.launch(self.requeued.popleft()):
+                return False
+        return True
+
+    def drain(self):
+        while self.running:
+            self.reap()
+
+    def reap(self, timeout: float | None = None):
+        done, _ = wait(list(self.running), timeout=timeout, return_when=FIRST_COMPLETED)
+        for future in done:
+            job = self.running.pop(future)
+            macro_dir = job.macro_dir
+            name = job.tif_dir.name if job.tif_dir == macro_dir else f"{macro_dir.name}/{job.tif_dir.name}"
+            try:
+                usage = future.result()
+                if usage.rss_killed:
+                    self.run_log.write(
+                        "francegen", macro_tile=macro_dir.name, status="killed", **job.log_fields, **usage.as_dict()
+                    )
+                    if self.requeue_split(job):
+                        continue
+                    raise RuntimeError(f"{name} exceeds the RSS hard limit even as a single tile")
+                if usage.returncode != 0:
+                    self.run_log.write(
+                        "francegen", macro_tile=macro_dir.name, status="failed", **job.log_fields, **usage.as_dict()
+                    )
+                    raise subprocess.CalledProcessError(usage.returncode, job.cmd)
+                self.merger.absorb()
+                self.check_origin(name)
+            except Exception as exc:  # pylint: disable=broad-except
+                self.errors.append(exc)
+                tqdm.write(f"[Failed] francegen on {name}: {exc}")
+                if job.tif_dir == macro_dir or self.splits.discard(macro_dir):
+                    if self.queue is not None:
+                        self.queue.fail(macro_dir.name, str(exc))
+                    self.prefetcher.done(macro_dir)
+                    self.progress.update(1)
+                continue
+            status = "ok"
+            if job.tif_dir != macro_dir:
+                whole = self.splits.part_done(macro_dir)
+                if whole is not None and self.finish_macro(whole) < self.min_coverage:
+                    status = "incomplete"
+                self.run_log.write(
+                    "francegen", macro_tile=macro_dir.name, status=status, **job.log_fields, **usage.as_dict()
+                )
+                continue
+            coverage = self.finish_macro(job)
+            if coverage < self.min_coverage:
+                status = "incomplete"
+            self.run_log.write(
+                "francegen",
+                macro_tile=macro_dir.name,
+                status=status,
+                coverage=round(coverage, 4),
+                **job.log_fields,
+                **usage.as_dict(),
+            )
+
+    def check_origin(self, name: str):
+        """
+        Fail unless the world metadata exists with the planned origin. A run that wrote nothing passes
+        the coverage check trivially, so this is what guarantees the next runs snap to the same regions.
+        """
+        meta = load_metadata(self.world_dir)
+        if meta is None:
+            raise RuntimeError(f"{name}: francegen left no {META_FILE} in {self.world_dir}")
+        if metadata_origin(meta) != self.origin:
+            found = metadata_origin(meta)
+            raise RuntimeError(
+                f"{name}: {META_FILE} has origin ({found[0]:.3f}, {found[1]:.3f}) instead of "
+                f"({self.origin[0]:.3f}, {self.origin[1]:.3f})"
+            )
+
+    def finish_macro(self, job: MacroTileRun) -> float:
+        """Check the chunks ``job`` wrote and mark its macro-tile completed or incomplete; return the coverage."""
+        # francegen exits 0 even when it drops incomplete chunks, so check the region headers before
+        # letting --resume skip this macro-tile. Only chunks stamped by this run count: earlier runs
+        # may have left chunks of their own (or empty padding) in the same slots.
+        self.region_index.refresh()
+        coverage = self.region_index.coverage_of(job.chunks, since=int(job.started) - CHUNK_CLOCK_SLACK_S)
+        if coverage < self.min_coverage:
+            tqdm.write(
+                f"[Incomplete] {job.macro_dir.name}: only {coverage:.1%} of its chunks were written; "
+                "not marking it completed"
+            )
+            self.incomplete.append(job.macro_dir)
+            if self.queue is not None:
+                self.queue.fail(job.macro_dir.name, f"only {coverage:.1%} of its chunks were written")
+        else:
+            mark_completed(job.macro_dir, job.cmd, job.fingerprint, round(coverage, 4))
+            if self.queue is not None:
+                self.queue.complete(job.macro_dir.name, world=str(self.world_dir), coverage=round(coverage, 4))
+        self.prefetcher.done(job.macro_dir)
+        self.progress.update(1)
+        return coverage
+
+    def repair_regions(self, job: MacroTileRun):
+        """Drop the damaged chunks from the region files ``job`` was writing when it was killed."""
+        min_rx, max_rx, min_rz, max_rz = job.regions
+        for rz in range(min_rz, max_rz + 1):
+            for rx in range(min_rx, max_rx + 1):
+                path = self.world_dir / "region" / f"r.{rx}.{rz}.mca"
+                if not path.exists():
+                    continue
+                kept, dropped = repair_region(path)
+                if dropped:
+                    tqdm.write(f"[Watchdog] {path.name}: dropped {dropped} damaged chunk(s), kept {kept}")
+
+    def requeue_split(self, job: MacroTileRun) -> bool:
+        """Queue the quadrants of a job killed by the watchdog; False if it cannot be split."""
+        parts = split_tiles(job.tiles)
+        if not parts:
+            return False
+        # The parts merge into whatever the killed run left behind, which may be half-written.
+        self.repair_regions(job)
+        split_root = job.macro_dir / "split"
+        for part in parts:
+            cols = sorted({col for col, _, _ in part})
+            rows = sorted({row for _, row, _ in part})
+            part_dir = split_root / f"c{cols[0]}-{cols[-1]}_r{rows[0]}-{rows[-1]}"
+            if self.local is not None:
+                stage_local_dalles(self.local, part_dir, part)
+            else:
+                for col, row, bbox in part:
+                    if not self.stage_store.stage(bbox, tile_filename(part_dir, col, row)):
+                        raise RuntimeError(f"Tile {bbox} of {job.macro_dir.name} vanished from the tile store")
+            self.requeued.append(self.make_job(job.macro_dir, part_dir, part))
+        self.splits.split(job, len(parts))
+        tqdm.write(f"[Watchdog] {job.tif_dir.name}: requeued as {len(parts)} sub-tile(s)")
+        return True
 
 
 def main():
     args = parse_args()
     tiles_root = Path(args.tiles_root)
-    world_dir = Path(args.world)
-    aligned_center_x = quantize_to_chunk(args.center_x)
-    aligned_center_y = quantize_to_chunk(args.center_y)
-    if aligned_center_x != args.center_x or aligned_center_y != args.center_y:
+    target_dir = Path(args.world)
+    world_dir = target_dir
+    if not tiles_root.exists():
+        tiles_root.mkdir(parents=True, exist_ok=True)
+    resolved_root = tiles_root.resolve()
+    run_log_path = Path(args.run_log) if args.run_log else resolved_root.with_name(resolved_root.name + ".runs.jsonl")
+    run_log = RunLog(run_log_path)
+
+    if args.download_workers < 1:
+        print("--download-workers must be >= 1", file=sys.stderr)
+        sys.exit(2)
+    queue = None
+    work_plan = None
+    if args.run_plan:
+        try:
+            work_plan = load_work_plan(Path(args.run_plan))
+        except ValueError as exc:
+            print(exc, file=sys.stderr)
+            sys.exit(2)
+    if args.queue:
+        queue = LeaseQueue(Path(args.queue), args.worker_id, args.lease_seconds, args.lease_seconds / 10)
+        work_plan = queue.load_plan() or work_plan
+    area = None
+    if args.area and work_plan is None:
+        try:
+            area = Area.load(args.area)
+        except (OSError, KeyError, ValueError) as exc:
+            print(f"Could not read --area {args.area}: {exc}", file=sys.stderr)
+            sys.exit(2)
+    if work_plan is None and area is None and (args.center_x is None or args.center_y is None):
+        print("--center-x and --center-y are required unless an area or a plan is given", file=sys.stderr)
+        sys.exit(2)
+    if work_plan is not None and work_plan["pixel_size"] != args.pixel_size:
+        print(f"The plan was made for --pixel-size {work_plan['pixel_size']}", file=sys.stderr)
+        sys.exit(2)
+    # Every run of a plan must cut the same macro-tiles it was written for.
+    requested_grid = work_plan["grid"] if work_plan is not None else args.macro_grid
+    grid = requested_grid or MACRO_TILE_GRID
+    parallel = max(1, args.parallel_macro_tiles or 1)
+    records = run_log.read()
+    rss_per_km2 = measured_rss_per_km2(records) or DEFAULT_RSS_PER_KM2
+    if args.memory_budget is not None:
+        try:
+            memory_plan = plan_for_memory(
+                args.memory_budget * 1e9,
+                TILE_SIZE_M,
+                records,
+                max_parallel=args.parallel_macro_tiles or os.cpu_count() or 1,
+                max_grid=requested_grid or MAX_MACRO_TILE_GRID,
+            )
+        except ValueError as exc:
+            print(exc, file=sys.stderr)
+            sys.exit(2)
+        grid, parallel = memory_plan.grid, memory_plan.parallel
+        source = "measured" if memory_plan.measured else "estimated"
+        print(
+            f"Memory budget {args.memory_budget:.1f} GB: {grid}x{grid}-tile macro-tiles, {parallel} at once "
+            f"(~{memory_plan.run_bytes / 1e9:.1f} GB each at {source} {memory_plan.rss_per_km2 / 1024**2:.0f} MiB/km²)"
+        )
+    if not MIN_MACRO_TILE_GRID <= grid <= MAX_MACRO_TILE_GRID:
+        print(f"--macro-grid must be between {MIN_MACRO_TILE_GRID} and {MAX_MACRO_TILE_GRID}", file=sys.stderr)
+        sys.exit(2)
+    if work_plan is not None and work_plan["grid"] != grid:
         print(
-            f"Center snapped to chunk grid: ({args.center_x:.3f}, {args.center_y:.3f}) -> "
-            f"({aligned_center_x:.3f}, {aligned_center_y:.3f})"
+            f"The plan uses {work_plan['grid']}-tile macro-tiles but this run can only fit {grid}-tile ones; "
+            "give it more --memory-budget",
+            file=sys.stderr,
         )
+        sys.exit(2)
+    side_m = grid * TILE_SIZE_M
+    if work_plan is not None:
+        aligned_center_x, aligned_center_y = work_plan["center"]
+    else:
+        center_x = args.center_x if args.center_x is not None else (area.bbox[0] + area.bbox[2]) / 2
+        center_y = args.center_y if args.center_y is not None else (area.bbox[1] + area.bbox[3]) / 2
+        aligned_center_x = quantize_to_chunk(center_x)
+        aligned_center_y = quantize_to_chunk(center_y)
+        macro_radius = args.macro_radius if grid == MACRO_TILE_GRID else scaled_macro_radius(args.macro_radius, grid)
 
-    if not tiles_root.exists():
-        tiles_root.mkdir(parents=True, exist_ok=True)
+    store_root = Path(args.tile_store) if args.tile_store else tiles_root / "store"
+    store = TileStore(store_root, args.pixel_size)
+    staging_store = None
+    if args.downsample:
+        if args.pixel_size >= BLOCK_PIXEL_SIZE:
+            print("--downsample requires --pixel-size 0.5", file=sys.stderr)
+            sys.exit(2)
+        staging_store = TileStore(store_root, BLOCK_PIXEL_SIZE, variant=args.downsample)
+    session = make_session(args.download_workers)
+    controller = RateController(args.download_workers)
+    if args.coverage_probe:
+        require_raster_libs()
+    repack_pool = None
+    if args.repack:
+        require_raster_libs()
+        # Spawned rather than forked: downloads run on threads of this process.
+        repack_pool = ProcessPoolExecutor(max_workers=os.cpu_count(), mp_context=multiprocessing.get_context("spawn"))
+
+    def repack_tiles(paths: list[Path]):
+        before, after, failures = repack_geotiffs(paths, args.repack, repack_pool)
+        for failure in failures:
+            tqdm.write(f"[Repack] Kept as downloaded: {failure}")
+        if before:
+            tqdm.write(f"[Repack] {len(paths)} tile(s): {before / 1e6:.1f} MB -> {after / 1e6:.1f} MB")
 
-    macro_tiles = list(macro_tile_centers(aligned_center_x, aligned_center_y, args.macro_radius))
+    local = None
+    if args.local_dem_root:
+        if args.coverage_probe or args.downsample or args.repack:
+            print("--coverage-probe, --downsample and --repack only apply to WMS downloads", file=sys.stderr)
+            sys.exit(2)
+        index_path = Path(args.local_dem_index) if args.local_dem_index else tiles_root / LOCAL_DEM_INDEX_FILE
+        local = DemIndex.load(Path(args.local_dem_root), index_path)
+        print(f"Local DEM archive {args.local_dem_root}: {local.dalle_count} dalle(s), index {index_path}")
+    copc = []
+    if args.schedule == "cost" or args.plan:
+        copc_dir = option_path(shlex.split(args.francegen_args), "--copc-dir")
+        if copc_dir is not None and copc_dir.is_dir():
+            copc = copc_extents(copc_dir)
+
+    def plan_macro_tiles(center_x: float, center_y: float) -> tuple[list, dict]:
+        if area is not None:
+            return macro_tiles_in_area(area, center_x, center_y, grid)
+        return list(macro_tile_centers(center_x, center_y, macro_radius, side_m)), {}
+
+    if work_plan is not None:
+        macro_tiles = [tuple(item["macro"]) for item in work_plan["items"]]
+        selection = plan_selection(work_plan)
+    else:
+        # The block grid of a fresh world is the corner of its first tile, which lies on this tile grid
+        # 1024 m (two regions) from the macro-tile edges, so snapping to it leaves the center in place.
+        macro_tiles, selection = plan_macro_tiles(aligned_center_x, aligned_center_y)
+    origin_cx, origin_cy, origin_col, origin_row, origin_bbox = first_tile(macro_tiles, grid, selection)
+    origin_dalle = None
+    if local is not None:
+        for mx, my, cx, cy in macro_tiles:
+            tiles = selected_tiles(cx, cy, grid, selection.get(macro_dir_name(mx, my, grid)))
+            dalles = local.overlapping(tiles_bbox(tiles))
+            if dalles:
+                origin_dalle = dalles[0][0]
+                break
+        if origin_dalle is None:
+            print(f"{args.local_dem_root} holds no dalle inside the requested macro-tiles", file=sys.stderr)
+            sys.exit(1)
+
+    seed_meta = work_plan.get("seed_metadata") if work_plan is not None else None
+    # Where francegen samples input pixels relative to their corners; None until a tile header says.
+    sample_shift = None
+    if seed_meta is not None:
+        origin = metadata_origin(seed_meta)
+        print(f"World origin from the plan: ({origin[0]:.3f}, {origin[1]:.3f})")
+    elif (seed_meta := load_metadata(target_dir)) is not None:
+        origin = metadata_origin(seed_meta)
+        print(f"World origin from {target_dir / META_FILE}: ({origin[0]:.3f}, {origin[1]:.3f})")
+    elif local is not None:
+        # Fresh worlds are seeded with this origin before their first run (see below), so any
+        # dalle of the run can fix it; reading its header needs no network, even with --plan.
+        seed_meta = empty_metadata(tile_origin(origin_dalle))
+        sample_shift = tile_sample_shift(origin_dalle)
+        origin = metadata_origin(seed_meta)
+        print(f"World origin derived from {origin_dalle.name}: ({origin[0]:.3f}, {origin[1]:.3f})")
+    elif args.plan:
+        # Planning stays offline: francegen puts a fresh world's origin on the first pixel of the
+        # first tile it reads, the first GeoTIFF of the first macro-tile, sampled as GDAL tiles are.
+        # Running the plan derives the real origin and checks it against this one.
+        sample_shift = gdal_sample_shift((staging_store or store).pixel_size)
+        origin = (origin_bbox[0] + sample_shift[0], origin_bbox[3] + sample_shift[1])
+        print(f"World origin predicted from the first tile: ({origin[0]:.3f}, {origin[1]:.3f})")
+    else:
+        # Take the origin from the tile a fresh world would start from (elevation_0_0.tif of the
+        # center macro-tile without --area) and seed the world with it before the first run.
+        probe_dir = tiles_root / "origin_probe"
+        missing = download_macro_tile(
+            probe_dir,
+            origin_cx,
+            origin_cy,
+            True,
+            session,
+            controller,
+            store,
+            args.download_retries,
+            staging_store,
+            args.downsample,
+            only=[origin_bbox],
+            grid=grid,
+        )
+        if missing:
+            print("Could not download the tile needed to derive the world origin.", file=sys.stderr)
+            sys.exit(1)
+        probe_tile = tile_filename(probe_dir, origin_col, origin_row)
+        seed_meta = empty_metadata(tile_origin(probe_tile))
+        sample_shift = tile_sample_shift(probe_tile)
+        origin = metadata_origin(seed_meta)
+        print(f"World origin derived from the first tile: ({origin[0]:.3f}, {origin[1]:.3f})")
+
+    if work_plan is None:
+        if sample_shift is None:
+            # An existing world: its tiles came from the same source as the ones about to be staged.
+            if local is not None:
+                sample_shift = tile_sample_shift(origin_dalle)
+            else:
+                sample_shift = gdal_sample_shift((staging_store or store).pixel_size)
+        grid_corner = block_grid(origin, sample_shift)
+        snapped_x, snapped_y = snap_center_to_regions(aligned_center_x, aligned_center_y, grid_corner, side_m)
+        if snapped_x != center_x or snapped_y != center_y:
+            print(f"Center snapped to region grid: ({center_x:.3f}, {center_y:.3f}) -> ({snapped_x:.3f}, {snapped_y:.3f})")
+        macro_tiles, selection = plan_macro_tiles(snapped_x, snapped_y)
+        if args.schedule == "cost":
+            macro_tiles = order_by_cost(macro_tiles, grid, staging_store or store, copc, records, selection)
+        work_plan = build_work_plan(
+            (aligned_center_x, aligned_center_y), grid, args.pixel_size, origin, grid_corner, macro_tiles, selection
+        )
+    elif tuple(work_plan["origin"]) != origin:
+        print(
+            f"The plan was made for world origin ({work_plan['origin'][0]:.3f}, {work_plan['origin'][1]:.3f}) "
+            f"but the world has ({origin[0]:.3f}, {origin[1]:.3f}); plan again",
+            file=sys.stderr,
+        )
+        sys.exit(2)
+    grid_corner = tuple(work_plan["block_grid"])
+    if work_plan.get("seed_metadata") is None:
+        work_plan["seed_metadata"] = seed_meta
+
+    if args.plan:
+        estimates = estimate_work_plan(
+            work_plan,
+            staging_store or store,
+            copc,
+            records,
+            parallel,
+            rss_per_km2,
+            target_dir,
+            args.skip_existing,
+            args.download_workers,
+            local,
+        )
+        write_work_plan(Path(args.plan), dict(work_plan, estimates=estimates))
+        print_estimates(estimates)
+        print(f"Wrote the plan to {args.plan}; run it with --run-plan {args.plan}")
+        return
+
+    if queue is not None:
+        # Another worker may have published its plan meanwhile; whichever came first wins.
+        work_plan = queue.publish_plan(work_plan)
+        if work_plan["grid"] != grid or tuple(work_plan["origin"]) != origin:
+            print("Another worker published a different plan to the queue; restart this worker", file=sys.stderr)
+            sys.exit(2)
+        grid_corner = tuple(work_plan["block_grid"])
+        seed_meta = work_plan["seed_metadata"]
+        # Scratch worlds start from the shared origin so they can be merged afterwards.
+        world_dir = target_dir / "scratch" / queue.worker_id
+        scratch_meta = load_metadata(world_dir)
+        if scratch_meta is None:
+            world_dir.mkdir(parents=True, exist_ok=True)
+            write_metadata(world_dir, seed_meta)
+        elif metadata_origin(scratch_meta) != origin:
+            print(f"{world_dir} was generated with a different origin than the queue plan", file=sys.stderr)
+            sys.exit(2)
+        print(f"Worker {queue.worker_id}: leasing macro-tiles from {queue.root} into {world_dir}")
+    elif load_metadata(world_dir) is None:
+        # Pin the origin up front, as queue workers do with their scratch worlds: the first tile
+        # francegen reads may differ from the one the origin came from, or hold only nodata.
+        world_dir.mkdir(parents=True, exist_ok=True)
+        write_metadata(world_dir, seed_meta)
+    macro_tiles = [tuple(item["macro"]) for item in work_plan["items"]]
+    selection = plan_selection(work_plan)
     print(
         f"Preparing {len(macro_tiles)} macro-tile(s) of "
-        f"{MACRO_TILE_SIDE_M/1000:.2f} km per side (chunk-aligned)"
+        f"{side_m/1000:.2f} km per side (region-aligned) at {args.pixel_size} m/px"
     )
+    if selection:
+        kept = sum(len(keep) for keep in selection.values()) + (len(macro_tiles) - len(selection)) * grid * grid
+        print(f"The area keeps {kept} of their {len(macro_tiles) * grid * grid} tiles")
+
+    def probed_empty(probe: dict, col: int, row: int) -> bool:
+        return probe["tiles"][tile_key(col, row)] == EMPTY
 
-    if args.resume:
+    run = run_fingerprint(args.francegen_bin, args.francegen_args)
+    # In queue mode the queue's done/ entries decide what is left.
+    if args.resume and queue is None:
         pending_tiles = []
         skipped_completed = 0
+        changed = 0
         for mx, my, cx, cy in macro_tiles:
-            macro_dir = tiles_root / f"macro_x{mx:+d}_y{my:+d}"
-            if completion_marker(macro_dir).exists():
+            macro_dir = tiles_root / macro_dir_name(mx, my, grid)
+            sources = None
+            if local is None:
+                # Judge the store tiles, not the links staged from them before they were replaced.
+                tiles = selected_tiles(cx, cy, grid, selection.get(macro_dir.name))
+                if staging_store is not None:
+                    # Aggregated copies of replaced tiles are refreshed here rather than when staging.
+                    downsample_tiles(tiles, store, staging_store, args.downsample)
+                sources = {
+                    tile_filename(macro_dir, col, row).name: (staging_store or store).path_for(bbox)
+                    for col, row, bbox in tiles
+                }
+            if marker_is_current(macro_dir, run, sources):
                 skipped_completed += 1
                 continue
+            if completion_marker(macro_dir).exists():
+                changed += 1
             pending_tiles.append((mx, my, cx, cy))
         if skipped_completed:
             print(f"Resume enabled; skipping {skipped_completed} completed macro-tile(s)")
+        if changed:
+            print(f"Redoing {changed} completed macro-tile(s) whose inputs changed")
         macro_tiles = pending_tiles
 
     if not macro_tiles:
         print("All macro-tiles already completed; nothing to do.")
         return
 
-    total_tiles = len(macro_tiles)
+    soft_limit = args.rss_soft_limit
+    hard_limit = args.rss_hard_limit
+    if args.memory_budget is not None:
+        soft_limit = soft_limit if soft_limit is not None else 0.85 * args.memory_budget
+        hard_limit = hard_limit if hard_limit is not None else args.memory_budget
+    watchdog = None
+    if soft_limit is not None or hard_limit is not None:
+        watchdog = RssWatchdog(
+            soft_limit * 1e9 if soft_limit is not None else None,
+            hard_limit * 1e9 if hard_limit is not None else None,
+        )
+
+    # macro_dir -> coverage probe result, for macro-tiles probed with --coverage-probe
+    probes = {}
+
+    def fetch(macro, deferrals: int):
+        mx, my, cx, cy = macro
+        macro_dir = tiles_root / macro_dir_name(mx, my, grid)
+        if watchdog is not None:
+            watchdog.wait_for_headroom()
+        if local is not None:
+            started = time.monotonic()
+            dalles = stage_local_dalles(local, macro_dir, selected_tiles(cx, cy, grid, selection.get(macro_dir.name)))
+            tqdm.write(f"[Local] {macro_dir.name}: staged {dalles} dalle(s)")
+            run_log.write(
+                "stage",
+                macro_tile=macro_dir.name,
+                center=[cx, cy],
+                dalles=dalles,
+                wall_s=round(time.monotonic() - started, 3),
+            )
+            return macro_dir, []
+        tqdm.write(f"[Download] Macro tile offset ({mx}, {my}) at center ({cx:.2f}, {cy:.2f})")
+        requests_before, throttles_before, bytes_before = controller.counters()
+        started = time.monotonic()
+        keep = selection.get(macro_dir.name)
+        tiles = selected_tiles(cx, cy, grid, keep)
+        only = None
+        if keep is not None:
+            only = [bbox for _, _, bbox in tiles]
+            # Drop tiles outside the area staged by earlier runs.
+            for col, row, _ in macro_tile_bboxes(cx, cy, grid):
+                if (col, row) not in keep:
+                    tile_filename(macro_dir, col, row).unlink(missing_ok=True)
+        empty = 0
+        if args.coverage_probe:
+            probe = probe_macro_tile(
+                session,
+                controller,
+                macro_tile_bbox(cx, cy, side_m),
+                grid,
+                tiles_root / PROBE_DIR / f"{macro_dir.name}.tif",
+                args.download_retries,
+            )
+            if probe is None:
+                tqdm.write(f"[Probe] {macro_dir.name}: coverage probe failed; downloading every tile")
+            else:
+                probes[macro_dir] = probe
+                only = []
+                for col, row, bbox in tiles:
+                    if probed_empty(probe, col, row):
+                        # Drop tiles staged by earlier runs without the probe.
+                        tile_filename(macro_dir, col, row).unlink(missing_ok=True)
+                    else:
+                        only.append(bbox)
+                empty = len(tiles) - len(only)
+                if empty:
+                    tqdm.write(f"[Probe] {macro_dir.name}: skipping {empty} tile(s) without data")
+        if only == []:
+            macro_dir.mkdir(parents=True, exist_ok=True)
+            missing = []
+        else:
+            # Store tiles are renamed into place only once complete, so a deferred
+            # macro-tile only re-requests its gaps.
+            missing = download_macro_tile(
+                macro_dir,
+                cx,
+                cy,
+                args.skip_existing or deferrals > 0,
+                session,
+                controller,
+                store,
+                args.download_retries,
+                staging_store,
+                args.downsample,
+                only=only,
+                grid=grid,
+                repack=repack_tiles if repack_pool is not None else None,
+            )
+        elapsed = time.monotonic() - started
+        requests_after, throttles_after, bytes_after = controller.counters()
+        run_log.write(
+            "download",
+            macro_tile=macro_dir.name,
+            center=[cx, cy],
+            deferrals=deferrals,
+            wall_s=round(elapsed, 3),
+            requests=requests_after - requests_before,
+            throttle_events=throttles_after - throttles_before,
+            bytes=bytes_after - bytes_before,
+            bytes_per_s=round((bytes_after - bytes_before) / elapsed) if elapsed > 0 else None,
+            missing=len(missing),
+            empty_tiles=empty,
+        )
+        return macro_dir, missing
+
+    threads = max(1, args.threads // parallel) if args.threads else None
+    if parallel > 1:
+        print(
+            f"Running up to {parallel} francegen processes at once"
+            + (f" with {threads} thread(s) each" if threads else "")
+        )
+    max_bytes = int(args.prefetch_max_gb * 1e9) if args.prefetch_max_gb is not None else None
+    if queue is not None:
+        source = (tuple(item["macro"]) for item in queue.claims(work_plan["items"]))
+        total_tiles = None  # how many this worker gets depends on the others
+    else:
+        source = macro_tiles
+        total_tiles = len(macro_tiles)
+    prefetcher = MacroTilePrefetcher(source, fetch, args.prefetch + parallel - 1, max_bytes, args.max_deferrals)
+    merger = WorldMetadataMerger(world_dir)
+    region_index = RegionIndex.load(world_dir, save=False)
+    failed = []
     with tqdm(total=total_tiles, desc="Macro tiles", unit="macro-tile") as macro_pbar:
-        for loop_idx, (mx, my, cx, cy) in enumerate(macro_tiles, start=1):
-            macro_dir = tiles_root / f"macro_x{mx:+d}_y{my:+d}"
-            macro_pbar.set_postfix_str(f"offset=({mx}, {my})")
-            tqdm.write(f"[{loop_idx}/{total_tiles}] Macro tile offset ({mx}, {my}) at center ({cx:.2f}, {cy:.2f})")
-            download_macro_tile(macro_dir, cx, cy, args.skip_existing)
-            cmd = [args.francegen_bin]
-            if args.francegen_args.strip():
-                cmd.extend(shlex.split(args.francegen_args))
-            cmd.extend([str(macro_dir), str(world_dir)])
-            run_francegen(args.francegen_bin, args.francegen_args, macro_dir, world_dir)
-            mark_completed(macro_dir, cmd)
-            macro_pbar.update(1)
+        if watchdog is not None:
+            watchdog.start()
+        if queue is not None:
+            queue.start()
+        prefetcher.start()
+        pool = ThreadPoolExecutor(max_workers=parallel)
+        scheduler = MacroTileScheduler(
+            pool,
+            parallel,
+            world_dir,
+            origin,
+            grid_corner,
+            run,
+            args.francegen_bin,
+            args.francegen_args,
+            threads,
+            args.min_coverage,
+            merger,
+            region_index,
+            prefetcher,
+            macro_pbar,
+            run_log,
+            staging_store or store,
+            watchdog=watchdog,
+            queue=queue,
+            local=local,
+            copc=copc,
+            log_cost=args.schedule == "cost",
+        )
+        try:
+            loop_idx = 0
+            while not scheduler.errors and (not prefetcher.finished or scheduler.busy):
+                if not scheduler.launch_requeued():
+                    break
+                if prefetcher.finished:
+                    scheduler.reap()
+                    continue
+                # Keep finishing running jobs while waiting for downloads: their
+                # macro-tiles hold prefetch slots until they are reaped.
+                item = prefetcher.next_ready(timeout=0 if scheduler.running else None)
+                if item is None:
+                    scheduler.reap(REAP_POLL_S)
+                    continue
+                (mx, my, cx, cy), macro_dir, missing = item
+                loop_idx += 1
+                if missing:
+                    names = ", ".join(path.name for path in missing)
+                    tqdm.write(f"[Failed] {macro_dir.name}: {len(missing)} tile(s) missing ({names}); skipping francegen")
+                    failed.append(macro_dir)
+                    if queue is not None:
+                        queue.fail(macro_dir.name, f"{len(missing)} tile(s) missing")
+                    prefetcher.done(macro_dir)
+                    macro_pbar.update(1)
+                    continue
+                tiles = selected_tiles(cx, cy, grid, selection.get(macro_dir.name))
+                expected = None
+                probe = probes.get(macro_dir)
+                if probe is not None:
+                    tiles = [tile for tile in tiles if not probed_empty(probe, tile[0], tile[1])]
+                    expected = [tile for tile in tiles if probe["tiles"][tile_key(tile[0], tile[1])] == FULL]
+                if local is not None:
+                    covered = {tile[:2]: local.covered_fraction(tile[2]) for tile in tiles}
+                    tiles = [tile for tile in tiles if covered[tile[:2]] > 0]
+                    expected = [tile for tile in tiles if covered[tile[:2]] >= LOCAL_FULL_COVERAGE]
+                if not tiles:
+                    tqdm.write(f"[Empty] {macro_dir.name}: no tile holds data; skipping francegen")
+                    mark_completed(macro_dir, [], dict(run, tiles={}))
+                    if queue is not None:
+                        queue.complete(macro_dir.name, world=str(world_dir), empty=True)
+                    run_log.write("skipped", macro_tile=macro_dir.name, reason="no data", center=[cx, cy])
+                    prefetcher.done(macro_dir)
+                    macro_pbar.update(1)
+                    continue
+                macro_pbar.set_postfix_str(f"offset=({mx}, {my})")
+                step = f"{loop_idx}/{total_tiles}" if total_tiles is not None else str(loop_idx)
+                tqdm.write(f"[{step}] Generating macro tile offset ({mx}, {my})")
+                if not scheduler.launch(scheduler.make_job(macro_dir, macro_dir, tiles, (cx, cy), expected)):
+                    break
+            scheduler.drain()
+        finally:
+            pool.shutdown(wait=True)
+            prefetcher.stop()
+            if queue is not None:
+                queue.stop()
+            if watchdog is not None:
+                watchdog.stop()
+            if repack_pool is not None:
+                repack_pool.shutdown()
+            region_index.save()
+    if scheduler.errors:
+        raise scheduler.errors[0]
+    incomplete = scheduler.incomplete
+    if queue is None and (meta := load_metadata(world_dir)) is not None and not is_empty_metadata(meta):
+        reset_spawn(args.francegen_bin, world_dir)
+
+    if failed:
+        print(
+            f"{len(failed)} macro-tile(s) were not generated because of missing tiles: "
+            + ", ".join(path.name for path in failed),
+            file=sys.stderr,
+        )
+    if incomplete:
+        print(
+            f"{len(incomplete)} macro-tile(s) are missing chunks in the world: "
+            + ", ".join(path.name for path in incomplete),
+            file=sys.stderr,
+        )
+    if queue is not None:
+        print(
+            f"Worker {queue.worker_id} finished. Once every worker is done, combine the scratch worlds with: "
+            f"python utils/merge_worlds.py {target_dir} {target_dir / 'scratch'}/* "
+            f"&& {args.francegen_bin} spawn {target_dir}"
+        )
+    if failed or incomplete:
+        retry = "Re-run a worker to retry them." if queue is not None else "Re-run with --resume to retry them."
+        print(retry, file=sys.stderr)
+        sys.exit(1)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Rewrite region files with their chunk sectors packed tightly.
+
+francegen merges every macro-tile after the first into existing regions, and
+chunks that grow are relocated to the end of the file, leaving dead sectors
+behind. This rewrites each ``.mca`` with the live chunk records back to back
+in location-table order (the timestamps and external ``.mcc`` references are
+kept) and reports how many bytes each region gave back.
+"""
+import argparse
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from tqdm import tqdm
+
+from anvil import SECTOR_BYTES, RegionReader, region_files, write_region
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Pack region file sectors tightly to reclaim dead space.")
+    parser.add_argument("worlds", nargs="+", help="World directories whose region/ files are compacted.")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Region files compacted in parallel (default: CPU count).",
+    )
+    parser.add_argument("--dry-run", action="store_true", help="Only report how much each region would shrink.")
+    return parser.parse_args()
+
+
+def compact_region(path: Path, dry_run: bool = False) -> tuple[Path, int, int, int]:
+    """
+    Compact one region file. Returns (path, size before, size after, chunks).
+    Files that are already packed are left untouched.
+    """
+    before = path.stat().st_size
+    with RegionReader(path) as reader:
+        records = {}
+        try:
+            for index, entry in reader.entries.items():
+                record = reader.payload(index)
+                if record is not None:
+                    records[index] = (record, entry.timestamp)
+            packed = 2 + sum((len(record) + SECTOR_BYTES - 1) // SECTOR_BYTES for record, _ in records.values())
+            after = packed * SECTOR_BYTES
+            if after < before and not dry_run:
+                after = write_region(path, records)
+            elif after >= before:
+                after = before
+        finally:
+            for record, _timestamp in records.values():
+                record.release()
+    return path, before, after, len(records)
+
+
+def format_bytes(size: int) -> str:
+    return f"{size / 1024**2:.1f} MiB" if size >= 1024**2 else f"{size / 1024:.0f} KiB"
+
+
+def main():
+    args = parse_args()
+    paths = []
+    for world in args.worlds:
+        regions = region_files(Path(world))
+        if not regions:
+            print(f"{world} has no region files", file=sys.stderr)
+        paths.extend(regions)
+    if not paths:
+        sys.exit(1)
+
+    total_before = 0
+    total_after = 0
+    with ProcessPoolExecutor(max_workers=max(1, args.workers)) as pool:
+        futures = [pool.submit(compact_region, path, args.dry_run) for path in paths]
+        for future in tqdm(futures, desc="Compacting regions", unit="region"):
+            path, before, after, chunks = future.result()
+            total_before += before
+            total_after += after
+            if after < before:
+                tqdm.write(
+                    f"{path}: {format_bytes(before)} -> {format_bytes(after)} "
+                    f"({chunks} chunks, {format_bytes(before - after)} reclaimed)"
+                )
+
+    verb = "would reclaim" if args.dry_run else "reclaimed"
+    print(
+        f"{len(paths)} region file(s): {format_bytes(total_before)} -> {format_bytes(total_after)}, "
+        f"{verb} {format_bytes(total_before - total_after)}"
+    )
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except ValueError as exc:
+        print(exc, file=sys.stderr)
+        sys.exit(1)
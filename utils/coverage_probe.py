@@ -0,0 +1,103 @@
+"""
+Low-resolution coverage probe for macro-tiles.
+
+Macro-tiles on coasts, borders or LiDAR HD coverage gaps can consist of tiles
+that are entirely nodata, which are downloaded at full resolution only for
+francegen to discard every sample. One GetMap of the whole macro-tile at
+``PROBE_PIXELS_PER_TILE`` pixels per 1024 m tile (80 x 80 px for a 5 x 5
+macro-tile) is enough to classify each tile as empty, partial or full.
+
+The probe is coarse, so a tile only counts as empty when neither its probe
+pixels nor the ones bordering it hold data: a narrow strip of data that falls
+between two probe samples still gets its tile downloaded.
+
+Results are cached as JSON next to the probe raster, so reruns do not probe
+again. Requires numpy and rasterio.
+"""
+import json
+from pathlib import Path
+
+import requests
+
+from dem_tools import require_raster_libs
+from wms_client import DEFAULT_RETRIES, RateController, download_with_retries, getmap_params
+
+PROBE_PIXELS_PER_TILE = 16
+EMPTY = "empty"
+PARTIAL = "partial"
+FULL = "full"
+
+
+def tile_key(col: int, row: int) -> str:
+    return f"{col},{row}"
+
+
+def classify_probe(path: Path, grid: int) -> dict:
+    """
+    Classify the ``grid`` x ``grid`` tiles of a probe raster. Tile (col, row)
+    counts columns from the west and rows from the south, like
+    ``macro_tile_bboxes``.
+    """
+    require_raster_libs()
+    import numpy as np  # pylint: disable=import-outside-toplevel
+    import rasterio  # pylint: disable=import-outside-toplevel
+
+    with rasterio.open(path) as ds:
+        data = ds.read(1).astype("float64")
+        nodata = ds.nodata
+    valid = ~np.isnan(data)
+    if nodata is not None and not np.isnan(nodata):
+        valid &= data != nodata
+    # Grow the data mask by one probe pixel so tiles next to data are never called empty.
+    near = valid.copy()
+    near[1:, :] |= valid[:-1, :]
+    near[:-1, :] |= valid[1:, :]
+    near[:, 1:] |= valid[:, :-1]
+    near[:, :-1] |= valid[:, 1:]
+
+    step = data.shape[0] // grid
+    tiles = {}
+    for col in range(grid):
+        for row in range(grid):
+            top = (grid - 1 - row) * step  # raster rows run north to south
+            cells = (slice(top, top + step), slice(col * step, (col + 1) * step))
+            if valid[cells].all():
+                tiles[tile_key(col, row)] = FULL
+            elif near[cells].any():
+                tiles[tile_key(col, row)] = PARTIAL
+            else:
+                tiles[tile_key(col, row)] = EMPTY
+    samples = data[valid]
+    return {
+        "grid": grid,
+        "tiles": tiles,
+        "data_fraction": float(valid.mean()),
+        "relief_m": float(samples.max() - samples.min()) if samples.size else 0.0,
+    }
+
+
+def probe_macro_tile(
+    session: requests.Session,
+    controller: RateController,
+    bbox: tuple[float, float, float, float],
+    grid: int,
+    dest: Path,
+    retries: int = DEFAULT_RETRIES,
+) -> dict | None:
+    """
+    Probe the macro-tile covering ``bbox`` (``grid`` tiles per side) into
+    ``dest`` (a .tif; the classification is cached in ``dest`` with a .json
+    suffix). Returns None if the probe could not be downloaded.
+    """
+    cache = dest.with_suffix(".json")
+    if cache.exists():
+        cached = json.loads(cache.read_text(encoding="utf-8"))
+        if cached.get("grid") == grid and cached.get("bbox") == list(bbox):
+            return cached
+    size = grid * PROBE_PIXELS_PER_TILE
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    if not download_with_retries(session, controller, getmap_params(bbox, size, size), dest, retries):
+        return None
+    probe = dict(classify_probe(dest, grid), bbox=list(bbox))
+    cache.write_text(json.dumps(probe, indent=2), encoding="utf-8")
+    return probe
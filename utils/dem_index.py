@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Spatial index of a local archive of IGN DEM dalles (LiDAR HD MNT, RGE ALTI).
+
+Every dalle is located by its GeoTIFF header (ModelTiepoint, pixel scale and
+size) rather than by its name: IGN names dalles after the kilometre
+coordinates of their top-left corner, but the name does not tell a 1 km
+LiDAR HD dalle from a 5 km RGE ALTI 5 m one. Only the first IFD is read.
+
+The index is cached as JSON (by default ``local_dem_index.json`` in the batch
+tiles root) and refreshed incrementally: files whose size and mtime match the
+cache are not looked at again, so re-indexing an archive of thousands of
+dalles only costs a directory walk.
+"""
+import argparse
+import json
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from geotiff_header import TiffHeaderError, read_tiff_header
+
+INDEX_FILE = "local_dem_index.json"
+INDEX_VERSION = 2  # version 1 derived 1 km bboxes from the file names
+BUCKET_SIZE_M = 1000  # cell size of the in-memory lookup grid; dalles may span several cells
+TIFF_SUFFIXES = (".tif", ".tiff")
+DEFAULT_SCAN_WORKERS = 16
+
+
+def bbox_from_header(path: Path) -> tuple[float, float, float, float] | None:
+    try:
+        return read_tiff_header(path).bbox()
+    except (OSError, TiffHeaderError):
+        return None
+
+
+def overlap_area(a: tuple[float, float, float, float], b: tuple[float, float, float, float]) -> float:
+    return max(0.0, min(a[2], b[2]) - max(a[0], b[0])) * max(0.0, min(a[3], b[3]) - max(a[1], b[1]))
+
+
+class DemIndex:
+    def __init__(self, root: Path, entries: dict[str, list] | None = None):
+        self.root = Path(root)
+        # Relative path -> [mtime_ns, size, min_x, min_y, max_x, max_y]
+        self.entries = entries or {}
+        self._buckets: dict[tuple[int, int], list[str]] | None = None
+
+    @classmethod
+    def load(cls, root: Path, cache: Path, workers: int = DEFAULT_SCAN_WORKERS, save: bool = True) -> "DemIndex":
+        """Load the cached index of ``root`` from ``cache`` and bring it up to date with the archive."""
+        index = cls(root)
+        try:
+            payload = json.loads(Path(cache).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            payload = {}
+        if payload.get("version") == INDEX_VERSION and payload.get("root") == str(index.root.resolve()):
+            index.entries = payload.get("files", {})
+        if index.refresh(workers) and save:
+            index.save(cache)
+        return index
+
+    def refresh(self, workers: int = DEFAULT_SCAN_WORKERS) -> int:
+        """Re-index dalles whose mtime or size changed; return the number of entries updated."""
+        stale = []
+        seen = set()
+        for dirpath, _dirnames, filenames in os.walk(self.root, followlinks=True):
+            for name in filenames:
+                if not name.lower().endswith(TIFF_SUFFIXES):
+                    continue
+                path = Path(dirpath) / name
+                rel = path.relative_to(self.root).as_posix()
+                stat = path.stat()
+                seen.add(rel)
+                cached = self.entries.get(rel)
+                if cached is None or cached[0] != stat.st_mtime_ns or cached[1] != stat.st_size:
+                    stale.append((rel, path, stat))
+        removed = [rel for rel in self.entries if rel not in seen]
+        for rel in removed:
+            del self.entries[rel]
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            bboxes = list(pool.map(lambda item: bbox_from_header(item[1]), stale))
+        for (rel, _path, stat), bbox in zip(stale, bboxes):
+            if bbox is None:
+                # Not a georeferenced GeoTIFF; remember that so it is not reread every time.
+                self.entries[rel] = [stat.st_mtime_ns, stat.st_size, None, None, None, None]
+            else:
+                self.entries[rel] = [stat.st_mtime_ns, stat.st_size, *bbox]
+        self._buckets = None
+        return len(stale) + len(removed)
+
+    def save(self, cache: Path):
+        cache = Path(cache)
+        cache.parent.mkdir(parents=True, exist_ok=True)
+        payload = {"version": INDEX_VERSION, "root": str(self.root.resolve()), "files": self.entries}
+        tmp = cache.with_name(cache.name + ".tmp")
+        tmp.write_text(json.dumps(payload), encoding="utf-8")
+        os.replace(tmp, cache)
+
+    @property
+    def dalle_count(self) -> int:
+        return sum(1 for entry in self.entries.values() if entry[2] is not None)
+
+    def _bucket_range(self, bbox: tuple[float, float, float, float]):
+        for kx in range(math.floor(bbox[0] / BUCKET_SIZE_M), math.ceil(bbox[2] / BUCKET_SIZE_M)):
+            for ky in range(math.floor(bbox[1] / BUCKET_SIZE_M), math.ceil(bbox[3] / BUCKET_SIZE_M)):
+                yield kx, ky
+
+    def _bucketed(self) -> dict[tuple[int, int], list[str]]:
+        if self._buckets is None:
+            self._buckets = {}
+            for rel, entry in self.entries.items():
+                if entry[2] is None:
+                    continue
+                for key in self._bucket_range(entry[2:]):
+                    self._buckets.setdefault(key, []).append(rel)
+        return self._buckets
+
+    def overlapping(self, bbox: tuple[float, float, float, float]) -> list[tuple[Path, tuple]]:
+        """(path, bbox) of the dalles sharing a positive area with ``bbox``, sorted by path."""
+        buckets = self._bucketed()
+        found = set()
+        for key in self._bucket_range(bbox):
+            for rel in buckets.get(key, ()):
+                if rel not in found and overlap_area(self.entries[rel][2:], bbox) > 0:
+                    found.add(rel)
+        return [(self.root / rel, tuple(self.entries[rel][2:])) for rel in sorted(found)]
+
+    def covered_fraction(self, bbox: tuple[float, float, float, float]) -> float:
+        """Share of ``bbox`` covered by dalles (IGN dalles do not overlap each other)."""
+        area = (bbox[2] - bbox[0]) * (bbox[3] - bbox[1])
+        covered = sum(overlap_area(dalle_bbox, bbox) for _, dalle_bbox in self.overlapping(bbox))
+        return min(1.0, covered / area) if area > 0 else 0.0
+
+    def extent(self) -> tuple[float, float, float, float] | None:
+        boxes = [entry[2:] for entry in self.entries.values() if entry[2] is not None]
+        if not boxes:
+            return None
+        return (
+            min(box[0] for box in boxes),
+            min(box[1] for box in boxes),
+            max(box[2] for box in boxes),
+            max(box[3] for box in boxes),
+        )
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Index a local archive of IGN DEM dalles.")
+    parser.add_argument("root", help="Directory holding the dalles (searched recursively).")
+    parser.add_argument("--index", help=f"Index file to create or refresh (default: <root>/{INDEX_FILE}).")
+    parser.add_argument("--workers", type=int, default=DEFAULT_SCAN_WORKERS, help="Headers read in parallel.")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    root = Path(args.root)
+    index = DemIndex.load(root, Path(args.index) if args.index else root / INDEX_FILE, args.workers)
+    print(f"{index.dalle_count} georeferenced dalle(s) of {len(index.entries)} GeoTIFF(s)")
+    extent = index.extent()
+    if extent is not None:
+        print("Extent: " + ", ".join(f"{value:.0f}" for value in extent))
+
+
+if __name__ == "__main__":
+    main()
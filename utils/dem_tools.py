@@ -0,0 +1,531 @@
+#!/usr/bin/env python3
+"""
+Raster post-processing for downloaded DEM tiles.
+
+    downsample  Aggregate NxN pixel blocks (mean/max/min) so each output pixel
+                covers exactly one Minecraft column.
+    repack      Rewrite tiles as DEFLATE or LZW GeoTIFFs with a floating-point
+                predictor and 256 x 256 internal tiles, in a process pool. WMS
+                tiles are stored as the server sent them, usually uncompressed.
+    quantize    Rewrite float tiles as int16 (int32 if the relief needs it)
+                decimetres with the scale and offset in the GDAL metadata,
+                which francegen applies when it reads them. Values are nudged
+                where needed so every block height stays the same.
+
+repack and quantize replace each file with a new one. Macro-tile folders of
+batch runs hold hardlinks to the tile store, which keep the old bytes on disk
+until ``--relink`` points them at the new files.
+
+Requires numpy and rasterio (``pip install numpy rasterio``); they are only
+imported when a command actually runs so the download scripts keep working
+without them.
+"""
+import argparse
+import importlib.util
+import multiprocessing
+import os
+import sys
+import warnings
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+from geotiff_header import (
+    TAG_COMPRESSION,
+    TAG_GDAL_NODATA,
+    TAG_MODEL_PIXEL_SCALE,
+    TAG_MODEL_TIEPOINT,
+    TAG_SAMPLE_FORMAT,
+    TAG_TILE_OFFSETS,
+    TiffHeaderError,
+    read_tiff_header,
+)
+
+AGGREGATIONS = ("mean", "max", "min")
+SUMMARY_PIXELS = 64
+COMPRESSIONS = ("deflate", "lzw")
+# TIFF Compression tag values of each codec (32946 is the legacy Deflate code).
+COMPRESSION_CODES = {"deflate": (8, 32946), "lzw": (5,)}
+REPACK_BLOCK = 256
+QUANTIZE_SCALE = 0.1
+# Stored integer type -> value reserved for nodata.
+QUANTIZE_TYPES = {"int16": -(2**15), "int32": -(2**31)}
+# src/constants.rs
+BEDROCK_Y = -2048
+MAX_WORLD_Y = 2031
+
+
+def raster_libs_available() -> bool:
+    return importlib.util.find_spec("numpy") is not None and importlib.util.find_spec("rasterio") is not None
+
+
+def require_raster_libs():
+    try:
+        import numpy  # noqa: F401 pylint: disable=import-outside-toplevel,unused-import
+        import rasterio  # noqa: F401 pylint: disable=import-outside-toplevel,unused-import
+    except ImportError as exc:
+        raise SystemExit(f"dem_tools requires numpy and rasterio ({exc}); install them with 'pip install numpy rasterio'")
+
+
+def downsample_geotiff(src: Path, dst: Path, factor: int = 2, method: str = "mean"):
+    """
+    Write ``src`` aggregated over ``factor`` x ``factor`` pixel blocks to ``dst``.
+
+    Nodata pixels are ignored by the aggregation; a block becomes nodata only
+    when all of its pixels are. The output keeps the CRS and origin of the
+    source, with the pixel size multiplied by ``factor``.
+    """
+    require_raster_libs()
+    import numpy as np  # pylint: disable=import-outside-toplevel
+    import rasterio  # pylint: disable=import-outside-toplevel
+    from rasterio.transform import Affine  # pylint: disable=import-outside-toplevel
+
+    if method not in AGGREGATIONS:
+        raise ValueError(f"Unknown aggregation '{method}' (expected one of {', '.join(AGGREGATIONS)})")
+    with rasterio.open(src) as ds:
+        if ds.width % factor or ds.height % factor:
+            raise ValueError(f"{src} is {ds.width}x{ds.height}, not divisible by {factor}")
+        data = ds.read(1).astype("float64")
+        nodata = ds.nodata
+        profile = ds.profile.copy()
+        transform = ds.transform
+        scales, offsets = ds.scales, ds.offsets
+
+    invalid = np.isnan(data)
+    if nodata is not None and not np.isnan(nodata):
+        invalid |= data == nodata
+    data[invalid] = np.nan
+    blocks = data.reshape(data.shape[0] // factor, factor, data.shape[1] // factor, factor)
+    reducer = {"mean": np.nanmean, "max": np.nanmax, "min": np.nanmin}[method]
+    with warnings.catch_warnings():
+        # All-nodata blocks trigger "Mean of empty slice" / "All-NaN slice" warnings.
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        out = reducer(blocks, axis=(1, 3))
+    fill = nodata if nodata is not None else np.nan
+    if np.issubdtype(np.dtype(profile["dtype"]), np.integer):
+        out = np.rint(out)
+    out = np.where(np.isnan(out), fill, out).astype(profile["dtype"])
+
+    profile.update(
+        width=out.shape[1],
+        height=out.shape[0],
+        transform=transform * Affine.scale(factor),
+    )
+    # Drop block layouts sized for the source raster; GDAL picks defaults for the new size.
+    for key in ("blockxsize", "blockysize"):
+        profile.pop(key, None)
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    tmp = dst.with_name(dst.name + ".part")
+    with rasterio.open(tmp, "w", **profile) as ds:
+        ds.write(out, 1)
+        ds.scales = scales
+        ds.offsets = offsets
+    tmp.replace(dst)
+
+
+def raster_summary(path: Path, size: int = SUMMARY_PIXELS) -> tuple[int, int, float | None, float | None]:
+    """
+    (valid samples, total samples, min, max) of band 1 read at no more than
+    ``size`` x ``size`` pixels, which GDAL serves from overviews or a strided
+    read instead of decoding every pixel. Min and max are elevations, with
+    the band scale and offset applied.
+    """
+    require_raster_libs()
+    import numpy as np  # pylint: disable=import-outside-toplevel
+    import rasterio  # pylint: disable=import-outside-toplevel
+
+    with rasterio.open(path) as ds:
+        shape = (min(size, ds.height), min(size, ds.width))
+        data = ds.read(1, out_shape=shape).astype("float64")
+        nodata = ds.nodata
+        scale, offset = ds.scales[0], ds.offsets[0]
+    valid = ~np.isnan(data)
+    if nodata is not None and not np.isnan(nodata):
+        valid &= data != nodata
+    count = int(valid.sum())
+    if not count:
+        return 0, data.size, None, None
+    ends = (float(data[valid].min()) * scale + offset, float(data[valid].max()) * scale + offset)
+    return count, data.size, min(ends), max(ends)
+
+
+def georeferencing(path: Path) -> tuple:
+    """
+    The header fields francegen's ``GeoRaster`` georeferences a tile from:
+    tiepoint, pixel scale, nodata value, raster type (area or point) and
+    sample (scale, offset).
+    """
+    header = read_tiff_header(path)
+    nodata = header.tag_text(TAG_GDAL_NODATA)
+    return (
+        header.tags.get(TAG_MODEL_TIEPOINT),
+        header.tags.get(TAG_MODEL_PIXEL_SCALE),
+        float(nodata) if nodata else None,
+        header.raster_type(),
+        header.sample_scaling(),
+    )
+
+
+def is_repacked(path: Path, compression: str) -> bool:
+    """True if ``path`` is already internally tiled and compressed with ``compression``."""
+    header = read_tiff_header(path)
+    codec = header.tags.get(TAG_COMPRESSION, (1,))[0]
+    return codec in COMPRESSION_CODES[compression] and TAG_TILE_OFFSETS in header.tags
+
+
+def repack_geotiff(
+    src: Path, dst: Path | None = None, compression: str = "deflate", block: int = REPACK_BLOCK
+) -> tuple[int, int]:
+    """
+    Rewrite ``src`` (in place unless ``dst`` is given) as a ``compression``
+    GeoTIFF in ``block`` x ``block`` internal tiles, with the floating-point
+    predictor (horizontal differencing for integer data). The result only
+    replaces anything once its pixels and georeferencing match the source.
+    Returns the sizes in bytes before and after.
+    """
+    require_raster_libs()
+    import numpy as np  # pylint: disable=import-outside-toplevel
+    import rasterio  # pylint: disable=import-outside-toplevel
+
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"Unknown compression '{compression}' (expected one of {', '.join(COMPRESSIONS)})")
+    src = Path(src)
+    dst = Path(dst) if dst is not None else src
+    with rasterio.open(src) as ds:
+        data = ds.read()
+        profile = ds.profile.copy()
+        tags = ds.tags()
+        scales, offsets = ds.scales, ds.offsets
+    profile.update(
+        driver="GTiff",
+        compress=compression,
+        predictor=3 if np.issubdtype(data.dtype, np.floating) else 2,
+        tiled=True,
+        blockxsize=block,
+        blockysize=block,
+    )
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    tmp = dst.with_name(dst.name + ".part")
+    try:
+        with rasterio.open(tmp, "w", **profile) as ds:
+            ds.write(data)
+            # AREA_OR_POINT carries the raster type GeoKey.
+            ds.update_tags(**tags)
+            ds.scales = scales
+            ds.offsets = offsets
+        with rasterio.open(tmp) as ds:
+            same_pixels = np.array_equal(ds.read(), data, equal_nan=np.issubdtype(data.dtype, np.floating))
+        if not same_pixels:
+            raise ValueError(f"{src}: repacked pixels differ from the source")
+        if georeferencing(tmp) != georeferencing(src):
+            raise ValueError(f"{src}: repacking changed the georeferencing tags")
+        before = src.stat().st_size
+        after = tmp.stat().st_size
+        tmp.replace(dst)
+    finally:
+        tmp.unlink(missing_ok=True)
+    return before, after
+
+
+def _convert_geotiffs(convert, args: tuple, paths: list[Path], done, pool: ProcessPoolExecutor | None, force: bool):
+    """
+    Run ``convert(path, *args)`` on ``pool`` (a temporary one sized to the
+    CPU count if None) for every path where ``done(path)`` is false, or all
+    of them with ``force``. Returns (bytes before, bytes after, one message
+    per failed tile); failed tiles are left as they were.
+    """
+    todo = []
+    failures = []
+    for path in paths:
+        try:
+            if force or not done(path):
+                todo.append(path)
+        except (OSError, TiffHeaderError) as exc:
+            failures.append(f"{path}: {exc}")
+    if not todo:
+        return 0, 0, failures
+    own_pool = pool is None
+    if own_pool:
+        # Spawned workers stay safe when the caller runs threads of its own.
+        pool = ProcessPoolExecutor(max_workers=os.cpu_count(), mp_context=multiprocessing.get_context("spawn"))
+    before = after = 0
+    try:
+        futures = {pool.submit(convert, path, *args): path for path in todo}
+        for future in as_completed(futures):
+            try:
+                size_before, size_after = future.result()
+            except Exception as exc:  # pylint: disable=broad-except
+                failures.append(f"{futures[future]}: {exc}")
+                continue
+            before += size_before
+            after += size_after
+    finally:
+        if own_pool:
+            pool.shutdown()
+    return before, after, failures
+
+
+def repack_geotiffs(
+    paths: list[Path], compression: str = "deflate", pool: ProcessPoolExecutor | None = None, force: bool = False
+) -> tuple[int, int, list[str]]:
+    """
+    Repack ``paths`` in place on ``pool``, skipping tiles already in that
+    format unless ``force``. Returns (bytes before, bytes after, failures).
+    """
+    return _convert_geotiffs(
+        repack_geotiff, (None, compression), paths, lambda path: is_repacked(path, compression), pool, force
+    )
+
+
+def file_identity(path: Path) -> tuple[int, int]:
+    stat = path.stat()
+    return stat.st_dev, stat.st_ino
+
+
+def relink_hardlinks(roots: list[Path], replaced: dict[tuple[int, int], Path]) -> int:
+    """
+    Point the GeoTIFFs under ``roots`` that are still hardlinks of a replaced
+    file's old inode (``replaced`` maps its (st_dev, st_ino) to the new file)
+    at the new file, so the old bytes can be freed. Returns the number relinked.
+    """
+    relinked = 0
+    for root in roots:
+        for path in sorted(root.rglob("*.tif")):
+            if path.is_symlink():
+                continue
+            new = replaced.get(file_identity(path))
+            if new is None:
+                continue
+            tmp = path.with_name(path.name + ".relink")
+            tmp.unlink(missing_ok=True)
+            os.link(new, tmp)
+            os.replace(tmp, path)
+            relinked += 1
+    return relinked
+
+
+def minecraft_heights(values):
+    """Block heights francegen's ``dem_to_minecraft`` (src/world.rs) gives elevations ``values``."""
+    require_raster_libs()
+    import numpy as np  # pylint: disable=import-outside-toplevel
+
+    height = BEDROCK_Y + np.asarray(values, dtype="float64")
+    # Rust rounds halves away from zero, numpy to even.
+    rounded = np.rint(height)
+    whole = np.trunc(height)
+    ties = np.abs(height - whole) == 0.5
+    rounded[ties] = (whole + np.sign(height))[ties]
+    return np.clip(rounded, BEDROCK_Y, MAX_WORLD_Y)
+
+
+def is_quantized(path: Path) -> bool:
+    """True if ``path`` stores integer samples with a GDAL scale or offset."""
+    header = read_tiff_header(path)
+    return header.tags.get(TAG_SAMPLE_FORMAT, (1,))[0] == 2 and header.sample_scaling() != (1.0, 0.0)
+
+
+def quantize_geotiff(
+    src: Path,
+    dst: Path | None = None,
+    scale: float = QUANTIZE_SCALE,
+    compression: str = "deflate",
+    block: int = REPACK_BLOCK,
+) -> tuple[int, int]:
+    """
+    Rewrite the single-band DEM ``src`` (in place unless ``dst`` is given) as
+    integers of ``scale`` metres around a whole-metre offset, int16 when the
+    relief fits and int32 otherwise, compressed like ``repack_geotiff``.
+
+    Samples round to the nearest step, except where that would move them
+    across a block boundary: those take the neighbouring step, so the block
+    heights francegen derives stay identical. The result only replaces
+    anything once they, the nodata mask and the georeferencing are checked
+    against the source. Returns the sizes in bytes before and after.
+    """
+    require_raster_libs()
+    import numpy as np  # pylint: disable=import-outside-toplevel
+    import rasterio  # pylint: disable=import-outside-toplevel
+
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"Unknown compression '{compression}' (expected one of {', '.join(COMPRESSIONS)})")
+    src = Path(src)
+    dst = Path(dst) if dst is not None else src
+    with rasterio.open(src) as ds:
+        if ds.count != 1:
+            raise ValueError(f"{src}: expected a single-band DEM, found {ds.count} bands")
+        data = ds.read(1).astype("float64")
+        nodata = ds.nodata
+        profile = ds.profile.copy()
+        tags = ds.tags()
+    src_scale, src_offset = read_tiff_header(src).sample_scaling()
+    valid = ~np.isnan(data)
+    if nodata is not None and not np.isnan(nodata):
+        valid &= data != nodata
+    heights = data[valid] * src_scale + src_offset
+    offset = float(round((heights.min() + heights.max()) / 2)) if heights.size else 0.0
+    target = minecraft_heights(heights)
+    steps = np.rint((heights - offset) / scale)
+    # Rounding to the nearest step can cross a block boundary (x.46 -> x.5); step back inside the block.
+    steps += np.sign(target - minecraft_heights(steps * scale + offset))
+    if not np.array_equal(minecraft_heights(steps * scale + offset), target):
+        raise ValueError(f"{src}: a scale of {scale} m is too coarse to keep every block height")
+    low, high = (steps.min(), steps.max()) if steps.size else (0, 0)
+    dtype = next(
+        (name for name, fill in QUANTIZE_TYPES.items() if fill < low and high <= -fill - 1),
+        None,
+    )
+    if dtype is None:
+        raise ValueError(f"{src}: the relief does not fit int32 at a scale of {scale} m")
+    fill = QUANTIZE_TYPES[dtype]
+    out = np.full(data.shape, fill, dtype=dtype)
+    out[valid] = steps.astype(dtype)
+
+    profile.update(
+        driver="GTiff",
+        dtype=dtype,
+        nodata=fill,
+        compress=compression,
+        predictor=2,
+        tiled=True,
+        blockxsize=block,
+        blockysize=block,
+    )
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    tmp = dst.with_name(dst.name + ".part")
+    try:
+        with rasterio.open(tmp, "w", **profile) as ds:
+            ds.write(out, 1)
+            ds.update_tags(**tags)
+            ds.scales = (scale,)
+            ds.offsets = (offset,)
+        # Decode as GeoRaster does: scale and offset from the GDAL_METADATA text.
+        with rasterio.open(tmp) as ds:
+            stored = ds.read(1)
+        stored_scale, stored_offset = read_tiff_header(tmp).sample_scaling()
+        stored_valid = stored != fill
+        if not np.array_equal(stored_valid, valid) or not np.array_equal(
+            minecraft_heights(stored[stored_valid] * stored_scale + stored_offset), target
+        ):
+            raise ValueError(f"{src}: quantized block heights differ from the source")
+        before_ref, after_ref = georeferencing(src), georeferencing(tmp)
+        if (before_ref[0], before_ref[1], before_ref[3]) != (after_ref[0], after_ref[1], after_ref[3]):
+            raise ValueError(f"{src}: quantizing changed the georeferencing tags")
+        before = src.stat().st_size
+        after = tmp.stat().st_size
+        tmp.replace(dst)
+    finally:
+        tmp.unlink(missing_ok=True)
+    return before, after
+
+
+def quantize_geotiffs(
+    paths: list[Path],
+    scale: float = QUANTIZE_SCALE,
+    compression: str = "deflate",
+    pool: ProcessPoolExecutor | None = None,
+    force: bool = False,
+) -> tuple[int, int, list[str]]:
+    """
+    Quantize ``paths`` in place on ``pool``, skipping tiles that are already
+    scaled integers unless ``force``. Returns (bytes before, bytes after, failures).
+    """
+    return _convert_geotiffs(quantize_geotiff, (None, scale, compression), paths, is_quantized, pool, force)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Post-process downloaded DEM GeoTIFF tiles.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    down = sub.add_parser("downsample", help="Aggregate NxN pixel blocks into a coarser tile.")
+    down.add_argument("inputs", nargs="+", help="Input GeoTIFF files.")
+    down.add_argument("--out-dir", required=True, help="Directory for the downsampled tiles (same file names).")
+    down.add_argument("--factor", type=int, default=2, help="Block size to aggregate (default: 2, 0.5 m -> 1 m).")
+    down.add_argument("--method", choices=AGGREGATIONS, default="mean", help="Aggregation (default: mean).")
+
+    repack = sub.add_parser("repack", help="Rewrite tiles in place as compressed, internally tiled GeoTIFFs.")
+    repack.add_argument("inputs", nargs="+", help="GeoTIFF files, or directories searched recursively (e.g. a tile store).")
+    repack.add_argument("--compression", choices=COMPRESSIONS, default="deflate", help="Codec (default: deflate).")
+    repack.add_argument("--workers", type=int, default=os.cpu_count(), help="Tiles repacked in parallel (default: CPUs).")
+    repack.add_argument("--force", action="store_true", help="Repack tiles that already use the codec.")
+    repack.add_argument(
+        "--relink",
+        action="append",
+        default=[],
+        metavar="DIR",
+        help=(
+            "Directory searched recursively for other hardlinks of converted tiles (e.g. the batch "
+            "--tiles-root, whose macro-tile folders link into the store), which are pointed at the new "
+            "files so the old ones are freed. Repeatable."
+        ),
+    )
+
+    quantize = sub.add_parser("quantize", help="Rewrite tiles in place as scaled int16/int32 GeoTIFFs.")
+    quantize.add_argument("inputs", nargs="+", help="GeoTIFF files, or directories searched recursively.")
+    quantize.add_argument(
+        "--scale", type=float, default=QUANTIZE_SCALE, help=f"Metres per stored step (default: {QUANTIZE_SCALE})."
+    )
+    quantize.add_argument("--compression", choices=COMPRESSIONS, default="deflate", help="Codec (default: deflate).")
+    quantize.add_argument("--workers", type=int, default=os.cpu_count(), help="Tiles converted in parallel (default: CPUs).")
+    quantize.add_argument("--force", action="store_true", help="Convert tiles that are already scaled integers.")
+    quantize.add_argument(
+        "--relink",
+        action="append",
+        default=[],
+        metavar="DIR",
+        help=(
+            "Directory searched recursively for other hardlinks of converted tiles (e.g. the batch "
+            "--tiles-root, whose macro-tile folders link into the store), which are pointed at the new "
+            "files so the old ones are freed. Repeatable."
+        ),
+    )
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.command == "downsample":
+        out_dir = Path(args.out_dir)
+        for src in args.inputs:
+            src = Path(src)
+            downsample_geotiff(src, out_dir / src.name, args.factor, args.method)
+            print(f"{src} -> {out_dir / src.name}")
+    else:
+        paths = []
+        for item in map(Path, args.inputs):
+            paths.extend(sorted(item.rglob("*.tif")) if item.is_dir() else [item])
+        # Files with other hardlinks keep their old bytes on disk until those links are replaced too.
+        linked = {}
+        for path in paths:
+            if path.is_file() and path.stat().st_nlink > 1:
+                linked[path] = file_identity(path)
+        with ProcessPoolExecutor(max_workers=max(1, args.workers)) as pool:
+            if args.command == "repack":
+                before, after, failures = repack_geotiffs(paths, args.compression, pool, args.force)
+            else:
+                if not 0 < args.scale <= 0.5:
+                    raise ValueError("--scale must be between 0 and 0.5 m to keep block heights")
+                before, after, failures = quantize_geotiffs(paths, args.scale, args.compression, pool, args.force)
+        for failure in failures:
+            print(f"Skipped {failure}", file=sys.stderr)
+        replaced = {old: path for path, old in linked.items() if file_identity(path) != old}
+        if replaced and args.relink:
+            relinked = relink_hardlinks([Path(root) for root in args.relink], replaced)
+            print(f"Pointed {relinked} hardlink(s) of converted tiles at the new files")
+        elif replaced:
+            print(
+                f"{len(replaced)} converted tile(s) still have hardlinks elsewhere (e.g. staged macro-tile "
+                "folders) that keep the old files on disk; pass --relink <tiles-root> to free them",
+                file=sys.stderr,
+            )
+        verb = "Repacked" if args.command == "repack" else "Quantized"
+        if before:
+            print(f"{verb} {before / 1e6:.1f} MB into {after / 1e6:.1f} MB ({before / max(after, 1):.1f}x smaller)")
+        else:
+            print(f"Nothing to {args.command}")
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except ValueError as exc:
+        print(exc, file=sys.stderr)
+        sys.exit(1)
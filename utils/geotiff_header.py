@@ -0,0 +1,211 @@
+"""
+Minimal TIFF/GeoTIFF header reader.
+
+Only the first IFD is parsed and pixel data is never touched, so checking a
+tile costs a couple of small reads. This is enough to tell a complete WMS
+GeoTIFF from a truncated or non-image download, and to recover the
+georeferencing that francegen's ``GeoRaster`` relies on (ModelTiepointTag and
+ModelPixelScaleTag).
+"""
+import struct
+import xml.etree.ElementTree as ET
+from dataclasses import dataclass, field
+from pathlib import Path
+
+TAG_IMAGE_WIDTH = 256
+TAG_IMAGE_LENGTH = 257
+TAG_BITS_PER_SAMPLE = 258
+TAG_COMPRESSION = 259
+TAG_STRIP_OFFSETS = 273
+TAG_STRIP_BYTE_COUNTS = 279
+TAG_TILE_OFFSETS = 324
+TAG_TILE_BYTE_COUNTS = 325
+TAG_SAMPLE_FORMAT = 339
+TAG_MODEL_PIXEL_SCALE = 33550
+TAG_MODEL_TIEPOINT = 33922
+TAG_GEO_KEY_DIRECTORY = 34735
+TAG_GDAL_METADATA = 42112
+TAG_GDAL_NODATA = 42113
+GEOKEY_RASTER_TYPE = 1025
+
+# TIFF field type -> (struct code, size in bytes)
+FIELD_TYPES = {
+    1: ("B", 1),  # BYTE
+    2: ("c", 1),  # ASCII
+    3: ("H", 2),  # SHORT
+    4: ("I", 4),  # LONG
+    5: ("II", 8),  # RATIONAL
+    6: ("b", 1),  # SBYTE
+    7: ("B", 1),  # UNDEFINED
+    8: ("h", 2),  # SSHORT
+    9: ("i", 4),  # SLONG
+    10: ("ii", 8),  # SRATIONAL
+    11: ("f", 4),  # FLOAT
+    12: ("d", 8),  # DOUBLE
+    16: ("Q", 8),  # LONG8 (BigTIFF)
+    17: ("q", 8),  # SLONG8 (BigTIFF)
+    18: ("Q", 8),  # IFD8 (BigTIFF)
+}
+
+class TiffHeaderError(ValueError):
+    pass
+
+
+@dataclass
+class TiffHeader:
+    width: int
+    height: int
+    tags: dict[int, tuple] = field(default_factory=dict)
+
+    @property
+    def is_georeferenced(self) -> bool:
+        return TAG_MODEL_TIEPOINT in self.tags and TAG_MODEL_PIXEL_SCALE in self.tags
+
+    def tag_text(self, tag: int) -> str | None:
+        value = self.tags.get(tag)
+        if value is None:
+            return None
+        return bytes(value).decode("latin-1").rstrip("\x00")
+
+    def sample_scaling(self) -> tuple[float, float]:
+        """(scale, offset) of band 1 from the GDAL_METADATA tag, (1, 0) if unscaled, as GeoRaster applies them."""
+        scaling = {"scale": 1.0, "offset": 0.0}
+        text = self.tag_text(TAG_GDAL_METADATA)
+        if not text:
+            return scaling["scale"], scaling["offset"]
+        # <Item name="SCALE" sample="0" role="scale">0.1</Item>, keyed by role, falling back to name
+        for item in ET.fromstring(text).iter("Item"):
+            key = (item.get("role") or item.get("name") or "").lower()
+            if item.get("sample", "0").strip() != "0" or key not in scaling:
+                continue
+            try:
+                scaling[key] = float((item.text or "").strip())
+            except ValueError:
+                pass
+        return scaling["scale"], scaling["offset"]
+
+    def raster_type(self) -> int | None:
+        """The GTRasterTypeGeoKey value (1 = PixelIsArea, 2 = PixelIsPoint), None if absent."""
+        keys = self.tags.get(TAG_GEO_KEY_DIRECTORY, ())
+        for i in range(4, len(keys) - 3, 4):
+            if keys[i] == GEOKEY_RASTER_TYPE and keys[i + 1] == 0:
+                return keys[i + 3]
+        return None
+
+    def sample_shift(self) -> tuple[float, float]:
+        """
+        Model-space offset from the top-left corner of a pixel to the point francegen's
+        ``GeoRaster`` samples it at: half a pixel up and left when the raster type GeoKey is 1.
+        """
+        if self.raster_type() != 1:
+            return 0.0, 0.0
+        scale = self.tags[TAG_MODEL_PIXEL_SCALE]
+        return -0.5 * scale[0], 0.5 * scale[1]
+
+    def origin(self) -> tuple[float, float] | None:
+        """
+        Model-space point of pixel (0, 0) exactly as francegen's ``GeoRaster::origin``
+        computes it, i.e. the origin a fresh world takes from this tile: the top-left
+        corner moved by ``sample_shift``.
+        """
+        bbox = self.bbox()
+        if bbox is None:
+            return None
+        shift_x, shift_y = self.sample_shift()
+        return bbox[0] + shift_x, bbox[3] + shift_y
+
+    def bbox(self) -> tuple[float, float, float, float] | None:
+        """Model-space (min_x, min_y, max_x, max_y) of the raster, assuming PixelIsArea."""
+        if not self.is_georeferenced:
+            return None
+        tie = self.tags[TAG_MODEL_TIEPOINT]
+        scale = self.tags[TAG_MODEL_PIXEL_SCALE]
+        min_x = tie[3] - tie[0] * scale[0]
+        max_y = tie[4] + tie[1] * scale[1]
+        return (min_x, max_y - self.height * scale[1], min_x + self.width * scale[0], max_y)
+
+
+def read_tiff_header(path: Path) -> TiffHeader:
+    """Parse the first IFD of a classic or Big TIFF file."""
+    with open(path, "rb") as f:
+        head = f.read(16)
+        if len(head) < 8:
+            raise TiffHeaderError("file too short for a TIFF header")
+        if head[:2] == b"II":
+            endian = "<"
+        elif head[:2] == b"MM":
+            endian = ">"
+        else:
+            raise TiffHeaderError("missing TIFF byte-order mark")
+        (magic,) = struct.unpack(endian + "H", head[2:4])
+        if magic == 42:
+            big = False
+            (ifd_offset,) = struct.unpack(endian + "I", head[4:8])
+        elif magic == 43 and len(head) >= 16:
+            big = True
+            (ifd_offset,) = struct.unpack(endian + "Q", head[8:16])
+        else:
+            raise TiffHeaderError(f"unexpected TIFF magic {magic}")
+
+        count_fmt, entry_size, inline_size = ("Q", 20, 8) if big else ("H", 12, 4)
+        f.seek(ifd_offset)
+        raw_count = f.read(struct.calcsize(count_fmt))
+        if len(raw_count) != struct.calcsize(count_fmt):
+            raise TiffHeaderError("IFD offset points past end of file")
+        (entry_count,) = struct.unpack(endian + count_fmt, raw_count)
+        entries = f.read(entry_count * entry_size)
+        if len(entries) != entry_count * entry_size:
+            raise TiffHeaderError("truncated IFD")
+
+        tags: dict[int, tuple] = {}
+        for i in range(entry_count):
+            entry = entries[i * entry_size : (i + 1) * entry_size]
+            if big:
+                tag, field_type, count = struct.unpack(endian + "HHQ", entry[:12])
+                value_field = entry[12:20]
+            else:
+                tag, field_type, count = struct.unpack(endian + "HHI", entry[:8])
+                value_field = entry[8:12]
+            if field_type not in FIELD_TYPES:
+                continue
+            code, size = FIELD_TYPES[field_type]
+            total = size * count
+            if total <= inline_size:
+                data = value_field[:total]
+            else:
+                (offset,) = struct.unpack(endian + ("Q" if big else "I"), value_field)
+                f.seek(offset)
+                data = f.read(total)
+                if len(data) != total:
+                    raise TiffHeaderError(f"tag {tag} data extends past end of file")
+            if field_type == 2:
+                tags[tag] = tuple(data)
+            else:
+                tags[tag] = struct.unpack(endian + code * count, data)
+
+        if TAG_IMAGE_WIDTH not in tags or TAG_IMAGE_LENGTH not in tags:
+            raise TiffHeaderError("missing image dimensions")
+        header = TiffHeader(width=int(tags[TAG_IMAGE_WIDTH][0]), height=int(tags[TAG_IMAGE_LENGTH][0]), tags=tags)
+
+        # The last strip/tile must end inside the file, which catches truncated downloads.
+        f.seek(0, 2)
+        file_size = f.tell()
+        for offsets_tag, counts_tag in ((TAG_STRIP_OFFSETS, TAG_STRIP_BYTE_COUNTS), (TAG_TILE_OFFSETS, TAG_TILE_BYTE_COUNTS)):
+            if offsets_tag in tags and counts_tag in tags:
+                data_end = max(o + c for o, c in zip(tags[offsets_tag], tags[counts_tag]))
+                if data_end > file_size:
+                    raise TiffHeaderError(f"image data ends at byte {data_end} but file has {file_size}")
+        return header
+
+
+def validate_geotiff(path: Path, width: int | None = None, height: int | None = None) -> str | None:
+    """Return a description of what is wrong with ``path``, or None if it looks like a usable GeoTIFF."""
+    try:
+        header = read_tiff_header(path)
+    except (OSError, TiffHeaderError, struct.error) as exc:
+        return str(exc)
+    if width is not None and height is not None and (header.width, header.height) != (width, height):
+        return f"size {header.width}x{header.height}, expected {width}x{height}"
+    if not header.is_georeferenced:
+        return "missing GeoTIFF ModelTiepointTag/ModelPixelScaleTag"
+    return None
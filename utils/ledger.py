@@ -0,0 +1,137 @@
+"""
+Completion markers for batch macro-tiles.
+
+Each generated macro-tile gets a ``.francegen_done`` JSON file recording when
+and how it was built, plus a fingerprint of its inputs:
+
+    tiles      sha256, size and mtime of every staged GeoTIFF (of its store
+               tile when resuming, see ``tile_checksums``)
+    francegen  sha256 of the francegen binary
+    config     sha256 of the file passed to francegen with ``--config``
+    args       the extra francegen arguments
+
+``--resume`` only skips a macro-tile whose recorded fingerprint still matches,
+so changing the config, rebuilding francegen or replacing a tile redoes
+exactly the macro-tiles affected.
+"""
+import datetime
+import hashlib
+import json
+import os
+import shlex
+import shutil
+from pathlib import Path
+
+DONE_MARKER = ".francegen_done"
+MARKER_VERSION = 1
+HASH_CHUNK_BYTES = 1 << 20
+
+
+def file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while block := f.read(HASH_CHUNK_BYTES):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def option_path(extra_args: list[str], option: str) -> Path | None:
+    """The path given to ``option`` (e.g. ``--config``) in francegen arguments, if any."""
+    for i, arg in enumerate(extra_args):
+        if arg == option and i + 1 < len(extra_args):
+            return Path(extra_args[i + 1])
+        if arg.startswith(option + "="):
+            return Path(arg.split("=", 1)[1])
+    return None
+
+
+def config_path(extra_args: list[str]) -> Path | None:
+    """The ``--config`` file named in francegen arguments, if any."""
+    return option_path(extra_args, "--config")
+
+
+def run_fingerprint(bin_path: str, extra_args: str) -> dict:
+    """Fingerprint of the francegen build and arguments shared by every macro-tile of a run."""
+    args = shlex.split(extra_args)
+    resolved = shutil.which(bin_path) or bin_path
+    config = config_path(args)
+    return {
+        "francegen": file_sha256(Path(resolved)) if os.path.isfile(resolved) else None,
+        "config": file_sha256(config) if config is not None and config.is_file() else None,
+        "args": args,
+    }
+
+
+def tile_checksums(
+    macro_dir: Path, previous: dict | None = None, sources: dict[str, Path] | None = None
+) -> dict[str, dict]:
+    """
+    Checksums of the GeoTIFFs staged in ``macro_dir``. Entries of ``previous``
+    whose size and mtime still match are reused instead of rehashing the file.
+    ``sources`` maps staged names to the files they are staged from, which are
+    hashed instead when they exist: the tile store replaces a tile with a new
+    file, leaving the hardlink staged earlier on the old bytes.
+    """
+    previous = previous or {}
+    sources = sources or {}
+    checksums = {}
+    for staged in sorted(macro_dir.glob("*.tif")):
+        source = sources.get(staged.name)
+        path = source if source is not None and source.exists() else staged
+        stat = path.stat()
+        known = previous.get(staged.name)
+        if known and known.get("size") == stat.st_size and known.get("mtime_ns") == stat.st_mtime_ns:
+            checksums[staged.name] = known
+            continue
+        checksums[staged.name] = {"sha256": file_sha256(path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+    return checksums
+
+
+def completion_marker(macro_dir: Path) -> Path:
+    return macro_dir / DONE_MARKER
+
+
+def read_marker(macro_dir: Path) -> dict | None:
+    """The parsed marker, or None if it is missing or predates the JSON format."""
+    try:
+        marker = json.loads(completion_marker(macro_dir).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    return marker if isinstance(marker, dict) and marker.get("version") == MARKER_VERSION else None
+
+
+def mark_completed(macro_dir: Path, cmd: list[str], fingerprint: dict, coverage: float | None = None):
+    marker = completion_marker(macro_dir)
+    completed_at = datetime.datetime.now(datetime.UTC).isoformat().replace("+00:00", "Z")
+    payload = {
+        "version": MARKER_VERSION,
+        "completed_at": completed_at,
+        "command": cmd,
+        "coverage": coverage,
+        "fingerprint": fingerprint,
+    }
+    tmp = marker.with_name(marker.name + ".tmp")
+    tmp.write_text(json.dumps(payload, indent=2), encoding="utf-8")
+    os.replace(tmp, marker)
+
+
+def marker_is_current(macro_dir: Path, run: dict, sources: dict[str, Path] | None = None) -> bool:
+    """
+    True if ``macro_dir`` was completed with the same francegen build, config
+    and arguments as ``run`` and its staged tiles are unchanged, judged by the
+    files in ``sources`` they are staged from (see ``tile_checksums``). Tiles
+    that have been cleaned up since are taken as unchanged.
+    """
+    marker = read_marker(macro_dir)
+    if marker is None:
+        return False
+    recorded = marker.get("fingerprint") or {}
+    if any(recorded.get(key) != value for key, value in run.items()):
+        return False
+    recorded_tiles = recorded.get("tiles") or {}
+    current_tiles = tile_checksums(macro_dir, recorded_tiles, sources)
+    if not current_tiles:
+        return True
+    return {name: entry["sha256"] for name, entry in current_tiles.items()} == {
+        name: entry.get("sha256") for name, entry in recorded_tiles.items()
+    }
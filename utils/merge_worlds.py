@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Merge francegen worlds generated separately (e.g. one scratch world per
+macro-tile worker) into a single target world.
+
+Region files are memory-mapped and chunk records are copied sector-for-sector
+into the target regions without decompressing them. When several worlds hold
+the same chunk, the conflict policy decides which copy wins:
+
+    newest    highest location-table timestamp, then newest region file
+              mtime, then the later world on the command line (the
+              target, named first, loses every tie)
+    priority  the first world on the command line that has the chunk
+
+The target's own chunks take part in both policies (as the lowest priority
+for ``priority``). francegen_meta.json bounds are unioned the way
+``WorldStats::union`` does.
+
+Scratch worlds should be generated with ``empty_chunk_radius`` set to 0:
+francegen pads fresh worlds with empty chunks, which would otherwise compete
+with a neighbouring world's real terrain.
+"""
+import argparse
+import os
+import shutil
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from tqdm import tqdm
+
+from anvil import RegionReader, external_chunk_path, parse_region_name, region_files, write_region
+from world_meta import load_metadata, union_metadata, write_metadata
+
+POLICIES = ("newest", "priority")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Merge francegen worlds by copying compressed chunk sectors.")
+    parser.add_argument("target", help="World directory to merge into (created if missing).")
+    parser.add_argument("sources", nargs="+", help="World directories to merge from, highest priority first.")
+    parser.add_argument(
+        "--policy",
+        choices=POLICIES,
+        default="newest",
+        help="How to resolve chunks present in more than one world (default: newest).",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Region files merged in parallel (default: CPU count).",
+    )
+    return parser.parse_args()
+
+
+def merge_region(name: str, target: Path, sources: list[Path], policy: str) -> tuple[str, int, int]:
+    """
+    Merge region ``name`` from ``sources`` (priority order) and the target's
+    existing copy into ``target``. Returns (name, chunks written, chunks taken
+    from sources).
+    """
+    target_region = target / "region" / name
+    region_x, region_z = parse_region_name(target_region)
+    # Candidates in descending priority; the target's existing data comes last.
+    candidates = [src / "region" / name for src in sources]
+    candidates = [path for path in candidates if path.exists()]
+    if target_region.exists():
+        candidates.append(target_region)
+    readers = [RegionReader(path) for path in candidates]
+    try:
+        chosen: dict[int, tuple[tuple, RegionReader]] = {}
+        for rank, reader in enumerate(readers):
+            mtime = reader.path.stat().st_mtime
+            # Command-line position for ``newest`` ties: the target first, then the sources in order.
+            position = 0 if reader.path == target_region else rank + 1
+            for index, entry in reader.entries.items():
+                if not reader.has_payload(index):
+                    continue
+                if policy == "priority":
+                    key = (-rank,)
+                else:
+                    key = (entry.timestamp, mtime, position)
+                current = chosen.get(index)
+                if current is None or key > current[0]:
+                    chosen[index] = (key, reader)
+
+        records = {}
+        from_sources = 0
+        for index, (_key, reader) in chosen.items():
+            records[index] = (reader.payload(index), reader.entries[index].timestamp)
+            if reader.path != target_region:
+                from_sources += 1
+                if reader.is_external(index):
+                    src = external_chunk_path(reader.path, region_x, region_z, index)
+                    if src.exists():
+                        shutil.copy2(src, external_chunk_path(target_region, region_x, region_z, index))
+        if records:
+            write_region(target_region, records)
+        for record, _timestamp in records.values():
+            record.release()  # views into the mmaps must go before the readers close
+        return name, len(records), from_sources
+    finally:
+        for reader in readers:
+            reader.close()
+
+
+def merge_worlds(target: Path, sources: list[Path], policy: str = "newest", workers: int = 1):
+    (target / "region").mkdir(parents=True, exist_ok=True)
+    names = sorted({path.name for src in sources for path in region_files(src)})
+
+    metadata = load_metadata(target)
+    for src in sources:
+        metadata = union_metadata(metadata, load_metadata(src))
+
+    total_chunks = 0
+    copied = 0
+    with ProcessPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = [pool.submit(merge_region, name, target, sources, policy) for name in names]
+        for future in tqdm(futures, desc="Merging regions", unit="region"):
+            _name, chunks, from_sources = future.result()
+            total_chunks += chunks
+            copied += from_sources
+
+    if metadata is not None:
+        write_metadata(target, metadata)
+    # The world template (level.dat + datapacks) is identical across francegen worlds.
+    if not (target / "level.dat").exists():
+        for src in sources:
+            if (src / "level.dat").exists():
+                shutil.copy2(src / "level.dat", target / "level.dat")
+                if (src / "datapacks").is_dir() and not (target / "datapacks").exists():
+                    shutil.copytree(src / "datapacks", target / "datapacks")
+                break
+    print(f"Merged {len(names)} region file(s): {copied} chunk(s) copied, {total_chunks} chunk(s) in merged regions")
+
+
+def main():
+    args = parse_args()
+    target = Path(args.target)
+    sources = [Path(src) for src in args.sources]
+    for src in sources:
+        if not (src / "region").is_dir():
+            print(f"{src} has no region directory", file=sys.stderr)
+            sys.exit(1)
+    merge_worlds(target, sources, args.policy, args.workers)
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except ValueError as exc:
+        print(exc, file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+Index of the chunks present in a world, built from region headers only.
+
+Each ``region/r.X.Z.mca`` contributes a 1024-bit presence bitmap plus the
+location-table timestamp and sector count (compressed size in 4 KiB sectors)
+of every present chunk. Only the 8 KiB header of each file is read, so the
+index never touches chunk data.
+
+The index is cached as ``francegen_region_index.bin`` beside
+francegen_meta.json and refreshed incrementally: region files whose mtime and
+size match the cache are not reopened. Cached regions are decoded lazily, so
+loading the index of a large world and asking about one macro-tile only costs
+the regions that macro-tile touches.
+"""
+import argparse
+import mmap
+import os
+import struct
+import sys
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from anvil import CHUNKS_PER_REGION, HEADER_BYTES, REGION_SIDE_CHUNKS, SECTOR_BYTES, parse_region_name
+
+INDEX_FILE = "francegen_region_index.bin"
+INDEX_MAGIC = b"FGRI"
+INDEX_VERSION = 1
+BITMAP_BYTES = CHUNKS_PER_REGION // 8
+# Per region: x, z, mtime_ns, size, present chunk count.
+REGION_RECORD = struct.Struct(">iiqqH")
+DEFAULT_SCAN_WORKERS = 16
+
+
+class RegionSummary:
+    """Presence bitmap of one region, with per-chunk timestamps and sector counts in index order."""
+
+    __slots__ = ("x", "z", "mtime_ns", "size", "bitmap", "_timestamps", "_sectors")
+
+    def __init__(self, x: int, z: int, mtime_ns: int, size: int, bitmap: bytes, timestamps: bytes, sectors: bytes):
+        self.x = x
+        self.z = z
+        self.mtime_ns = mtime_ns
+        self.size = size
+        self.bitmap = bitmap
+        self._timestamps = timestamps
+        self._sectors = sectors
+
+    @classmethod
+    def from_header(cls, x: int, z: int, mtime_ns: int, size: int, header: bytes) -> "RegionSummary":
+        bitmap = bytearray(BITMAP_BYTES)
+        timestamps = array("I")
+        sectors = bytearray()
+        if len(header) >= HEADER_BYTES:
+            locations = struct.unpack(">1024I", header[:SECTOR_BYTES])
+            stamps = struct.unpack(">1024I", header[SECTOR_BYTES:HEADER_BYTES])
+            for index, location in enumerate(locations):
+                offset, count = location >> 8, location & 0xFF
+                # Entries pointing past the end of the file are as good as missing.
+                if offset < 2 or count == 0 or (offset + count) * SECTOR_BYTES > size:
+                    continue
+                bitmap[index >> 3] |= 1 << (index & 7)
+                timestamps.append(stamps[index])
+                sectors.append(count)
+        if sys.byteorder == "little":
+            timestamps.byteswap()
+        return cls(x, z, mtime_ns, size, bytes(bitmap), timestamps.tobytes(), bytes(sectors))
+
+    @property
+    def chunk_count(self) -> int:
+        return len(self._sectors)
+
+    def has(self, index: int) -> bool:
+        return bool(self.bitmap[index >> 3] & (1 << (index & 7)))
+
+    def chunks(self):
+        """Yield (index, timestamp, compressed bytes rounded up to sectors) for every present chunk."""
+        timestamps = array("I", self._timestamps)
+        if sys.byteorder == "little":
+            timestamps.byteswap()
+        position = 0
+        for index in range(CHUNKS_PER_REGION):
+            if self.has(index):
+                yield index, timestamps[position], self._sectors[position] * SECTOR_BYTES
+                position += 1
+
+    def written_since(self, since: int) -> set[int]:
+        """
+        Indices of the chunks whose location-table timestamp is ``since`` (epoch
+        seconds) or later. Chunks without a timestamp fall back to the mtime of
+        the region file.
+        """
+        file_is_newer = self.mtime_ns >= since * 1_000_000_000
+        return {
+            index for index, timestamp, _ in self.chunks() if timestamp >= since or (timestamp == 0 and file_is_newer)
+        }
+
+    def encode(self) -> bytes:
+        record = REGION_RECORD.pack(self.x, self.z, self.mtime_ns, self.size, self.chunk_count)
+        return record + self.bitmap + self._timestamps + self._sectors
+
+
+def scan_region(path: Path, mtime_ns: int, size: int) -> RegionSummary | None:
+    coords = parse_region_name(path)
+    if coords is None:
+        return None
+    header = b""
+    if size >= HEADER_BYTES:
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), HEADER_BYTES, access=mmap.ACCESS_READ) as view:
+            header = view[:HEADER_BYTES]
+    return RegionSummary.from_header(coords[0], coords[1], mtime_ns, size, header)
+
+
+def decode_index(data: bytes) -> dict[tuple[int, int], RegionSummary]:
+    if data[:4] != INDEX_MAGIC or len(data) < 6 or struct.unpack(">H", data[4:6])[0] != INDEX_VERSION:
+        return {}
+    regions = {}
+    position = 6
+    while position + REGION_RECORD.size <= len(data):
+        x, z, mtime_ns, size, count = REGION_RECORD.unpack_from(data, position)
+        position += REGION_RECORD.size
+        end = position + BITMAP_BYTES + 5 * count
+        if end > len(data):
+            return {}
+        bitmap = data[position : position + BITMAP_BYTES]
+        timestamps = data[position + BITMAP_BYTES : position + BITMAP_BYTES + 4 * count]
+        sectors = data[position + BITMAP_BYTES + 4 * count : end]
+        regions[(x, z)] = RegionSummary(x, z, mtime_ns, size, bitmap, timestamps, sectors)
+        position = end
+    return regions
+
+
+class RegionIndex:
+    def __init__(self, world_dir: Path, regions: dict[tuple[int, int], RegionSummary] | None = None):
+        self.world_dir = Path(world_dir)
+        self.regions = regions or {}
+
+    @property
+    def cache_path(self) -> Path:
+        return self.world_dir / INDEX_FILE
+
+    @classmethod
+    def load(cls, world_dir: Path, workers: int = DEFAULT_SCAN_WORKERS, save: bool = True) -> "RegionIndex":
+        """Load the cached index of ``world_dir`` and bring it up to date with the region files."""
+        index = cls(world_dir)
+        try:
+            index.regions = decode_index(index.cache_path.read_bytes())
+        except OSError:
+            index.regions = {}
+        if index.refresh(workers) and save:
+            index.save()
+        return index
+
+    def refresh(self, workers: int = DEFAULT_SCAN_WORKERS) -> int:
+        """Rescan region files whose mtime or size changed; return the number of regions updated."""
+        region_dir = self.world_dir / "region"
+        stale = []
+        seen = set()
+        if region_dir.is_dir():
+            with os.scandir(region_dir) as entries:
+                for entry in entries:
+                    coords = parse_region_name(Path(entry.name))
+                    if coords is None:
+                        continue
+                    stat = entry.stat()
+                    seen.add(coords)
+                    cached = self.regions.get(coords)
+                    if cached is None or cached.mtime_ns != stat.st_mtime_ns or cached.size != stat.st_size:
+                        stale.append((Path(entry.path), stat.st_mtime_ns, stat.st_size))
+        removed = [coords for coords in self.regions if coords not in seen]
+        for coords in removed:
+            del self.regions[coords]
+        if stale:
+            with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+                for summary in pool.map(lambda item: scan_region(*item), stale):
+                    if summary is not None:
+                        self.regions[(summary.x, summary.z)] = summary
+        return len(stale) + len(removed)
+
+    def save(self):
+        if not self.world_dir.is_dir():
+            return
+        tmp = self.cache_path.with_name(self.cache_path.name + ".tmp")
+        with open(tmp, "wb") as f:
+            f.write(INDEX_MAGIC + struct.pack(">H", INDEX_VERSION))
+            for coords in sorted(self.regions):
+                f.write(self.regions[coords].encode())
+        os.replace(tmp, self.cache_path)
+
+    @property
+    def chunk_count(self) -> int:
+        return sum(region.chunk_count for region in self.regions.values())
+
+    def has_chunk(self, chunk_x: int, chunk_z: int) -> bool:
+        region = self.regions.get((chunk_x // REGION_SIDE_CHUNKS, chunk_z // REGION_SIDE_CHUNKS))
+        if region is None:
+            return False
+        return region.has((chunk_z % REGION_SIDE_CHUNKS) * REGION_SIDE_CHUNKS + chunk_x % REGION_SIDE_CHUNKS)
+
+    def missing_chunks(self, min_cx: int, max_cx: int, min_cz: int, max_cz: int) -> list[tuple[int, int]]:
+        """Chunks of the inclusive chunk rectangle that no region file holds."""
+        missing = []
+        for cz in range(min_cz, max_cz + 1):
+            for cx in range(min_cx, max_cx + 1):
+                if not self.has_chunk(cx, cz):
+                    missing.append((cx, cz))
+        return missing
+
+    def present_count(self, min_cx: int, max_cx: int, min_cz: int, max_cz: int, since: int | None = None) -> int:
+        """
+        Number of chunks of the inclusive chunk rectangle present in the world,
+        only counting those written at or after ``since`` (epoch seconds) if given.
+        """
+        side = REGION_SIDE_CHUNKS
+        present = 0
+        for rz in range(min_cz // side, max_cz // side + 1):
+            for rx in range(min_cx // side, max_cx // side + 1):
+                region = self.regions.get((rx, rz))
+                if region is None:
+                    continue
+                x0, x1 = max(min_cx - rx * side, 0), min(max_cx - rx * side, side - 1)
+                z0, z1 = max(min_cz - rz * side, 0), min(max_cz - rz * side, side - 1)
+                if since is not None:
+                    written = region.written_since(since)
+                    present += sum(
+                        local_z * side + local_x in written
+                        for local_z in range(z0, z1 + 1)
+                        for local_x in range(x0, x1 + 1)
+                    )
+                    continue
+                if (x0, x1, z0, z1) == (0, side - 1, 0, side - 1):
+                    present += region.chunk_count
+                    continue
+                for local_z in range(z0, z1 + 1):
+                    for local_x in range(x0, x1 + 1):
+                        present += region.has(local_z * side + local_x)
+        return present
+
+    def coverage(self, min_cx: int, max_cx: int, min_cz: int, max_cz: int) -> float:
+        """Fraction of the inclusive chunk rectangle present in the world."""
+        total = (max_cx - min_cx + 1) * (max_cz - min_cz + 1)
+        if total <= 0:
+            return 1.0
+        return self.present_count(min_cx, max_cx, min_cz, max_cz) / total
+
+    def coverage_of(self, ranges: list[tuple[int, int, int, int]], since: int | None = None) -> float:
+        """
+        Fraction of the chunks of several disjoint inclusive chunk rectangles present
+        in the world (written at or after ``since``, see ``present_count``).
+        """
+        total = sum(max(0, max_cx - min_cx + 1) * max(0, max_cz - min_cz + 1) for min_cx, max_cx, min_cz, max_cz in ranges)
+        if total <= 0:
+            return 1.0
+        return sum(self.present_count(*chunk_range, since=since) for chunk_range in ranges) / total
+
+
+def block_bbox_to_chunks(min_x: int, min_z: int, max_x: int, max_z: int) -> tuple[int, int, int, int]:
+    """Inclusive chunk rectangle (min_cx, max_cx, min_cz, max_cz) covering an inclusive block bbox."""
+    return min_x >> 4, max_x >> 4, min_z >> 4, max_z >> 4
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Summarise which chunks a francegen world holds.")
+    parser.add_argument("world", help="World directory containing region/.")
+    parser.add_argument(
+        "--blocks",
+        nargs=4,
+        type=int,
+        metavar=("MIN_X", "MIN_Z", "MAX_X", "MAX_Z"),
+        help="Report coverage of this inclusive block bbox.",
+    )
+    parser.add_argument("--workers", type=int, default=DEFAULT_SCAN_WORKERS, help="Region headers read in parallel.")
+    parser.add_argument("--no-cache", action="store_true", help="Do not write the index cache.")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    index = RegionIndex.load(Path(args.world), args.workers, save=not args.no_cache)
+    print(f"{len(index.regions)} region file(s), {index.chunk_count} chunk(s)")
+    if args.blocks:
+        rect = block_bbox_to_chunks(*args.blocks)
+        total = (rect[1] - rect[0] + 1) * (rect[3] - rect[2] + 1)
+        print(f"Chunks {rect[0]}..{rect[1]} x {rect[2]}..{rect[3]}: {index.present_count(*rect)}/{total} present")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+"""
+Sizing decisions for batch runs.
+
+francegen keeps every column of a run in memory (``WorldBuilder`` plus the
+``ChunkHeights`` built by ``into_chunks``), so its peak RSS grows with the
+macro-tile area. Given a memory budget, ``plan_for_memory`` picks the largest
+macro-tile grid whose estimated peak fits and then as many concurrent runs of
+that size as the budget allows: big nodes get fewer, bigger runs and small
+nodes stay clear of the OOM killer.
+
+The per-km² estimate comes from earlier runs recorded in the run log when
+there are any, otherwise from ``DEFAULT_RSS_PER_KM2``.
+
+The cost model predicts how long francegen will take on each macro-tile so
+parallel runs can start the longest ones first instead of finishing on one
+slow tile while the other slots sit idle. A macro-tile that already ran has
+its logged wall time; others are scored from cheap signals (the share of
+samples with data, the relief, and the bytes of COPC point clouds it
+overlaps) and converted to seconds with the rate measured over the run log.
+
+The same run log records feed the ``--plan`` estimates: bytes and seconds
+per WMS request for downloads, and the peak RSS model above for RAM.
+"""
+import math
+import statistics
+import struct
+from dataclasses import dataclass
+from pathlib import Path
+
+DEFAULT_RSS_PER_KM2 = 400 * 1024**2  # conservative guess until a run log has measurements
+RSS_SAFETY_MARGIN = 1.25
+MIN_MACRO_TILE_GRID = 1
+MAX_MACRO_TILE_GRID = 10
+
+DEFAULT_SECONDS_PER_UNIT = 20.0  # francegen seconds per cost unit until a run log has measurements
+MIN_DATA_WEIGHT = 0.05  # an all-nodata macro-tile still costs a process start and a tile scan
+RELIEF_SCALE_M = 500.0  # each 500 m of relief adds one km² worth of work per km²
+COPC_UNITS_PER_GB = 5.0
+COPC_SUFFIXES = (".copc.laz", ".copc", ".laz")
+LAS_BOUNDS = struct.Struct("<6d")  # max x, min x, max y, min y, max z, min z
+LAS_BOUNDS_OFFSET = 179
+
+DEFAULT_REQUEST_SECONDS = 2.0  # one GetMap over one connection, until a run log has measurements
+DEFAULT_REGION_BYTES_PER_CHUNK = 6 * 1024  # compressed chunk size, until a world has been measured
+
+
+@dataclass
+class MemoryPlan:
+    grid: int
+    parallel: int
+    rss_per_km2: float
+    measured: bool
+    run_bytes: float  # estimated peak RSS of one francegen run, margin included
+
+
+def measured_rss_per_km2(records: list[dict]) -> float | None:
+    """Highest peak RSS per km² among the francegen runs of a run log, or None without data."""
+    rates = [
+        record["max_rss_bytes"] / record["area_km2"]
+        for record in records
+        if record.get("event") == "francegen"
+        and record.get("returncode") == 0
+        and record.get("max_rss_bytes")
+        and record.get("area_km2")
+    ]
+    return max(rates) if rates else None
+
+
+def run_peak_bytes(grid: int, tile_size_m: float, rss_per_km2: float) -> float:
+    area_km2 = (grid * tile_size_m) ** 2 / 1e6
+    return area_km2 * rss_per_km2 * RSS_SAFETY_MARGIN
+
+
+def plan_for_memory(
+    budget_bytes: float,
+    tile_size_m: float,
+    records: list[dict],
+    max_parallel: int,
+    max_grid: int = MAX_MACRO_TILE_GRID,
+) -> MemoryPlan:
+    """
+    Choose the macro-tile grid (tiles per side) and francegen concurrency for
+    ``budget_bytes`` of RAM. Raises ValueError if not even a single-tile
+    macro-tile fits.
+    """
+    measured = measured_rss_per_km2(records)
+    rss_per_km2 = measured if measured is not None else DEFAULT_RSS_PER_KM2
+    grid = max_grid
+    while grid >= MIN_MACRO_TILE_GRID and run_peak_bytes(grid, tile_size_m, rss_per_km2) > budget_bytes:
+        grid -= 1
+    if grid < MIN_MACRO_TILE_GRID:
+        needed = run_peak_bytes(MIN_MACRO_TILE_GRID, tile_size_m, rss_per_km2)
+        raise ValueError(
+            f"A memory budget of {budget_bytes / 1e9:.1f} GB cannot fit one {tile_size_m:.0f} m tile "
+            f"(estimated {needed / 1e9:.1f} GB)"
+        )
+    run_bytes = run_peak_bytes(grid, tile_size_m, rss_per_km2)
+    parallel = max(1, min(max_parallel, math.floor(budget_bytes / run_bytes)))
+    return MemoryPlan(grid, parallel, rss_per_km2, measured is not None, run_bytes)
+
+
+@dataclass
+class CostSignals:
+    area_km2: float
+    data_fraction: float | None = None  # share of samples that are not nodata, if tiles were inspected
+    relief_m: float | None = None
+    copc_bytes: float = 0.0
+
+    def cost_units(self) -> float:
+        """Relative amount of francegen work; one unit is a km² of flat terrain with data and no COPC."""
+        units = self.area_km2
+        if self.data_fraction is not None:
+            units *= max(MIN_DATA_WEIGHT, self.data_fraction)
+        if self.relief_m is not None:
+            units *= 1 + self.relief_m / RELIEF_SCALE_M
+        return units + self.copc_bytes / 1e9 * COPC_UNITS_PER_GB
+
+
+def measured_seconds_per_unit(records: list[dict]) -> float | None:
+    """Median francegen wall time per cost unit over a run log, or None without data."""
+    rates = [
+        record["wall_s"] / record["cost_units"]
+        for record in records
+        if record.get("event") == "francegen"
+        and record.get("status") == "ok"
+        and record.get("wall_s")
+        and record.get("cost_units")
+    ]
+    return statistics.median(rates) if rates else None
+
+
+def historical_seconds(records: list[dict]) -> dict[str, float]:
+    """Latest wall time of every macro-tile that ran in one piece, keyed by macro-tile folder name."""
+    seconds = {}
+    for record in records:
+        if (
+            record.get("event") == "francegen"
+            and record.get("status") == "ok"
+            and "part" not in record
+            and record.get("wall_s") is not None
+        ):
+            seconds[record["macro_tile"]] = record["wall_s"]
+    return seconds
+
+
+def read_las_bounds(path: Path) -> tuple[float, float, float, float] | None:
+    """(min_x, min_y, max_x, max_y) from a LAS/LAZ/COPC public header, or None if it is not one."""
+    with open(path, "rb") as f:
+        header = f.read(LAS_BOUNDS_OFFSET + LAS_BOUNDS.size)
+    if len(header) < LAS_BOUNDS_OFFSET + LAS_BOUNDS.size or header[:4] != b"LASF":
+        return None
+    max_x, min_x, max_y, min_y, _max_z, _min_z = LAS_BOUNDS.unpack_from(header, LAS_BOUNDS_OFFSET)
+    return min_x, min_y, max_x, max_y
+
+
+def copc_extents(copc_dir: Path) -> list[tuple[tuple[float, float, float, float], int]]:
+    """(bounds, size in bytes) of the point cloud files francegen would read from ``copc_dir``."""
+    extents = []
+    for path in sorted(copc_dir.iterdir()):
+        if not path.is_file() or not path.name.lower().endswith(COPC_SUFFIXES):
+            continue
+        bounds = read_las_bounds(path)
+        if bounds is not None:
+            extents.append((bounds, path.stat().st_size))
+    return extents
+
+
+def overlapping_bytes(extents, bbox: tuple[float, float, float, float]) -> float:
+    """Point cloud bytes falling inside ``bbox``, assuming points spread evenly over each file."""
+    total = 0.0
+    for (min_x, min_y, max_x, max_y), size in extents:
+        width = min(max_x, bbox[2]) - max(min_x, bbox[0])
+        height = min(max_y, bbox[3]) - max(min_y, bbox[1])
+        if width <= 0 or height <= 0:
+            continue
+        area = max(1e-9, (max_x - min_x) * (max_y - min_y))
+        total += size * min(1.0, width * height / area)
+    return total
+
+
+def predict_seconds(
+    name: str, signals: CostSignals | None, history: dict[str, float], seconds_per_unit: float
+) -> float:
+    """Predicted francegen wall time of macro-tile ``name``; ``signals`` may be None if it is in ``history``."""
+    if name in history:
+        return history[name]
+    return signals.cost_units() * seconds_per_unit
+
+
+def longest_first(items: list, costs: list[float], pinned: int = 0) -> list:
+    """``items`` ordered by decreasing cost, except the first ``pinned`` which keep their place."""
+    rest = sorted(zip(items[pinned:], costs[pinned:]), key=lambda pair: pair[1], reverse=True)
+    return items[:pinned] + [item for item, _ in rest]
+
+
+def measured_download_rates(records: list[dict]) -> tuple[float, float] | None:
+    """
+    (bytes, seconds) per WMS request over the download records of a run log,
+    or None without data. Seconds reflect the concurrency those runs reached.
+    """
+    downloads = [record for record in records if record.get("event") == "download" and record.get("requests")]
+    requests = sum(record["requests"] for record in downloads)
+    if not requests:
+        return None
+    return (
+        sum(record.get("bytes") or 0 for record in downloads) / requests,
+        sum(record.get("wall_s") or 0 for record in downloads) / requests,
+    )
@@ -0,0 +1,261 @@
+"""
+Resource accounting for batch runs.
+
+``run_with_usage`` runs a command and reports what it cost. Wall and CPU time
+come from ``os.wait4`` (the child's own rusage, so concurrent francegen
+processes do not blur into one another). Peak RSS and bytes read and written
+come from sampling ``/proc/<pid>`` while it runs: ``ru_maxrss`` also counts
+the pages the child shared with this process between fork and exec, so it is
+only used where /proc is unavailable. Results are appended to a JSON-lines
+run log, one object per line.
+
+``RssWatchdog`` watches the combined RSS of the francegen processes started
+through ``run_with_usage``: above a soft limit callers are asked to hold off
+new work, above a hard limit the largest child is killed so the kernel OOM
+killer does not pick a victim for us.
+"""
+import datetime
+import json
+import os
+import subprocess
+import threading
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+from tqdm import tqdm
+
+SAMPLE_INTERVAL_S = 0.5
+SOFT_LIMIT_RESUME_FRACTION = 0.9  # pressure clears once RSS drops below 90% of the soft limit
+
+
+@dataclass
+class ProcessUsage:
+    returncode: int
+    wall_s: float
+    user_s: float | None = None
+    sys_s: float | None = None
+    max_rss_bytes: int | None = None
+    read_bytes: int | None = None
+    write_bytes: int | None = None
+    rss_killed: bool = False  # killed by the RssWatchdog hard limit
+
+    def as_dict(self) -> dict:
+        return {key: round(value, 3) if isinstance(value, float) else value for key, value in asdict(self).items()}
+
+
+def read_proc_io(pid: int) -> dict[str, int] | None:
+    """Storage-level I/O counters of a live process, or None where /proc is unavailable."""
+    try:
+        with open(f"/proc/{pid}/io", encoding="ascii") as f:
+            fields = dict(line.split(":", 1) for line in f if ":" in line)
+    except OSError:
+        return None
+    return {key: int(value) for key, value in fields.items()}
+
+
+def read_proc_status(pid: int) -> dict[str, int]:
+    """Memory fields (VmRSS, VmHWM, ...) of /proc/<pid>/status in bytes; empty once the process is gone."""
+    fields = {}
+    try:
+        with open(f"/proc/{pid}/status", encoding="ascii") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key.startswith("Vm") and value.strip().endswith("kB"):
+                    fields[key] = int(value.split()[0]) * 1024
+    except OSError:
+        pass
+    return fields
+
+
+class ProcSampler:
+    """Polls /proc for a running child until ``stop`` is called."""
+
+    def __init__(self, pid: int, interval_s: float = SAMPLE_INTERVAL_S):
+        self.pid = pid
+        self.interval_s = interval_s
+        self.io: dict[str, int] | None = None
+        self.rss_bytes: int | None = None
+        self.peak_rss_bytes: int | None = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def sample(self):
+        io = read_proc_io(self.pid)
+        if io is not None:
+            self.io = io
+        status = read_proc_status(self.pid)
+        if "VmRSS" in status:
+            self.rss_bytes = status["VmRSS"]
+            peak = status.get("VmHWM", status["VmRSS"])
+            self.peak_rss_bytes = max(self.peak_rss_bytes or 0, peak)
+
+    def _run(self):
+        while True:
+            self.sample()
+            if self._stop.wait(self.interval_s):
+                return
+
+
+class RssWatchdog:
+    """
+    Samples the combined RSS of registered child processes.
+
+    Above ``soft_bytes`` it reports memory pressure until usage falls back
+    below 90% of the soft limit; above ``hard_bytes`` it kills the child with
+    the largest RSS and remembers it so the caller can requeue its work.
+    Either limit may be None.
+    """
+
+    def __init__(self, soft_bytes: float | None, hard_bytes: float | None, interval_s: float = SAMPLE_INTERVAL_S):
+        self.soft_bytes = soft_bytes
+        self.hard_bytes = hard_bytes
+        self.interval_s = interval_s
+        self._procs: dict[int, subprocess.Popen] = {}
+        self._killed: set[int] = set()
+        self._lock = threading.Lock()
+        self._headroom = threading.Event()
+        self._headroom.set()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="rss-watchdog", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._headroom.set()
+        self._thread.join()
+
+    def register(self, proc: subprocess.Popen):
+        with self._lock:
+            self._procs[proc.pid] = proc
+
+    def unregister(self, pid: int) -> bool:
+        """Stop watching ``pid``; return True if the watchdog killed it."""
+        with self._lock:
+            self._procs.pop(pid, None)
+            killed = pid in self._killed
+            self._killed.discard(pid)
+        return killed
+
+    @property
+    def under_pressure(self) -> bool:
+        return not self._headroom.is_set()
+
+    def wait_for_headroom(self):
+        """Block while the children are above the soft limit."""
+        self._headroom.wait()
+
+    def check(self):
+        with self._lock:
+            rss = {pid: read_proc_status(pid).get("VmRSS", 0) for pid in self._procs if pid not in self._killed}
+            total = sum(rss.values())
+            if self.hard_bytes is not None and rss and total > self.hard_bytes:
+                victim = max(rss, key=rss.get)
+                tqdm.write(
+                    f"[Watchdog] francegen RSS {total / 1e9:.1f} GB over the hard limit; "
+                    f"killing pid {victim} ({rss[victim] / 1e9:.1f} GB)"
+                )
+                self._procs[victim].kill()
+                self._killed.add(victim)
+                total -= rss[victim]
+        if self.soft_bytes is None:
+            return
+        if total > self.soft_bytes and self._headroom.is_set():
+            tqdm.write(f"[Watchdog] francegen RSS {total / 1e9:.1f} GB over the soft limit; pausing new work")
+            self._headroom.clear()
+        elif total < self.soft_bytes * SOFT_LIMIT_RESUME_FRACTION and not self._headroom.is_set():
+            tqdm.write(f"[Watchdog] francegen RSS back to {total / 1e9:.1f} GB; resuming")
+            self._headroom.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval_s):
+            self.check()
+
+
+def run_with_usage(cmd: list[str], stdout=None, stderr=None, watchdog: RssWatchdog | None = None) -> ProcessUsage:
+    """Run ``cmd`` to completion and return its exit status and resource usage."""
+    started = time.monotonic()
+    proc = subprocess.Popen(cmd, stdout=stdout, stderr=stderr)
+    if watchdog is not None:
+        watchdog.register(proc)
+    sampler = ProcSampler(proc.pid)
+    sampler.start()
+    rss_killed = False
+    try:
+        if hasattr(os, "wait4"):
+            # Block until the child exits without reaping it, so the last /proc sample
+            # still sees its final I/O counters; wait4 then reaps it with its rusage.
+            os.waitid(os.P_PID, proc.pid, os.WEXITED | os.WNOWAIT)
+            sampler.sample()
+            # Unregister before reaping so the watchdog can never signal a recycled pid.
+            if watchdog is not None:
+                rss_killed = watchdog.unregister(proc.pid)
+            _, status, rusage = os.wait4(proc.pid, 0)
+            proc.returncode = os.waitstatus_to_exitcode(status)
+        else:
+            proc.wait()
+            rusage = None
+            if watchdog is not None:
+                rss_killed = watchdog.unregister(proc.pid)
+    except BaseException:
+        if watchdog is not None:
+            watchdog.unregister(proc.pid)
+        proc.kill()
+        proc.wait()
+        raise
+    finally:
+        sampler.stop()
+    usage = ProcessUsage(proc.returncode, time.monotonic() - started, rss_killed=rss_killed)
+    if rusage is not None:
+        usage.user_s = rusage.ru_utime
+        usage.sys_s = rusage.ru_stime
+        usage.max_rss_bytes = rusage.ru_maxrss * 1024  # kilobytes on Linux
+    if sampler.peak_rss_bytes is not None:
+        usage.max_rss_bytes = sampler.peak_rss_bytes
+    if sampler.io is not None:
+        usage.read_bytes = sampler.io.get("read_bytes")
+        usage.write_bytes = sampler.io.get("write_bytes")
+    return usage
+
+
+class RunLog:
+    """Thread-safe JSON-lines log of per-macro-tile events."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+
+    def write(self, event: str, **fields):
+        record = {
+            "time": datetime.datetime.now(datetime.UTC).isoformat().replace("+00:00", "Z"),
+            "event": event,
+            **fields,
+        }
+        line = json.dumps(record, default=str)
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+    def read(self) -> list[dict]:
+        """Every record in the log, skipping lines that do not parse."""
+        if not self.path.exists():
+            return []
+        records = []
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    continue
+        return records
@@ -0,0 +1,53 @@
+"""
+Coordinate-keyed store of downloaded DEM tiles.
+
+Tiles are stored once under a path derived from their absolute EPSG:2154
+bbox and pixel size, independent of how a batch run lays out its
+macro-tiles. Macro-tile input folders are then staged from hardlinks into the
+store (symlinks when the store lives on another filesystem), so re-centering
+a run or changing ``--macro-radius`` reuses every tile whose bbox is unchanged
+and staging never copies data.
+"""
+import os
+from pathlib import Path
+
+STORE_SHARD_M = 10_000  # one sub-directory per 10 km column of tiles
+
+
+def format_coord(value: float) -> str:
+    """Render a coordinate without trailing zeros (e.g. 697312.5, 696000)."""
+    return f"{value:.3f}".rstrip("0").rstrip(".")
+
+
+class TileStore:
+    def __init__(self, root: Path, pixel_size: float, variant: str | None = None):
+        self.root = Path(root)
+        self.pixel_size = pixel_size
+        # Derived products (e.g. "mean" for 2x2-aggregated tiles) get their own namespace.
+        self.variant = variant
+
+    def path_for(self, bbox: tuple[float, float, float, float]) -> Path:
+        min_x, min_y, max_x, max_y = bbox
+        shard = f"x{int(min_x // STORE_SHARD_M) * STORE_SHARD_M}"
+        name = "_".join(format_coord(v) for v in (min_x, min_y, max_x, max_y)) + ".tif"
+        namespace = f"px{format_coord(self.pixel_size)}"
+        if self.variant:
+            namespace += f"-{self.variant}"
+        return self.root / namespace / shard / name
+
+    def stage(self, bbox: tuple[float, float, float, float], dest: Path) -> bool:
+        """Link the stored tile for ``bbox`` to ``dest``; return False if the store has no such tile."""
+        source = self.path_for(bbox)
+        if not source.exists():
+            return False
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        if dest.is_symlink() or dest.exists():
+            if dest.exists() and os.path.samefile(source, dest):
+                return True
+            dest.unlink()
+        try:
+            os.link(source, dest)
+        except OSError:
+            # Cross-device stores (or filesystems without hardlinks) fall back to symlinks.
+            dest.symlink_to(source.resolve())
+        return True
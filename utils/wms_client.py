@@ -0,0 +1,269 @@
+"""
+Shared HTTP plumbing for the IGN WMS downloaders (utils/wms_dl.py and
+utils/batch_francegen_25km.py).
+
+All GetMap calls go through one keep-alive ``requests.Session`` and one
+``RateController``. The controller replaces the fixed "polite delay": it
+raises the number of in-flight requests while the server answers quickly and
+halves it (and pauses) as soon as data.geopf.fr signals throttling through
+429/503 responses (honouring their ``Retry-After`` header) or XML
+ServiceException bodies whose code names a rate or capacity limit. Other
+ServiceExceptions (InvalidBBOX, LayerNotDefined, ...) are plain errors.
+"""
+import collections
+import email.utils
+import os
+import random
+import re
+import threading
+import time
+from pathlib import Path
+
+import requests
+from requests.adapters import HTTPAdapter
+from tqdm import tqdm
+
+from geotiff_header import validate_geotiff
+
+BASE_URL = "https://data.geopf.fr/wms-r"
+LAYER = "IGNF_LIDAR-HD_MNT_ELEVATION.ELEVATIONGRIDCOVERAGE.LAMB93"
+REQUEST_TIMEOUT_S = 60
+THROTTLE_STATUS_CODES = {429, 503}
+DEFAULT_BACKOFF_S = 5.0  # pause applied on throttling without a Retry-After header
+RATE_WINDOW_S = 30.0  # sliding window used to report the achieved request rate
+DEFAULT_RETRIES = 4  # extra attempts per tile after the first failure
+RETRY_BASE_DELAY_S = 2.0
+RETRY_MAX_DELAY_S = 60.0
+# ServiceException codes (compared case-insensitively, as substrings) that mean "slow down" rather than "bad request".
+THROTTLE_EXCEPTION_CODES = ("toomanyrequests", "ratelimit", "quota", "serverbusy", "serviceunavailable", "overload")
+EXCEPTION_CODE_RE = re.compile(r"<(?:\w+:)?ServiceException\b[^>]*?\bcode\s*=\s*[\"']([^\"']*)[\"']", re.IGNORECASE)
+
+
+def make_session(max_connections: int) -> requests.Session:
+    """Create a Session whose connection pool can keep one connection alive per worker."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, max_connections))
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def getmap_params(bbox: tuple[float, float, float, float], width: int, height: int) -> dict[str, str]:
+    min_x, min_y, max_x, max_y = bbox
+    return {
+        "SERVICE": "WMS",
+        "VERSION": "1.3.0",
+        "REQUEST": "GetMap",
+        "LAYERS": LAYER,
+        "STYLES": "",
+        "CRS": "EPSG:2154",
+        "BBOX": f"{min_x},{min_y},{max_x},{max_y}",
+        "WIDTH": str(width),
+        "HEIGHT": str(height),
+        "FORMAT": "image/geotiff",
+        "EXCEPTIONS": "text/xml",
+    }
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """Return the delay in seconds encoded by a Retry-After header (seconds or HTTP date)."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+class RateController:
+    """
+    AIMD concurrency limiter shared by every WMS worker thread.
+
+    Workers call ``acquire()`` before a request and ``release()`` afterwards.
+    Fast successful responses grow the concurrency limit by roughly one slot
+    per round trip; slow responses shrink it gently and throttling signals
+    halve it and hold all new requests until the server's pause has elapsed.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int,
+        initial_concurrency: int = 1,
+        min_concurrency: int = 1,
+        target_latency_s: float = 5.0,
+    ):
+        self.max_concurrency = max(1, max_concurrency)
+        self.min_concurrency = max(1, min(min_concurrency, self.max_concurrency))
+        self.limit = float(min(max(initial_concurrency, self.min_concurrency), self.max_concurrency))
+        self.target_latency_s = target_latency_s
+        self._in_flight = 0
+        self._paused_until = 0.0
+        self._completions: collections.deque[float] = collections.deque()
+        self._throttle_events = 0
+        self._requests = 0
+        self._bytes = 0
+        self._cond = threading.Condition()
+
+    def acquire(self) -> float:
+        """Block until a request slot is available; return the request start time."""
+        with self._cond:
+            while True:
+                wait = self._paused_until - time.monotonic()
+                if wait <= 0 and self._in_flight < int(self.limit):
+                    self._in_flight += 1
+                    return time.monotonic()
+                self._cond.wait(timeout=wait if wait > 0 else None)
+
+    def release(
+        self, started: float, throttled: bool = False, retry_after: float | None = None, received: int = 0
+    ):
+        """
+        Record the outcome of a request started at ``started`` and free its slot.
+
+        ``retry_after`` only sets the length of the pause of a throttled request.
+        """
+        now = time.monotonic()
+        latency = now - started
+        with self._cond:
+            self._in_flight -= 1
+            self._requests += 1
+            self._bytes += received
+            self._completions.append(now)
+            while self._completions and now - self._completions[0] > RATE_WINDOW_S:
+                self._completions.popleft()
+            if throttled:
+                self._throttle_events += 1
+                self.limit = max(float(self.min_concurrency), self.limit / 2)
+                pause = retry_after if retry_after is not None else DEFAULT_BACKOFF_S
+                self._paused_until = max(self._paused_until, now + pause)
+            elif latency <= self.target_latency_s:
+                self.limit = min(float(self.max_concurrency), self.limit + 1 / self.limit)
+            else:
+                self.limit = max(float(self.min_concurrency), self.limit * 0.9)
+            self._cond.notify_all()
+
+    def request_rate(self) -> float:
+        """Requests per second completed over the recent sliding window."""
+        with self._cond:
+            if len(self._completions) < 2:
+                return 0.0
+            span = self._completions[-1] - self._completions[0]
+            return (len(self._completions) - 1) / span if span > 0 else 0.0
+
+    def counters(self) -> tuple[int, int, int]:
+        """Totals so far: (requests, throttle events, body bytes received)."""
+        with self._cond:
+            return self._requests, self._throttle_events, self._bytes
+
+    def summary(self) -> str:
+        return (
+            f"{self.request_rate():.2f} req/s at concurrency {int(self.limit)}/{self.max_concurrency} "
+            f"({self._requests} request(s), {self._throttle_events} throttle event(s))"
+        )
+
+
+def service_exception_codes(response: requests.Response) -> list[str]:
+    """The ``code`` attributes of the ServiceException elements of an XML error body."""
+    content_type = response.headers.get("content-type", "").lower()
+    if "xml" not in content_type:
+        return []
+    return EXCEPTION_CODE_RE.findall(response.text[:8192])
+
+
+def is_throttle_exception(codes: list[str]) -> bool:
+    return any(pattern in code.lower() for code in codes for pattern in THROTTLE_EXCEPTION_CODES)
+
+
+def part_path(filename: Path) -> Path:
+    return filename.with_name(filename.name + ".part")
+
+
+def download_getmap(
+    session: requests.Session,
+    controller: RateController,
+    params: dict[str, str],
+    filename: Path,
+    validate: bool = True,
+) -> bool:
+    """
+    Download one GetMap response to ``filename``; return True when a complete image was written.
+
+    The body is streamed to ``<filename>.part``, checked against Content-Length
+    and (when ``validate`` is set) against the requested raster size and
+    GeoTIFF tags, then renamed into place, so ``filename`` only ever exists
+    as a complete tile.
+    """
+    started = controller.acquire()
+    throttled = False
+    retry_after = None
+    written = 0
+    partial = part_path(filename)
+    try:
+        with session.get(BASE_URL, params=params, stream=True, timeout=REQUEST_TIMEOUT_S) as response:
+            content_type = response.headers.get("content-type", "").lower()
+            if response.status_code == 200 and "image" in content_type:
+                with open(partial, "wb") as f:
+                    for chunk in response.iter_content(1 << 16):
+                        f.write(chunk)
+                        written += len(chunk)
+                expected = response.headers.get("content-length")
+                # Content-Length describes the encoded body; only compare it when no transfer encoding applies.
+                if expected is not None and not response.headers.get("content-encoding") and written != int(expected):
+                    tqdm.write(f"[Error] {filename.name} -> received {written} of {expected} bytes")
+                    partial.unlink(missing_ok=True)
+                    return False
+                if validate:
+                    problem = validate_geotiff(partial, int(params["WIDTH"]), int(params["HEIGHT"]))
+                    if problem:
+                        tqdm.write(f"[Error] {filename.name} -> invalid GeoTIFF: {problem}")
+                        partial.unlink(missing_ok=True)
+                        return False
+                os.replace(partial, filename)
+                return True
+            codes = service_exception_codes(response)
+            if response.status_code in THROTTLE_STATUS_CODES:
+                throttled = True
+                retry_after = parse_retry_after(response.headers.get("retry-after"))
+            else:
+                throttled = is_throttle_exception(codes)
+            detail = f" / ServiceException {', '.join(codes)}" if codes else ""
+            tqdm.write(
+                f"[Error] {filename.name} -> status {response.status_code} / content-type "
+                f"{response.headers.get('content-type')}{detail}"
+            )
+            return False
+    except Exception as exc:  # pylint: disable=broad-except
+        tqdm.write(f"[Exception] {filename.name}: {exc}")
+        partial.unlink(missing_ok=True)
+        return False
+    finally:
+        controller.release(started, throttled=throttled, retry_after=retry_after, received=written)
+
+
+def backoff_delay(attempt: int, base_s: float = RETRY_BASE_DELAY_S, cap_s: float = RETRY_MAX_DELAY_S) -> float:
+    """Exponential backoff with full jitter for the given 0-based retry attempt."""
+    return random.uniform(0, min(cap_s, base_s * (2**attempt)))
+
+
+def download_with_retries(
+    session: requests.Session,
+    controller: RateController,
+    params: dict[str, str],
+    filename: Path,
+    retries: int = DEFAULT_RETRIES,
+) -> bool:
+    """Call ``download_getmap`` until it succeeds or ``retries`` extra attempts are exhausted."""
+    for attempt in range(retries + 1):
+        if download_getmap(session, controller, params, filename):
+            return True
+        if attempt < retries:
+            delay = backoff_delay(attempt)
+            tqdm.write(f"[Retry] {filename.name} attempt {attempt + 2}/{retries + 1} in {delay:.1f}s")
+            time.sleep(delay)
+    return False
@@ -1,24 +1,29 @@
 import os
-import requests
-import time
 import itertools
 import argparse
 import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
 from tqdm import tqdm  # Progress bar library
 
+from wms_client import RateController, download_getmap, getmap_params, make_session
+
 # --- Argument Parsing ---
 parser = argparse.ArgumentParser(description="Download WMS Tiles for a 10km x 10km grid.")
 parser.add_argument("output_dir", help="Directory to save the downloaded tiles")
+parser.add_argument("--workers", type=int, default=4, help="Maximum concurrent WMS requests (default: 4)")
+parser.add_argument(
+    "--pixel-size", type=float, choices=(0.5, 1.0), default=1.0,
+    help="Meters per pixel (default: 1.0, one sample per Minecraft column; 0.5 = 4x the data)",
+)
 args = parser.parse_args()
 
 OUTPUT_DIR = args.output_dir
 
 # --- Configuration ---
-BASE_URL = "https://data.geopf.fr/wms-r"
-LAYER = "IGNF_LIDAR-HD_MNT_ELEVATION.ELEVATIONGRIDCOVERAGE.LAMB93"
-PIXEL_SIZE = 0.5  # meters per pixel
-TILE_WIDTH_PX = 2000
-TILE_HEIGHT_PX = 2000
+PIXEL_SIZE = args.pixel_size  # meters per pixel
+TILE_WIDTH_PX = int(1000 / PIXEL_SIZE)
+TILE_HEIGHT_PX = int(1000 / PIXEL_SIZE)
 GRID_SIDE_LENGTH = 10  # 10x10 grid = 100 tiles
 
 # --- Coordinate Calculation ---
@@ -52,45 +57,31 @@ print("-" * 30)
 # Create a list of all coordinate pairs (0,0) to (9,9)
 tile_indices = list(itertools.product(range(GRID_SIDE_LENGTH), range(GRID_SIDE_LENGTH)))
 
-# Iterate with Progress Bar
-for col, row in tqdm(tile_indices, unit="tile", desc="Downloading"):
-    
+session = make_session(args.workers)
+controller = RateController(args.workers)
+
+jobs = []
+for col, row in tile_indices:
     # Calculate BBOX
     min_x = start_x + (col * TILE_SIZE_M)
     min_y = start_y + (row * TILE_SIZE_M)
     max_x = min_x + TILE_SIZE_M
     max_y = min_y + TILE_SIZE_M
-    
-    bbox_str = f"{min_x},{min_y},{max_x},{max_y}"
+
     filename = os.path.join(OUTPUT_DIR, f"elevation_{col}_{row}.tif")
-    
-    params = {
-        "SERVICE": "WMS", "VERSION": "1.3.0", "REQUEST": "GetMap",
-        "LAYERS": LAYER, "STYLES": "", "CRS": "EPSG:2154",
-        "BBOX": bbox_str, "WIDTH": str(TILE_WIDTH_PX), "HEIGHT": str(TILE_HEIGHT_PX),
-        "FORMAT": "image/geotiff", "EXCEPTIONS": "text/xml"
-    }
-    
-    try:
-        response = requests.get(BASE_URL, params=params, stream=True)
-        
-        if response.status_code == 200:
-            # Check if response is an image (ignoring charset)
-            content_type = response.headers.get('content-type', '').lower()
-            if 'image' in content_type:
-                with open(filename, 'wb') as f:
-                    for chunk in response.iter_content(1024):
-                        f.write(chunk)
-            else:
-                # Use tqdm.write to print without breaking the progress bar
-                tqdm.write(f"[Error] XML returned for {filename}: {response.text[:100]}...")
-        else:
-            tqdm.write(f"[Error] Status {response.status_code} for {filename}")
-            
-    except Exception as e:
-        tqdm.write(f"[Exception] {e}")
-
-    # Polite delay
-    time.sleep(0.1)
-
-print("\nAll downloads complete.")
+    params = getmap_params((min_x, min_y, max_x, max_y), TILE_WIDTH_PX, TILE_HEIGHT_PX)
+    jobs.append((params, filename))
+
+# Iterate with Progress Bar; the shared rate controller paces the workers
+with tqdm(total=len(jobs), unit="tile", desc="Downloading") as pbar:
+    with ThreadPoolExecutor(max_workers=controller.max_concurrency) as pool:
+        futures = [
+            pool.submit(download_getmap, session, controller, params, Path(filename))
+            for params, filename in jobs
+        ]
+        for future in as_completed(futures):
+            future.result()
+            pbar.update(1)
+            pbar.set_postfix_str(f"{controller.request_rate():.2f} req/s")
+
+print(f"\nAll downloads complete. Settled rate: {controller.summary()}")
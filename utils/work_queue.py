@@ -0,0 +1,268 @@
+"""
+Lease-based work queue on a shared filesystem (e.g. an NFS mount).
+
+Several batch workers, possibly on different nodes, pull macro-tiles from one
+queue directory:
+
+    plan.json            the shared work plan (written once, by whichever
+                         worker gets there first)
+    leases/<id>.lease    held by the worker processing <id>; refreshed by a
+                         heartbeat and considered abandoned once its mtime is
+                         older than the lease duration
+    done/<id>.json       written when <id> has been generated
+    failed/<id>.*.json   one per failed attempt; items stop being handed out
+                         after ``max_attempts`` failures
+
+Files are created with link(2), which is atomic on NFS as well, so exactly one
+worker wins every claim. Lease ages are measured against the file server's
+clock (the mtime of a file the worker just touched), so clock skew between
+nodes does not matter. A crashed worker simply stops heartbeating; its leases
+expire and are reclaimed by the others.
+"""
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from pathlib import Path
+
+from tqdm import tqdm
+
+PLAN_FILE = "plan.json"
+LEASE_SECONDS = 600.0
+HEARTBEAT_SECONDS = 60.0
+MAX_ATTEMPTS = 3
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def read_json(path: Path) -> dict | None:
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+
+def write_json(path: Path, payload: dict):
+    tmp = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+    tmp.write_text(json.dumps(payload, indent=2), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def create_exclusive(path: Path, payload: dict) -> bool:
+    """Create ``path`` holding ``payload`` unless it already exists; True if this call created it."""
+    tmp = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+    tmp.write_text(json.dumps(payload, indent=2), encoding="utf-8")
+    try:
+        os.link(tmp, path)
+        return True
+    except FileExistsError:
+        return False
+    finally:
+        tmp.unlink(missing_ok=True)
+
+
+class LeaseQueue:
+    def __init__(
+        self,
+        root: Path,
+        worker_id: str | None = None,
+        lease_s: float = LEASE_SECONDS,
+        heartbeat_s: float = HEARTBEAT_SECONDS,
+        max_attempts: int = MAX_ATTEMPTS,
+    ):
+        self.root = Path(root)
+        self.worker_id = worker_id or default_worker_id()
+        self.lease_s = lease_s
+        self.heartbeat_s = heartbeat_s
+        self.max_attempts = max_attempts
+        for sub in ("leases", "done", "failed", "clock"):
+            (self.root / sub).mkdir(parents=True, exist_ok=True)
+        self._held: set[str] = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._heartbeat, name="lease-heartbeat", daemon=True)
+
+    # -- plan -----------------------------------------------------------------
+
+    def load_plan(self) -> dict | None:
+        return read_json(self.root / PLAN_FILE)
+
+    def publish_plan(self, plan: dict) -> dict:
+        """Publish ``plan`` unless another worker already did; return the plan in effect."""
+        create_exclusive(self.root / PLAN_FILE, plan)
+        return self.load_plan()
+
+    # -- leases ---------------------------------------------------------------
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        with self._lock:
+            held = list(self._held)
+        for item_id in held:
+            self.release(item_id)
+
+    def lease_path(self, item_id: str) -> Path:
+        return self.root / "leases" / f"{item_id}.lease"
+
+    def done_path(self, item_id: str) -> Path:
+        return self.root / "done" / f"{item_id}.json"
+
+    def server_time(self) -> float:
+        """Current time according to the file server."""
+        clock = self.root / "clock" / self.worker_id
+        clock.touch()
+        return clock.stat().st_mtime
+
+    def is_done(self, item_id: str) -> bool:
+        return self.done_path(item_id).exists()
+
+    def attempts(self, item_id: str) -> int:
+        return sum(1 for _ in (self.root / "failed").glob(f"{item_id}.*.json"))
+
+    def is_open(self, item_id: str) -> bool:
+        """True while ``item_id`` may still be handed out to some worker."""
+        return not self.is_done(item_id) and self.attempts(item_id) < self.max_attempts
+
+    def _lease_payload(self) -> dict:
+        return {"worker": self.worker_id, "host": socket.gethostname(), "pid": os.getpid(), "claimed": time.time()}
+
+    def try_claim(self, item_id: str) -> bool:
+        if not self.is_open(item_id):
+            return False
+        lease = self.lease_path(item_id)
+        if not create_exclusive(lease, self._lease_payload()):
+            try:
+                observed = lease.stat()
+            except FileNotFoundError:
+                observed = None
+            if observed is not None and self.server_time() - observed.st_mtime <= self.lease_s:
+                return False
+            if observed is not None and not self._reclaim(item_id, lease, observed):
+                return False
+            if not create_exclusive(lease, self._lease_payload()):
+                return False
+        # The item may have been finished between the checks above and the claim.
+        if self.is_done(item_id):
+            lease.unlink(missing_ok=True)
+            return False
+        with self._lock:
+            self._held.add(item_id)
+        return True
+
+    def _reclaim(self, item_id: str, lease: Path, observed: os.stat_result) -> bool:
+        """
+        Move the expired lease ``observed`` aside; rename(2) lets only one
+        reclaiming worker succeed. If what was moved is not that expired lease
+        any more (its holder renewed it, or another worker re-leased the item
+        in the meantime), it is put back and the claim is abandoned.
+        """
+        stale = lease.with_name(f"{lease.name}.{uuid.uuid4().hex}.stale")
+        try:
+            os.rename(lease, stale)
+        except FileNotFoundError:
+            return False
+        try:
+            moved = stale.stat()
+            if (
+                (moved.st_ino, moved.st_mtime) != (observed.st_ino, observed.st_mtime)
+                or self.server_time() - moved.st_mtime <= self.lease_s
+            ):
+                try:
+                    os.link(stale, lease)
+                except FileExistsError:
+                    pass  # its holder already re-created it (see _heartbeat)
+                return False
+            previous = read_json(stale) or {}
+            tqdm.write(f"[Queue] Reclaimed expired lease on {item_id} from {previous.get('worker', 'unknown worker')}")
+            return True
+        finally:
+            stale.unlink(missing_ok=True)
+
+    def holds(self, item_id: str) -> bool:
+        lease = read_json(self.lease_path(item_id))
+        return lease is not None and lease.get("worker") == self.worker_id
+
+    def release(self, item_id: str):
+        with self._lock:
+            self._held.discard(item_id)
+        if self.holds(item_id):
+            self.lease_path(item_id).unlink(missing_ok=True)
+
+    def complete(self, item_id: str, **info):
+        write_json(self.done_path(item_id), {"worker": self.worker_id, "finished": time.time(), **info})
+        self.release(item_id)
+
+    def fail(self, item_id: str, reason: str):
+        attempt = self.attempts(item_id) + 1
+        path = self.root / "failed" / f"{item_id}.{self.worker_id}.{attempt}.json"
+        write_json(path, {"worker": self.worker_id, "failed": time.time(), "reason": reason})
+        self.release(item_id)
+
+    def _heartbeat(self):
+        while not self._stop.wait(self.heartbeat_s):
+            with self._lock:
+                held = list(self._held)
+            for item_id in held:
+                if not self.lease_path(item_id).exists():
+                    self._restore_lease(item_id)
+                if not self.holds(item_id):
+                    tqdm.write(f"[Queue] Lost the lease on {item_id}; another worker may redo it")
+                    with self._lock:
+                        self._held.discard(item_id)
+                    continue
+                try:
+                    os.utime(self.lease_path(item_id))
+                except FileNotFoundError:
+                    pass
+
+    def _restore_lease(self, item_id: str):
+        """
+        Re-create a held lease that vanished. Reclaiming workers move leases
+        aside for a moment before checking them; rather than give the item up,
+        take the lease back. If a reclaimer already re-leased the item, its
+        lease stays and ``holds`` reports the loss.
+        """
+        lease = self.lease_path(item_id)
+        with self._lock:
+            if item_id not in self._held:
+                return
+        if self.is_done(item_id) or not create_exclusive(lease, self._lease_payload()):
+            return
+        # The item may have been released or finished while the lease was re-created.
+        with self._lock:
+            still_held = item_id in self._held
+        if not still_held or self.is_done(item_id):
+            lease.unlink(missing_ok=True)
+
+    # -- claiming -------------------------------------------------------------
+
+    def claims(self, items: list[dict], poll_s: float | None = None):
+        """
+        Yield the items of ``items`` (dicts with an ``id``) this worker manages
+        to claim, in order. Items leased by other workers are revisited until
+        they are done, so expired leases of crashed workers get picked up;
+        the generator ends once nothing is left open.
+        """
+        poll_s = poll_s if poll_s is not None else max(1.0, min(self.heartbeat_s, self.lease_s / 4))
+        while not self._stop.is_set():
+            waiting = False
+            for item in items:
+                if self._stop.is_set():
+                    return
+                if self.try_claim(item["id"]):
+                    yield item
+                elif self.is_open(item["id"]):
+                    waiting = True
+            if not waiting:
+                return
+            self._stop.wait(poll_s)
@@ -0,0 +1,79 @@
+"""
+Helpers for francegen_meta.json, the world metadata francegen writes next to
+region/ (see src/metadata.rs).
+"""
+import contextlib
+import fcntl
+import json
+import os
+from pathlib import Path
+
+META_FILE = "francegen_meta.json"
+# Bounds of a world that holds no blocks yet: any real bounds replace them on the first union.
+# Kept well inside i32 so francegen's width/depth arithmetic cannot overflow.
+EMPTY_BOUND = 2**30
+EMPTY_HEIGHT = 1e9
+
+
+def load_metadata(world_dir: Path) -> dict | None:
+    meta_path = world_dir / META_FILE
+    if not meta_path.exists():
+        return None
+    return json.loads(meta_path.read_text(encoding="utf-8"))
+
+
+def write_metadata(world_dir: Path, metadata: dict):
+    """Write the metadata atomically so concurrent readers never see a partial file."""
+    meta_path = world_dir / META_FILE
+    tmp = meta_path.with_name(meta_path.name + ".tmp")
+    tmp.write_text(json.dumps(metadata, indent=2), encoding="utf-8")
+    os.replace(tmp, meta_path)
+
+
+@contextlib.contextmanager
+def metadata_lock(world_dir: Path):
+    """
+    Hold the lock francegen takes while it folds a run into the metadata
+    (``merge_metadata`` in src/metadata.rs), for read-modify-write updates.
+    """
+    with open(world_dir / (META_FILE + ".lock"), "w", encoding="utf-8") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def empty_metadata(origin: tuple[float, float]) -> dict:
+    """Metadata pinning a world's origin before anything has been generated into it."""
+    return {
+        "origin_model_x": origin[0],
+        "origin_model_z": origin[1],
+        "min_x": EMPTY_BOUND,
+        "max_x": -EMPTY_BOUND,
+        "min_z": EMPTY_BOUND,
+        "max_z": -EMPTY_BOUND,
+        "min_height": EMPTY_HEIGHT,
+        "max_height": -EMPTY_HEIGHT,
+    }
+
+
+def is_empty_metadata(metadata: dict) -> bool:
+    return metadata["min_x"] > metadata["max_x"]
+
+
+def union_metadata(a: dict | None, b: dict | None) -> dict | None:
+    """Combine two francegen_meta.json payloads the way WorldStats::union does."""
+    if a is None or b is None:
+        return a if b is None else b
+    if (a["origin_model_x"], a["origin_model_z"]) != (b["origin_model_x"], b["origin_model_z"]):
+        raise ValueError(
+            f"World origins differ: ({a['origin_model_x']}, {a['origin_model_z']}) vs "
+            f"({b['origin_model_x']}, {b['origin_model_z']})"
+        )
+    merged = dict(a)
+    for key in ("min_x", "min_z", "min_height"):
+        merged[key] = min(a[key], b[key])
+    for key in ("max_x", "max_z", "max_height"):
+        merged[key] = max(a[key], b[key])
+    return merged